@@ -1,24 +1,354 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.common.exceptions import (
+    NoSuchElementException, TimeoutException, StaleElementReferenceException,
+    InvalidSessionIdException, NoSuchWindowException
+)
 import time
+import random
 import asyncio
 import csv
+import json
+import gzip
+import io
+import xml.etree.ElementTree as ET
 import os
+import shutil
+import sys
+import itertools
+from array import array
 from datetime import datetime
 import threading
 from concurrent.futures import ThreadPoolExecutor
 import queue
+import re
+from contextlib import contextmanager
 import pandas as pd
+import numpy as np
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, PatternFill, Alignment
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # Без requests доступен только Selenium
+    requests = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Без pyarrow хранилище отдает только DataFrame
+    pa = None
+
+try:
+    import psutil
+except ImportError:  # Без psutil память процессов браузера не замеряется
+    psutil = None
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:  # Без lxml + cssselect доступен только Selenium
+    lxml = None
+
+# === Записи товаров в накопителях ===
+
+_header_sets = {}  # Один общий кортеж имен свойств на каждый набор
+
+def intern_headers(keys):
+    """Возвращает общий кортеж имен свойств (строки интернированы)"""
+    keys = tuple(sys.intern(key) if isinstance(key, str) else key for key in keys)
+    return _header_sets.setdefault(keys, keys)
+
+class RunDictionary:
+    """Словарь значений одного запуска: значение хранится один раз, записи держат его код"""
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        if value is None or value != value:
+            return -1  # Пустое значение (None, NaN) в словарь не попадает
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return self.values[code] if code >= 0 else None
+
+    def __len__(self):
+        return len(self.values)
+
+# Общие словари колонок хранилищ: категории, пути подкатегорий, блоки, время добавления, типы данных
+run_dictionaries = {
+    "category": RunDictionary(),
+    "path": RunDictionary(),
+    "block_title": RunDictionary(),
+    "block_image": RunDictionary(),
+    "timestamp": RunDictionary(),
+    "data_type": RunDictionary()
+}
+
+class ProductBlock:
+    """Блок товаров в накопителе: заголовок, изображение, заголовки таблицы и число товаров"""
+    __slots__ = ("title", "image", "table_headers", "path", "timestamp", "product_count")
+
+    def __init__(self, block_info, path, timestamp):
+        self.title = block_info.get("block_title", "Неизвестный блок")
+        self.image = block_info.get("block_image", "")
+        self.table_headers = block_info.get("table_headers", [])
+        self.path = path
+        self.timestamp = timestamp
+        self.product_count = 0
+
+class Product:
+    """
+    Запись товара, из которой собираются строки хранилищ и CSV. Основные поля — атрибуты (поле, которого не было в словаре
+    товара, остается незаданным), остальные свойства — кортеж значений, выровненный
+    по общему кортежу имен headers. Категория, путь, блок и время — ссылки на общие
+    для всех товаров страницы объекты; коды словарей получают только колонки ProductStore.
+    """
+    FIELDS = ("name", "url", "article", "image_url")
+    __slots__ = ("category", "path", "block", "timestamp", "data_type", "headers", "props") + FIELDS
+
+    def __init__(self, product, category, path, block, timestamp, data_type):
+        self.category = category
+        self.path = path
+        self.block = block
+        self.timestamp = timestamp
+        self.data_type = data_type
+        for key in Product.FIELDS:
+            if key in product:
+                setattr(self, key, product[key])
+        extra = [key for key in product if key not in Product.FIELDS]
+        self.headers = intern_headers(extra)
+        self.props = tuple(product[key] for key in extra)
+
+    def get(self, key, default=None):
+        """Значение поля или свойства, как dict.get у исходного словаря товара"""
+        if key in Product.FIELDS and hasattr(self, key):
+            return getattr(self, key)
+        try:
+            return self.props[self.headers.index(key)]
+        except ValueError:
+            return default
+
+    def excel_row(self):
+        """Строка общего листа Excel (раскладка полей зависит от data_type)"""
+        row = {'category': self.category, 'subcategory': self.path}
+        if self.data_type == 'table_product':
+            row['block_title'] = self.block.title
+            row['block_image'] = self.block.image
+        if self.data_type == 'custom_list_product':
+            row['name'] = self.get('name', '')
+            row['url'] = self.get('url', '')
+            row['image_url'] = self.get('image_url', '')
+            row['price'] = self.get('price', '')
+            row['preorder_price'] = self.get('preorder_price', '')
+            row['is_preorder'] = self.get('is_preorder', False)
+            skip = ('price', 'preorder_price', 'is_preorder')
+        else:
+            row['name'] = self.get('name', '')
+            row['url'] = self.get('url', '')
+            row['article'] = self.get('article', '')
+            row['image_url'] = self.get('image_url', '')
+            skip = ()
+        row['timestamp'] = self.timestamp
+        row['data_type'] = self.data_type
+        if self.data_type == 'table_product':
+            row['table_headers'] = self.block.table_headers  # Сохраняем заголовки как список
+
+        # Дополнительные параметры товара БЕЗ префикса
+        extras = zip(self.headers, self.props)
+        if self.data_type == 'custom_list_product' and hasattr(self, 'article'):
+            extras = [('article', self.article)] + list(extras)
+        for key, value in extras:
+            if key not in skip and not key.startswith('_'):
+                row[key] = str(value) if value is not None else ''
+        return row
+
+    def csv_row(self):
+        """Строка CSV-файла блоков (table_product) или списка custom_list"""
+        if self.data_type == 'custom_list_product':
+            return {
+                'category': self.category,
+                'subcategory': self.path,
+                'product_name': self.get('name', ''),
+                'product_url': self.get('url', ''),
+                'image_url': self.get('image_url', ''),
+                'price': self.get('price', ''),
+                'preorder_price': self.get('preorder_price', ''),
+                'is_preorder': self.get('is_preorder', False),
+                'timestamp': self.timestamp
+            }
+
+        row = {
+            'category': self.category,
+            'subcategory': self.path,
+            'block_title': self.block.title,
+            'block_image': self.block.image,
+            'table_headers': ', '.join(self.block.table_headers),
+            'product_name': self.get('name', ''),
+            'product_url': self.get('url', ''),
+            'product_article': self.get('article', ''),
+            'timestamp': self.timestamp
+        }
+        # Все дополнительные параметры товара (изображение товара идет первым, как в словаре товара)
+        params = list(zip(self.headers, self.props))
+        if hasattr(self, 'image_url'):
+            params.insert(0, ('image_url', self.image_url))
+        for key, value in params:
+            row[f'param_{key}'] = str(value)
+        return row
+
+    def category_row(self):
+        """Строка листа категории: товары блока без цены в основных полях, остальные — с ценой"""
+        row = {
+            "category": self.category,
+            "subcategory_path": self.path,
+            "block_title": self.block.title if self.block else "",
+            "block_image": self.block.image if self.block else "",
+            "name": self.get("name", ""),
+            "article": self.get("article", ""),
+            "url": self.get("url", ""),
+            "image_url": self.get("image_url", "")
+        }
+        skip = ()
+        if self.block is None:
+            row["price"] = self.get("price", "")
+            skip = ("price",)
+        row["timestamp"] = self.timestamp
+
+        # Все остальные характеристики товара
+        for key, value in zip(self.headers, self.props):
+            if key not in skip:
+                row[key] = value
+        return row
+
+class ProductStore:
+    """
+    Колоночное хранилище строк товаров с дозаписью в конец.
+    Повторяющиеся строковые поля (категория, путь, блок, время, тип) — колонки кодов
+    array('q') в словарях RunDictionary (-1 — пусто); остальные поля — разреженные колонки:
+    битовая карта заполненности и значения только заполненных строк. Для каждой строки
+    хранится код набора ее ключей, поэтому строка восстанавливается с тем же порядком полей.
+    """
+    def __init__(self, coded):
+        self.coded = coded  # {имя колонки: RunDictionary}
+        self.codes = {}  # {имя колонки: array('q')}
+        self.sparse = {}  # {имя колонки: (bytearray битовой карты, список значений)}
+        self.columns = {}  # Все колонки в порядке первого появления (как у DataFrame из словарей)
+        self.layouts = RunDictionary()  # Наборы ключей строк
+        self.layout_codes = array("q")
+
+    def __len__(self):
+        return len(self.layout_codes)
+
+    def append(self, row):
+        index = len(self.layout_codes)
+        self.layout_codes.append(self.layouts.encode(tuple(row)))
+        for name, value in row.items():
+            self.columns.setdefault(name, None)
+            if name in self.coded:
+                if name not in self.codes:
+                    self.codes[name] = array("q", [-1]) * index
+                self.codes[name].append(self.coded[name].encode(value))
+            else:
+                bitmap, values = self.sparse.setdefault(name, (bytearray(), []))
+                if len(bitmap) <= index >> 3:
+                    bitmap.extend(bytes((index >> 3) + 1 - len(bitmap)))
+                bitmap[index >> 3] |= 1 << (index & 7)
+                values.append(value)
+        for name, column in self.codes.items():
+            if len(column) <= index:
+                column.append(-1)
+
+    def rows(self):
+        """Строки в исходном виде (словари с исходным порядком ключей)"""
+        cursors = dict.fromkeys(self.sparse, 0)
+        for index, layout_code in enumerate(self.layout_codes):
+            row = {}
+            for name in self.layouts.decode(layout_code):
+                if name in self.coded:
+                    row[name] = self.coded[name].decode(self.codes[name][index])
+                else:
+                    row[name] = self.sparse[name][1][cursors[name]]
+                    cursors[name] += 1
+            yield row
+
+    def row(self, index):
+        return next(itertools.islice(self.rows(), index, None))
+
+    def column_codes(self, name):
+        """Коды колонки-словаря как массив numpy без копирования"""
+        return np.frombuffer(self.codes[name], dtype=np.int64)
+
+    def to_frame(self, columns=None):
+        """
+        DataFrame с колонками в порядке первого появления: колонки-словари —
+        pd.Categorical поверх кодов, разреженные — значения на своих строках, пропуски NaN.
+        """
+        size = len(self)
+        data = {}
+        for name in columns or self.columns:
+            if name in self.codes:
+                data[name] = pd.Categorical.from_codes(self.column_codes(name), categories=self.coded[name].values)
+            elif name in self.sparse:
+                bitmap, values = self.sparse[name]
+                if len(values) == size:
+                    data[name] = pd.Series(values)
+                    continue
+                mask = np.unpackbits(np.frombuffer(bytes(bitmap), dtype=np.uint8), count=size, bitorder="little").astype(bool)
+                column = np.full(size, np.nan, dtype=object)
+                column[mask] = np.fromiter(values, dtype=object, count=len(values))  # Списки остаются значениями
+                data[name] = pd.Series(column).infer_objects()  # Типы как у DataFrame из словарей
+        return pd.DataFrame(data, columns=list(data))
+
+    def to_arrow(self, columns=None):
+        """Таблица pyarrow (колонки-словари — DictionaryArray) или None без pyarrow"""
+        if pa is None:
+            return None
+        return pa.Table.from_pandas(self.to_frame(columns), preserve_index=False)
+
+    def layout_rows(self):
+        """{набор ключей: индексы строк} — строки с одинаковыми полями"""
+        groups = {}
+        for index, layout_code in enumerate(self.layout_codes):
+            groups.setdefault(layout_code, []).append(index)
+        return {self.layouts.decode(code): indices for code, indices in groups.items()}
+
+def create_excel_store():
+    """Хранилище общего листа: категория, подкатегория, блок, время и тип — коды словарей"""
+    return ProductStore({
+        "category": run_dictionaries["category"],
+        "subcategory": run_dictionaries["path"],
+        "block_title": run_dictionaries["block_title"],
+        "block_image": run_dictionaries["block_image"],
+        "timestamp": run_dictionaries["timestamp"],
+        "data_type": run_dictionaries["data_type"]
+    })
+
+def create_category_store():
+    """Хранилище листа категории"""
+    return ProductStore({
+        "category": run_dictionaries["category"],
+        "subcategory_path": run_dictionaries["path"],
+        "block_title": run_dictionaries["block_title"],
+        "block_image": run_dictionaries["block_image"],
+        "timestamp": run_dictionaries["timestamp"]
+    })
 
 # === CSV и асинхронные утилиты ===
 
 # Глобальный накопитель данных для Excel
 excel_data_collector = {
-    "all_products": [],  # Все товары в одной таблице
+    "all_products": create_excel_store(),  # Все товары в одной таблице (колоночное хранилище)
     "categories_summary": [],  # Сводка по категориям
     "parsing_log": []  # Лог парсинга
 }
@@ -38,24 +368,977 @@ parsing_state = {
     "start_time": None
 }
 
+# Настройки движка загрузки страниц
+fetch_config = {
+    "engine": "http",  # "http" — сначала HTTP-клиент, Selenium как запасной вариант; "selenium" — только браузер
+    "timeout": 15,
+    "pool_size": 10,  # Размер пула keep-alive соединений на хост
+    "min_page_size": 1000,
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    # Страница считается отрисованной на сервере, если найден хотя бы один из маркеров
+    "static_markers": [
+        "div.sections_wrapper.block",
+        "div.display_list.custom_list.show_un_props",
+        ".list_item.item_info.catalog-adaptive",
+        ".list_item_wrapp",
+        "div.razdel.table_all",
+        "tr.main_item_wrapper",
+        ".product-detail-gallery__container",
+        "h1[itemprop='name']",
+        ".catalog_section_list"
+    ]
+}
+
+browser_driver = None  # Экземпляр Chrome (Selenium)
+static_driver = None  # Экземпляр HTTP-движка
+
+# === HTTP-движок загрузки страниц ===
+
+_css_selector_cache = {}
+
+def _static_select(node, by, value):
+    """Выполняет поиск элементов в lxml-дереве по стратегии Selenium"""
+    if by == By.CSS_SELECTOR or by == By.CLASS_NAME:
+        if by == By.CLASS_NAME:
+            value = "." + value
+        selector = _css_selector_cache.get(value)
+        if selector is None:
+            selector = CSSSelector(value, translator="html")
+            _css_selector_cache[value] = selector
+        # Как и WebElement.find_elements, возвращаем только потомков
+        return [n for n in selector(node) if n is not node]
+    if by == By.XPATH:
+        return [n for n in node.xpath(value) if isinstance(n, lxml.html.HtmlElement)]
+    if by == By.TAG_NAME:
+        return list(node.iterdescendants(value))
+    raise ValueError(f"Стратегия поиска {by} не поддерживается HTTP-движком")
+
+class StaticElement:
+    """Элемент HTML-документа с интерфейсом WebElement (find_element, get_attribute, text)"""
+    def __init__(self, node, page):
+        self.node = node
+        self.page = page
+
+    def find_elements(self, by, value):
+        return [StaticElement(n, self.page) for n in _static_select(self.node, by, value)]
+
+    def find_element(self, by, value):
+        found = _static_select(self.node, by, value)
+        if not found:
+            raise NoSuchElementException(f"Элемент не найден: {value}")
+        return StaticElement(found[0], self.page)
+
+    def get_attribute(self, name):
+        value = self.node.get(name)
+        # Selenium возвращает href и src уже абсолютными
+        if value is not None and name in ("href", "src"):
+            return urljoin(self.page.current_url, value)
+        return value
+
+    @property
+    def text(self):
+        """
+        Текст элемента, но не в точности WebElement.text: пробелы и переводы строк
+        схлопываются в один пробел, а текст скрытых элементов (display: none) не
+        отбрасывается — о раскладке lxml ничего не знает. В снимке DOMSnapshot
+        тексты, которые браузер не отрисовал, отброшены еще при построении дерева.
+        """
+        return " ".join(self.node.text_content().split())
+
+def create_http_session():
+    """Создает HTTP-сессию с пулом keep-alive соединений"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=fetch_config["pool_size"], pool_maxsize=fetch_config["pool_size"])
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": fetch_config["user_agent"],
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8"
+    })
+    return session
+
+class ParsedPage:
+    """
+    Документ HTML, разобранный lxml, с интерфейсом WebDriver для чтения
+    (find_elements, page_source, title). Общая основа HTTP-движка и снимков браузера.
+    """
+    def load(self, url, html, status_code=200):
+        """Разбирает готовый HTML (без сетевых запросов)"""
+        self.current_url = url
+        self.page_source = html
+        self.status_code = status_code
+        self.tree = lxml.html.document_fromstring(html) if html.strip() else None
+
+    @property
+    def title(self):
+        if self.tree is None:
+            return ""
+        return (self.tree.findtext(".//title") or "").strip()
+
+    def find_elements(self, by, value):
+        if self.tree is None:
+            return []
+        return [StaticElement(n, self) for n in _static_select(self.tree, by, value)]
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f"Элемент не найден: {value}")
+        return found[0]
+
+    def execute_script(self, script, *args):
+        """Поддерживает только простые обращения к свойствам элемента, которые используют парсеры"""
+        script = script.strip()
+        if script in ("return arguments[0].textContent;", "return arguments[0].textContent"):
+            return args[0].node.text_content()
+        if script in ("return arguments[0].previousElementSibling;", "return arguments[0].previousElementSibling"):
+            prev = args[0].node.getprevious()
+            while prev is not None and not isinstance(prev, lxml.html.HtmlElement):
+                prev = prev.getprevious()
+            return StaticElement(prev, self) if prev is not None else None
+        raise NotImplementedError("Разобранный документ не выполняет JavaScript")
+
+    def health_info(self, markers):
+        """Те же сведения о странице, что собирает _PAGE_HEALTH_SCRIPT в браузере"""
+        if self.tree is None:
+            text = ""
+            found = []
+        else:
+            text = self.tree.text_content()
+            found = [marker for marker in markers if _static_select(self.tree, By.CSS_SELECTOR, marker)]
+        return {
+            "ready_state": "complete",
+            "status": self.status_code,
+            "title": self.title,
+            "text_length": len(text),
+            "text_sample": text[:2000].lower(),
+            "markers": found
+        }
+
+class StaticDriver(ParsedPage):
+    """
+    HTTP-движок: скачивает HTML без браузера и отдает его парсерам
+    через тот же интерфейс, что и WebDriver (get, find_elements, page_source, title).
+    """
+    def __init__(self, session=None):
+        self.session = session or create_http_session()
+        self.current_url = ""
+        self.page_source = ""
+        self.status_code = None
+        self.tree = None
+
+    def fetch(self, url):
+        """Скачивает страницу и возвращает (url после редиректов, HTML, код ответа)"""
+        response = self.session.get(url, timeout=fetch_config["timeout"])
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            response.encoding = response.apparent_encoding
+        return response.url, response.text, response.status_code
+
+    def get(self, url):
+        self.load(*self.fetch(url))
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    def quit(self):
+        self.session.close()
+
+def http_engine_available():
+    """Проверяет, что HTTP-движок включен и его зависимости установлены"""
+    return fetch_config["engine"] == "http" and requests is not None and lxml is not None
+
+def get_static_driver():
+    """Возвращает общий экземпляр HTTP-движка"""
+    global static_driver
+    if static_driver is None:
+        static_driver = StaticDriver()
+    return static_driver
+
+def is_static_page_usable(page):
+    """Страницу можно парсить без браузера, если она загрузилась и содержит известные маркеры каталога"""
+    if page.status_code != 200 or page.tree is None or len(page.page_source) < fetch_config["min_page_size"]:
+        return False
+    health = check_page_health(fetch_config["static_markers"], target=page)
+    return health["verdict"] == "ok" and bool(health["markers"])
+
+def load_static_page(url):
+    """Загружает страницу HTTP-движком. Возвращает True, если браузер не нужен"""
+    page = get_static_driver()
+    try:
+        page.get(url)
+    except Exception as e:
+        print(f"   ⚠️ HTTP-загрузка не удалась ({e}), используем браузер")
+        return False
+
+    if is_static_page_usable(page):
+        return True
+
+    print(f"   ⚠️ Страница требует JavaScript (код {page.status_code}), используем браузер")
+    return False
+
+# Разбор снимка страницы браузера без обращений к WebDriver
+snapshot_config = {
+    "enabled": True,
+    # "dom_snapshot" — DevTools DOMSnapshot.captureSnapshot (живой DOM без сериализации в HTML),
+    # "page_source" — HTML страницы; при ошибке CDP снимок переключается на page_source
+    "backend": "dom_snapshot"
+}
+
+def dom_snapshot_tree(snapshot):
+    """
+    Строит дерево lxml из плоских массивов DOMSnapshot.captureSnapshot (узлы, атрибуты
+    и тексты ссылаются на общую таблицу строк). Узлы идут в порядке документа, поэтому
+    родитель каждого узла уже построен. Вложенные документы и shadow DOM пропускаются.
+    Тексты без объекта раскладки (скрытые, внутри script и style) не попадают в дерево,
+    как и в WebElement.text.
+    Возвращает (адрес документа, корневой элемент).
+    """
+    strings = snapshot["strings"]
+    document = snapshot["documents"][0]
+    nodes = document["nodes"]
+    value = lambda index: strings[index] if index >= 0 else ""
+    layout = document.get("layout", {}).get("nodeIndex")
+    rendered = set(layout) if layout else None  # Без сведений о раскладке тексты не фильтруются
+
+    elements = {}  # Индекс узла → элемент lxml
+    root = None
+    for index, parent_index in enumerate(nodes["parentIndex"]):
+        node_type = nodes["nodeType"][index]
+        parent = elements.get(parent_index)
+        if node_type == 1 and (parent is not None or root is None):
+            tag = value(nodes["nodeName"][index]).lower()
+            try:
+                element = lxml.html.Element(tag) if parent is None else lxml.etree.SubElement(parent, tag)
+            except ValueError:
+                continue  # Имя тега, недопустимое для lxml: поддерево пропускается
+            attributes = nodes["attributes"][index]
+            for name_index, value_index in zip(attributes[::2], attributes[1::2]):
+                try:
+                    element.set(value(name_index), value(value_index))
+                except ValueError:
+                    pass
+            elements[index] = element
+            root = root if root is not None else element
+        elif node_type == 3 and parent is not None and (rendered is None or index in rendered):
+            text = value(nodes["nodeValue"][index])
+            if len(parent):
+                parent[-1].tail = (parent[-1].tail or "") + text
+            else:
+                parent.text = (parent.text or "") + text
+    return value(document["documentURL"]), root
+
+class SnapshotDriver(ParsedPage):
+    """
+    Снимок страницы браузера, разобранный lxml: парсеры читают дерево в процессе,
+    а переходы и обновления выполняет браузер с новым снимком. Снимок снимается одним
+    вызовом DOMSnapshot.captureSnapshot (или page_source) независимо от размера страницы.
+    Извлечение списков, таблиц и schema.org идет по дереву снимка (как у HTTP-движка);
+    в браузер передаются только прочие скрипты без элементов снимка в аргументах.
+    """
+    def __init__(self, browser):
+        self.browser = browser
+        self.session = None
+        self.capture()
+
+    @property
+    def page_source(self):
+        # У снимка DOMSnapshot HTML собирается только по запросу
+        if self._page_source is None:
+            self._page_source = lxml.html.tostring(self.tree, encoding="unicode") if self.tree is not None else ""
+        return self._page_source
+
+    @page_source.setter
+    def page_source(self, html):
+        self._page_source = html
+
+    def capture(self):
+        if snapshot_config["backend"] == "dom_snapshot":
+            try:
+                snapshot = self.browser.execute_cdp_cmd("DOMSnapshot.captureSnapshot", {"computedStyles": []})
+                self.current_url, self.tree = dom_snapshot_tree(snapshot)
+                self.page_source = None
+                self.status_code = 200
+                return
+            except Exception as e:
+                print(f"   ⚠️ DOMSnapshot недоступен ({e}), снимки страниц через page_source")
+                snapshot_config["backend"] = "page_source"
+        self.load(self.browser.current_url, self.browser.page_source, 200)
+
+    def get(self, url):
+        self.browser.get(url)
+        note_browser_page(self.browser)
+        wait_for_page_ready(target=self.browser)
+        self.capture()
+
+    def refresh(self):
+        self.browser.refresh()
+        wait_for_page_ready(target=self.browser)
+        self.capture()
+
+    def execute_script(self, script, *args):
+        # Элементы снимка браузеру не передать: обращения к ним выполняет lxml
+        if any(isinstance(arg, StaticElement) for arg in args):
+            return super().execute_script(script, *args)
+        return self.browser.execute_script(script, *args)
+
+    def quit(self):
+        pass  # Браузером владеет пул
+
+# === Пул браузеров ===
+
+# Настройки пула сессий Chrome
+pool_config = {
+    "size": 2,  # Максимум одновременно запущенных браузеров
+    "headless": False,
+    "async_headless": True,  # Браузеры параллельной обработки категорий (AsyncWebDriver) — без окон
+    "acquire_timeout": 300  # Сколько ждать свободный браузер, секунд
+}
+
+# Профиль блокировки ресурсов: парсеру нужны только адреса изображений, а не сами файлы
+resource_blocking = {
+    "enabled": True,
+    # Какие ресурсы не загружать. "stylesheet" — только по явному выбору: без CSS видны
+    # скрытые стилями элементы, и в WebElement.text и текст пакетных скриптов попадает лишнее
+    "block_types": ["image", "font", "media"],
+    # Ресурсы узнаются по расширению файла в адресе (шаблоны Network.setBlockedURLs),
+    # а не по настоящему типу запроса: файл без расширения или с другим расширением не блокируется
+    "type_patterns": {
+        "image": ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"],
+        "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+        "stylesheet": ["*.css"],
+        "media": ["*.mp4", "*.webm", "*.mp3", "*.ogg"]
+    },
+    # Сторонние скрипты: аналитика, чаты, соцсети
+    "deny_domains": [
+        "mc.yandex.ru",
+        "yastatic.net",
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "top-fwz1.mail.ru",
+        "vk.com",
+        "userapi.com",
+        "jivosite.com",
+        "code.jivo.ru",
+        "callibri.ru",
+        "facebook.net"
+    ],
+    "allow_domains": []  # Домены, которые никогда не блокируются (приоритетнее deny_domains)
+}
+
+def _domain_matches(domain, parent):
+    return domain == parent or domain.endswith("." + parent)
+
+def build_blocked_url_patterns():
+    """
+    Собирает шаблоны URL для Network.setBlockedURLs из профиля блокировки: типы ресурсов
+    превращаются в шаблоны расширений файлов (*.jpg, *.jpg?*), домены — в шаблоны хостов.
+    """
+    patterns = []
+    for resource_type in resource_blocking["block_types"]:
+        for pattern in resource_blocking["type_patterns"].get(resource_type, []):
+            patterns.extend([pattern, pattern + "?*"])
+
+    for domain in resource_blocking["deny_domains"]:
+        if any(_domain_matches(allowed, domain) or _domain_matches(domain, allowed)
+               for allowed in resource_blocking["allow_domains"]):
+            continue
+        patterns.extend([f"*://{domain}/*", f"*://*.{domain}/*"])
+    return patterns
+
+def apply_resource_blocking(target):
+    """Включает блокировку ресурсов в текущей вкладке браузера через DevTools"""
+    if not resource_blocking["enabled"]:
+        return
+    try:
+        target.execute_cdp_cmd("Network.enable", {})
+        target.execute_cdp_cmd("Network.setBlockedURLs", {"urls": build_blocked_url_patterns()})
+    except Exception as e:
+        print(f"⚠️ Не удалось включить блокировку ресурсов: {e}")
+
+# Постоянные профили Chrome: после перезапуска браузер стартует с "теплым" кэшем, cookies и DNS
+profile_config = {
+    "enabled": True,
+    "base_dir": "chrome_profiles",
+    "shared_cache": False,  # True — один дисковый кэш на все слоты пула
+    "cache_size_mb": 512,  # Ограничение дискового кэша Chrome
+    "max_profile_mb": 2048,  # При превышении кэши профиля очищаются перед запуском
+    "keep_after_run": True  # False — профили удаляются после завершения работы
+}
+
+# Каталоги профиля, которые можно удалять без потери cookies и настроек
+_PROFILE_CACHE_DIRS = [
+    "cache",
+    os.path.join("Default", "Cache"),
+    os.path.join("Default", "Code Cache"),
+    os.path.join("Default", "GPUCache"),
+    os.path.join("Default", "Service Worker", "CacheStorage"),
+    "ShaderCache",
+    "GrShaderCache"
+]
+
+def _dir_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total / 1024 / 1024
+
+def get_profile_dirs(slot):
+    """Возвращает (каталог профиля, каталог дискового кэша) для слота пула"""
+    profile_dir = os.path.abspath(os.path.join(profile_config["base_dir"], f"slot_{slot}"))
+    if profile_config["shared_cache"]:
+        cache_dir = os.path.abspath(os.path.join(profile_config["base_dir"], "shared_cache"))
+    else:
+        cache_dir = os.path.join(profile_dir, "cache")
+    return profile_dir, cache_dir
+
+def prepare_chrome_profile(slot):
+    """Создает каталог профиля слота и очищает его кэши, если профиль превысил лимит"""
+    profile_dir, cache_dir = get_profile_dirs(slot)
+    os.makedirs(profile_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Блокировки от аварийно завершенного Chrome мешают запуску
+    for lock_name in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+        lock_path = os.path.join(profile_dir, lock_name)
+        if os.path.lexists(lock_path):
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    size_mb = _dir_size_mb(profile_dir)
+    if size_mb > profile_config["max_profile_mb"]:
+        print(f"🧹 Профиль слота {slot} занимает {size_mb:.0f} МБ, очищаем кэш")
+        for cache_name in _PROFILE_CACHE_DIRS:
+            shutil.rmtree(os.path.join(profile_dir, cache_name), ignore_errors=True)
+    return profile_dir, cache_dir
+
+def cleanup_chrome_profiles():
+    """Полностью удаляет все сохраненные профили Chrome"""
+    if os.path.exists(profile_config["base_dir"]):
+        shutil.rmtree(profile_config["base_dir"], ignore_errors=True)
+        print(f"🧹 Профили Chrome удалены: {profile_config['base_dir']}")
+
+def create_chrome_options(headless=False, slot=None):
+    """Собирает настройки Chrome, общие для всех режимов"""
+    chrome_options = Options()
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-plugins")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--memory-pressure-off")
+    if headless:
+        chrome_options.add_argument("--headless")
+    if resource_blocking["enabled"] and "image" in resource_blocking["block_types"]:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    if profile_config["enabled"] and slot is not None:
+        profile_dir, cache_dir = prepare_chrome_profile(slot)
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+        chrome_options.add_argument(f"--disk-cache-dir={cache_dir}")
+        chrome_options.add_argument(f"--disk-cache-size={profile_config['cache_size_mb'] * 1024 * 1024}")
+    if ajax_config["capture"]:
+        # Сетевой журнал DevTools для поиска AJAX-эндпоинтов каталога
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return chrome_options
+
+def create_chrome_driver(headless=False, slot=None):
+    """Запускает новый экземпляр Chrome с профилем блокировки ресурсов"""
+    new_driver = webdriver.Chrome(options=create_chrome_options(headless, slot))
+    apply_resource_blocking(new_driver)
+    return new_driver
+
+class DriverPool:
+    """
+    Пул долгоживущих сессий Chrome. Браузер берется через acquire()/lease()
+    и возвращается через release(), поэтому кэш и соединения сохраняются между категориями.
+    """
+    def __init__(self, size, headless=False):
+        self.size = size
+        self.headless = headless
+        self.idle = queue.LifoQueue()  # Последний возвращенный браузер — самый "теплый"
+        self.slots = {}  # Браузер → номер слота (у каждого слота свой профиль Chrome)
+        self.modes = {}  # Браузер → запущен ли он в фоновом режиме (headless)
+        self.free_slots = list(range(size))
+        self.lock = threading.Lock()
+
+    def is_healthy(self, pooled_driver):
+        """Проверяет, что сессия браузера жива"""
+        try:
+            pooled_driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    def _reserve_slot(self):
+        """Занимает свободный слот; перезапущенный браузер получает тот же профиль"""
+        with self.lock:
+            if not self.free_slots:
+                return None
+            self.free_slots.sort()
+            return self.free_slots.pop(0)
+
+    def _create(self, slot, headless):
+        try:
+            new_driver = create_chrome_driver(headless, slot)
+        except Exception:
+            with self.lock:
+                self.free_slots.append(slot)
+            raise
+        with self.lock:
+            self.slots[new_driver] = slot
+            self.modes[new_driver] = headless
+        return new_driver
+
+    def acquire(self, timeout=None, headless=None):
+        """
+        Выдает исправный браузер: свободный из пула или новый, если пул не заполнен.
+        headless — нужный режим (по умолчанию режим пула); свободный браузер другого
+        режима остается в пуле, если есть незанятый слот, иначе заменяется.
+        """
+        timeout = pool_config["acquire_timeout"] if timeout is None else timeout
+        headless = self.headless if headless is None else headless
+        deadline = time.time() + timeout
+        while True:
+            try:
+                pooled_driver = self.idle.get_nowait()
+            except queue.Empty:
+                slot = self._reserve_slot()
+                if slot is not None:
+                    return self._create(slot, headless)
+                if time.time() >= deadline:
+                    raise TimeoutError("Нет свободных браузеров в пуле")
+                try:
+                    pooled_driver = self.idle.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+            if self.modes.get(pooled_driver) != headless:
+                slot = self._reserve_slot()
+                if slot is not None:
+                    self.idle.put(pooled_driver)
+                    return self._create(slot, headless)
+                self.discard(pooled_driver)  # Слот освобождается под браузер нужного режима
+                continue
+
+            if self.is_healthy(pooled_driver):
+                return pooled_driver
+            print("⚠️ Сессия браузера не отвечает, заменяем")
+            self.discard(pooled_driver)
+
+    def release(self, pooled_driver):
+        """Возвращает браузер в пул"""
+        if pooled_driver is None:
+            return
+        reason = browser_needs_recycle(pooled_driver)
+        if reason:
+            record_browser_recycle(pooled_driver, reason)
+            self.discard(pooled_driver)
+        elif self.is_healthy(pooled_driver):
+            self.idle.put(pooled_driver)
+        else:
+            self.discard(pooled_driver)
+
+    def discard(self, pooled_driver):
+        """
+        Закрывает браузер и освобождает его место в пуле. Слот возвращается только
+        после quit(): новый браузер слота не должен стартовать на профиле, который еще занят.
+        """
+        with self.lock:
+            slot = self.slots.pop(pooled_driver, None)
+            self.modes.pop(pooled_driver, None)
+        browser_page_counts.pop(getattr(pooled_driver, "session_id", None), None)
+        try:
+            pooled_driver.quit()
+        except Exception:
+            pass
+        finally:
+            if slot is not None:
+                with self.lock:
+                    self.free_slots.append(slot)
+
+    @contextmanager
+    def lease(self):
+        """Браузер во временное пользование: with driver_pool.lease() as d: ..."""
+        pooled_driver = self.acquire()
+        try:
+            yield pooled_driver
+        finally:
+            self.release(pooled_driver)
+
+    def shutdown(self):
+        """Закрывает все браузеры пула"""
+        with self.lock:
+            slots = dict(self.slots)
+            self.slots.clear()
+            self.modes.clear()
+        for pooled_driver in slots:
+            try:
+                pooled_driver.quit()
+            except Exception:
+                pass
+        with self.lock:
+            self.free_slots.extend(slots.values())
+        while not self.idle.empty():
+            self.idle.get_nowait()
+
+driver_pool = DriverPool(pool_config["size"], pool_config["headless"])
+
+# === Ожидание готовности страницы ===
+
+# Маркеры готовности по типам страниц
+READINESS_MARKERS = {
+    "table": ["tr.main_item_wrapper", "div.razdel.table_all"],
+    "sections": ["div.sections_wrapper.block", ".catalog_section_list"],
+    "list": [".list_item.item_info.catalog-adaptive", ".list_item_wrapp", "div.display_list.custom_list.show_un_props"],
+    "product": [".product-detail-gallery__container", ".product-main", "h1[itemprop='name']"],
+    "menu": ["a.icons_fa.parent.rounded2.bordered"]
+}
+READINESS_MARKERS["any"] = (READINESS_MARKERS["table"] + READINESS_MARKERS["sections"] +
+                            READINESS_MARKERS["list"] + READINESS_MARKERS["product"])
+
+readiness_config = {
+    "timeout": 10,  # Максимальное ожидание, секунд
+    "poll_interval": 0.1,
+    "marker_grace": 1.0  # Сколько ждать маркер после document.readyState == 'complete'
+}
+
+# Один вызов на опрос: состояние документа и наличие любого из маркеров
+_READY_STATE_SCRIPT = """
+var selectors = arguments[0];
+if (document.readyState === 'loading') return 'loading';
+for (var i = 0; i < selectors.length; i++) {
+    if (document.querySelector(selectors[i])) return 'ready';
+}
+return document.readyState;
+"""
+
+def wait_for_page_ready(page_type="any", timeout=None, target=None):
+    """
+    Ждет, пока страница станет пригодной для парсинга: появится маркер
+    указанного типа ("table", "sections", "list", "product", "menu", "any").
+    Возвращает True, если маркер найден, и False по таймауту.
+    """
+    target = target or driver
+    if isinstance(target, ParsedPage):
+        return True  # HTML уже загружен целиком
+
+    markers = READINESS_MARKERS.get(page_type, READINESS_MARKERS["any"])
+    timeout = readiness_config["timeout"] if timeout is None else timeout
+    start = time.time()
+    complete_since = None
+
+    while True:
+        try:
+            state = target.execute_script(_READY_STATE_SCRIPT, markers)
+        except Exception:
+            state = "loading"
+
+        if state == "ready":
+            return True
+
+        now = time.time()
+        if state == "complete":
+            # Документ загружен, но маркера нет — даем немного времени на отрисовку скриптами
+            if complete_since is None:
+                complete_since = now
+            elif now - complete_since >= readiness_config["marker_grace"]:
+                return False
+        if now - start >= timeout:
+            print(f"   ⚠️ Страница не дождалась готовности ({page_type}) за {timeout} с")
+            return False
+        time.sleep(readiness_config["poll_interval"])
+
+# === Проверка состояния страницы ===
+
+page_health_config = {
+    "min_text_length": 200,  # Меньше — страница считается пустой
+    "error_titles": ["Error", "Ошибка 404", "Страница не найдена"],
+    "blocked_markers": ["captcha", "ddos-guard", "access denied", "доступ запрещен", "too many requests"]
+}
+
+last_page_health = {}  # Последний вердикт проверки страницы
+
+# Один вызов скрипта: код ответа навигации, заголовок, объем текста и найденные маркеры
+_PAGE_HEALTH_SCRIPT = """
+var markers = arguments[0];
+var nav = performance.getEntriesByType('navigation')[0];
+var text = document.body ? document.body.textContent : '';
+var found = [];
+for (var i = 0; i < markers.length; i++) {
+    if (document.querySelector(markers[i])) found.push(markers[i]);
+}
+return {
+    ready_state: document.readyState,
+    status: nav && nav.responseStatus ? nav.responseStatus : null,
+    title: document.title,
+    text_length: text.length,
+    text_sample: text.slice(0, 2000).toLowerCase(),
+    markers: found
+};
+"""
+
+def _page_verdict(info):
+    """ok / soft_error / blocked / empty по сведениям о странице"""
+    status = info.get("status")
+    title = info.get("title") or ""
+    blocked_text = any(marker in title.lower() for marker in page_health_config["blocked_markers"])
+    if not info["markers"]:
+        blocked_text = blocked_text or any(marker in info.get("text_sample", "") for marker in page_health_config["blocked_markers"])
+
+    if status in (403, 429) or blocked_text:
+        return "blocked"
+    if (status and status >= 400) or any(marker in title for marker in page_health_config["error_titles"]):
+        return "soft_error"
+    if info["markers"]:
+        return "ok"
+    if info.get("text_length", 0) < page_health_config["min_text_length"]:
+        return "empty"
+    return "ok"
+
+def check_page_health(markers=None, target=None):
+    """
+    Проверяет загруженную страницу без выгрузки page_source: один вызов скрипта
+    возвращает код ответа, заголовок, объем текста и найденные маркеры.
+    Результат содержит поле verdict: "ok", "soft_error", "blocked" или "empty".
+    """
+    global last_page_health
+    target = target or driver
+    markers = READINESS_MARKERS["any"] if markers is None else markers
+
+    if isinstance(target, ParsedPage):
+        info = target.health_info(markers)
+    else:
+        info = target.execute_script(_PAGE_HEALTH_SCRIPT, markers) or {}
+        info.setdefault("markers", [])
+
+    info["verdict"] = _page_verdict(info)
+    last_page_health = info
+    return info
+
+# === Перезапуск браузера по памяти ===
+
+# Пороги, после которых сессия браузера перезапускается
+recycle_config = {
+    "max_rss_mb": 1500,  # Суммарная память chromedriver и процессов Chrome
+    "max_js_heap_mb": 512,  # Куча JavaScript текущей вкладки
+    "max_pages": 500,  # Страниц на одну сессию браузера
+    "check_every": 10  # Замер памяти раз в N страниц
+}
+
+# Метрики перезапусков
+recycler_metrics = {
+    "checks": 0,
+    "recycles": 0,
+    "reasons": {},
+    "last_rss_mb": 0,
+    "last_js_heap_mb": 0,
+    "events": []
+}
+
+browser_page_counts = {}  # Страниц, открытых в каждой сессии (по session_id)
+
+def note_browser_page(target):
+    """Учитывает переход на страницу в сессии браузера"""
+    browser_page_counts[target.session_id] = browser_page_counts.get(target.session_id, 0) + 1
+    invalidate_layout_probe()
+
+def sample_browser_memory(target):
+    """Возвращает (RSS дерева процессов chromedriver/Chrome в МБ, JS-куча вкладки в МБ)"""
+    rss_mb = 0
+    if psutil is not None:
+        try:
+            process = psutil.Process(target.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            rss = 0
+            for proc in processes:
+                try:
+                    rss += proc.memory_info().rss
+                except psutil.Error:
+                    continue
+            rss_mb = rss / 1024 / 1024
+        except Exception:
+            pass
+
+    js_heap_mb = 0
+    try:
+        used = target.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : 0;")
+        js_heap_mb = (used or 0) / 1024 / 1024
+    except Exception:
+        pass
+    return rss_mb, js_heap_mb
+
+def browser_needs_recycle(target):
+    """Возвращает причину перезапуска сессии ("pages", "rss", "js_heap") или None"""
+    pages = browser_page_counts.get(getattr(target, "session_id", None), 0)
+    if pages >= recycle_config["max_pages"]:
+        return "pages"
+    if pages == 0 or pages % recycle_config["check_every"]:
+        return None
+
+    rss_mb, js_heap_mb = sample_browser_memory(target)
+    recycler_metrics["checks"] += 1
+    recycler_metrics["last_rss_mb"] = round(rss_mb)
+    recycler_metrics["last_js_heap_mb"] = round(js_heap_mb)
+    if rss_mb > recycle_config["max_rss_mb"]:
+        return "rss"
+    if js_heap_mb > recycle_config["max_js_heap_mb"]:
+        return "js_heap"
+    return None
+
+def record_browser_recycle(target, reason):
+    """Записывает перезапуск в метрики и в лог парсинга"""
+    pages = browser_page_counts.get(getattr(target, "session_id", None), 0)
+    timestamp = datetime.now().isoformat()
+    recycler_metrics["recycles"] += 1
+    recycler_metrics["reasons"][reason] = recycler_metrics["reasons"].get(reason, 0) + 1
+    recycler_metrics["events"].append({
+        "timestamp": timestamp,
+        "reason": reason,
+        "pages": pages,
+        "rss_mb": recycler_metrics["last_rss_mb"],
+        "js_heap_mb": recycler_metrics["last_js_heap_mb"]
+    })
+    excel_data_collector["parsing_log"].append({
+        'timestamp': timestamp,
+        'category': '',
+        'subcategory': '',
+        'action': f'Перезапуск браузера ({reason}): {pages} страниц, RSS {recycler_metrics["last_rss_mb"]} МБ, JS {recycler_metrics["last_js_heap_mb"]} МБ',
+        'data_type': 'browser_recycle'
+    })
+    print(f"♻️ Перезапуск браузера ({reason}): {pages} страниц, RSS {recycler_metrics['last_rss_mb']} МБ")
+
+def maybe_recycle_browser(resume=True):
+    """
+    Перезапускает основной браузер, если превышены пороги памяти или числа страниц.
+    При resume=True возвращается на последнюю успешно загруженную страницу.
+    """
+    if browser_driver is None:
+        return False
+    reason = browser_needs_recycle(browser_driver)
+    if not reason:
+        return False
+
+    record_browser_recycle(browser_driver, reason)
+    if not restart_browser():
+        return False
+    if resume and parsing_state["last_successful_url"]:
+        safe_get_page(parsing_state["last_successful_url"], allow_static=False)
+    return True
+
+def print_recycler_metrics():
+    """Выводит статистику перезапусков браузера"""
+    print(f"♻️ Перезапусков браузера: {recycler_metrics['recycles']} (замеров памяти: {recycler_metrics['checks']})")
+    for reason, count in recycler_metrics["reasons"].items():
+        print(f"   • {reason}: {count}")
+
+# === Повторы по классам ошибок ===
+
+# Число повторов, базовая и максимальная пауза (с), перезапуск браузера и обновление страницы
+RETRY_POLICY = {
+    "timeout": {"retries": 2, "base_delay": 1, "max_delay": 10, "restart": False, "reload": True},
+    "stale": {"retries": 2, "base_delay": 0.2, "max_delay": 1, "restart": False, "reload": False},
+    "session_died": {"retries": 2, "base_delay": 1, "max_delay": 5, "restart": True, "reload": True},
+    "http_5xx": {"retries": 3, "base_delay": 2, "max_delay": 30, "restart": False, "reload": True},
+    "http_429": {"retries": 3, "base_delay": 10, "max_delay": 120, "restart": False, "reload": True},
+    "empty": {"retries": 1, "base_delay": 1, "max_delay": 5, "restart": False, "reload": True},
+    "empty_valid": {"retries": 0, "base_delay": 0, "max_delay": 0, "restart": False, "reload": False},
+    "error": {"retries": 1, "base_delay": 2, "max_delay": 10, "restart": False, "reload": True}
+}
+
+# Общий бюджет повторов на запуск, чтобы сбои не растягивали парсинг бесконечно
+retry_budget = {
+    "total": 300,
+    "used": 0
+}
+
+retry_metrics = {}  # Число повторов по классам ошибок
+
+_SESSION_DIED_MARKERS = ("invalid session id", "session deleted", "chrome not reachable", "disconnected", "no such window")
+
+def classify_failure(error):
+    """Относит исключение к классу RETRY_POLICY"""
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return "session_died"
+    if isinstance(error, StaleElementReferenceException):
+        return "stale"
+    if isinstance(error, TimeoutException):
+        return "timeout"
+    if requests is not None and isinstance(error, requests.Timeout):
+        return "timeout"
+    if requests is not None and isinstance(error, requests.ConnectionError):
+        return "http_5xx"
+    message = str(error).lower()
+    if any(marker in message for marker in _SESSION_DIED_MARKERS):
+        return "session_died"
+    if "timed out" in message or "timeout" in message:
+        return "timeout"
+    return "error"
+
+def classify_page_health(health):
+    """Относит вердикт check_page_health к классу RETRY_POLICY"""
+    status = health.get("status") or 0
+    if health["verdict"] == "blocked":
+        return "http_429"
+    if status >= 500:
+        return "http_5xx"
+    if health["verdict"] == "ok":
+        return "empty_valid"
+    return "empty"
+
+def classify_empty_result():
+    """Пустой результат: проверяет страницу, на которой он получен"""
+    try:
+        return classify_page_health(check_page_health())
+    except Exception as e:
+        return classify_failure(e)
+
+def backoff_delay(failure, attempt):
+    """Экспоненциальная пауза с джиттером: половина фиксирована, половина случайна"""
+    policy = RETRY_POLICY[failure]
+    delay = min(policy["max_delay"], policy["base_delay"] * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def wait_before_retry(failure, attempt):
+    """
+    Решает, нужен ли повтор после ошибки класса failure, и выдерживает паузу.
+    Возвращает False, если повторы для класса или общий бюджет исчерпаны.
+    """
+    if attempt >= RETRY_POLICY[failure]["retries"]:
+        return False
+    if retry_budget["used"] >= retry_budget["total"]:
+        print(f"   ⛔ Бюджет повторов исчерпан ({retry_budget['total']}), повтор пропущен")
+        return False
+
+    retry_budget["used"] += 1
+    retry_metrics[failure] = retry_metrics.get(failure, 0) + 1
+    delay = backoff_delay(failure, attempt)
+    print(f"   ⏳ Повтор ({failure}) через {delay:.1f} с...")
+    time.sleep(delay)
+    return True
+
+def print_retry_metrics():
+    """Выводит статистику повторов"""
+    reasons = ", ".join(f"{name}: {count}" for name, count in retry_metrics.items()) or "нет"
+    print(f"🔁 Повторы: {retry_budget['used']} из {retry_budget['total']} ({reasons})")
+
 def restart_browser():
     """Перезапускает браузер для избежания проблем с памятью"""
-    global driver
+    global driver, browser_driver
     try:
-        if 'driver' in globals() and driver:
+        if browser_driver:
             print("🔄 Перезапуск браузера...")
-            driver.quit()
-            time.sleep(2)
+            driver_pool.discard(browser_driver)
+            browser_driver = None
         
-        chrome_options = Options()
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-plugins")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--memory-pressure-off")
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        browser_driver = driver_pool.acquire()
+        driver = browser_driver
         print("✅ Браузер перезапущен")
         return True
         
@@ -63,68 +1346,130 @@ def restart_browser():
         print(f"❌ Ошибка перезапуска браузера: {e}")
         return False
 
-def safe_get_page(url, retries=3):
-    """Безопасное получение страницы с повторными попытками"""
+def safe_get_page(url, retries=3, allow_static=True):
+    """
+    Безопасное получение страницы с повторными попытками.
+    Сначала пробует HTTP-движок, браузер используется для страниц, которым нужен JavaScript.
+    Пауза и перезапуск браузера между попытками зависят от класса ошибки (RETRY_POLICY).
+    """
     global driver
     
     for attempt in range(retries):
         try:
             print(f"   🌐 Переход на: {url} (попытка {attempt + 1})")
-            driver.get(url)
-            time.sleep(2)
-            
-            # Проверяем, что страница загрузилась
-            if "Error" not in driver.title and len(driver.page_source) > 1000:
+            if allow_static and http_engine_available() and load_static_page(url):
+                driver = static_driver
                 parsing_state["last_successful_url"] = url
                 return True
+
+            if browser_driver is None and not restart_browser():
+                continue
+            maybe_recycle_browser(resume=False)
+            driver = browser_driver
+            driver.get(url)
+            note_browser_page(driver)
+            wait_for_page_ready()
+            
+            # Проверяем, что страница загрузилась
+            health = check_page_health()
+            if health["verdict"] == "ok":
+                parsing_state["last_successful_url"] = url
+                return True
+            failure = classify_page_health(health)
+            if health["verdict"] == "blocked":
+                print(f"   ⛔ Сайт ограничил доступ (код {health['status']})")
             else:
-                print(f"   ⚠️ Страница загрузилась некорректно")
+                print(f"   ⚠️ Страница загрузилась некорректно ({health['verdict']}, код {health['status']})")
                 
         except Exception as e:
-            print(f"   ❌ Ошибка загрузки страницы (попытка {attempt + 1}): {e}")
+            failure = classify_failure(e)
+            print(f"   ❌ Ошибка загрузки страницы ({failure}, попытка {attempt + 1}): {e}")
             
-            if attempt < retries - 1:
+        if attempt < retries - 1:
+            if not wait_before_retry(failure, attempt):
+                break
+            if RETRY_POLICY[failure]["restart"]:
                 print(f"   🔄 Перезапуск браузера перед следующей попыткой...")
-                if not restart_browser():
-                    continue
-                time.sleep(3)
+                restart_browser()
             
-    print(f"   ❌ Не удалось загрузить страницу после {retries} попыток")
+    print(f"   ❌ Не удалось загрузить страницу после {attempt + 1} попыток")
     return False
 
+def recover_page(failure):
+    """Готовит страницу к повтору парсинга: перезапуск браузера или обновление страницы"""
+    invalidate_layout_probe()  # Повтор не должен видеть замер неудачной загрузки
+    if not RETRY_POLICY[failure]["restart"]:
+        if not RETRY_POLICY[failure]["reload"]:
+            return
+        try:
+            driver.refresh()
+            wait_for_page_ready()
+            return
+        except Exception as e:
+            if classify_failure(e) != "session_died":
+                print(f"   ⚠️ Не удалось обновить страницу: {e}")
+                return
+
+    print(f"   🔄 Перезапуск браузера перед следующей попыткой...")
+    restart_browser()
+    if parsing_state["last_successful_url"]:
+        safe_get_page(parsing_state["last_successful_url"], allow_static=False)
+
 def safe_parse_with_retry(parse_function, context=""):
-    """Безопасный парсинг с повторными попытками"""
-    retries = 2
+    """
+    Безопасный парсинг с повторными попытками.
+    Пустой результат на корректной странице считается ответом и не повторяется.
+    """
+    attempt = 0
     
-    for attempt in range(retries):
+    while True:
         try:
             result = parse_function()
             if result:  # Если результат не пустой
                 return result
-            else:
-                print(f"   ⚠️ Пустой результат при парсинге {context} (попытка {attempt + 1})")
+            failure = classify_empty_result()
+            if failure == "empty_valid":
+                print(f"   ℹ️ Пустой результат при парсинге {context}: страница корректна, повтор не нужен")
+                return result
+            print(f"   ⚠️ Пустой результат при парсинге {context} ({failure}, попытка {attempt + 1})")
                 
         except Exception as e:
-            print(f"   ❌ Ошибка парсинга {context} (попытка {attempt + 1}): {e}")
+            failure = classify_failure(e)
+            print(f"   ❌ Ошибка парсинга {context} ({failure}, попытка {attempt + 1}): {e}")
             
-            if attempt < retries - 1:
-                print(f"   🔄 Пауза перед повторной попыткой...")
-                time.sleep(5)
-                
-                # Обновляем страницу
-                try:
-                    driver.refresh()
-                    time.sleep(3)
-                except:
-                    restart_browser()
-                    if parsing_state["last_successful_url"]:
-                        safe_get_page(parsing_state["last_successful_url"])
+        if not wait_before_retry(failure, attempt):
+            break
+        recover_page(failure)
+        attempt += 1
     
-    print(f"   ❌ Парсинг {context} не удался после {retries} попыток")
+    print(f"   ❌ Парсинг {context} не удался после {attempt + 1} попыток")
     return []
 
+def with_page_snapshot(parse_function):
+    """
+    Оборачивает парсер: он выполняется над одним снимком текущей страницы браузера,
+    а не поэлементными запросами к WebDriver. Страницы HTTP-движка уже разобраны lxml.
+    """
+    def parse_snapshot():
+        global driver
+        if not snapshot_config["enabled"] or lxml is None or isinstance(driver, ParsedPage):
+            return parse_function()
+
+        browser = driver
+        try:
+            driver = SnapshotDriver(browser)
+        except Exception as e:
+            print(f"   ⚠️ Снимок страницы не создан ({e}), разбор через WebDriver")
+            return parse_function()
+        try:
+            return parse_function()
+        finally:
+            driver = browser
+    return parse_snapshot
+
 def save_progress_checkpoint():
     """Сохраняет промежуточный прогресс"""
+    save_selector_stats()
     try:
         if excel_data_collector["all_products"]:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -134,7 +1479,7 @@ def save_progress_checkpoint():
             # Создаем промежуточный Excel файл
             with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
                 if excel_data_collector["all_products"]:
-                    df = pd.DataFrame(excel_data_collector["all_products"])
+                    df = excel_data_collector["all_products"].to_frame()
                     df.to_excel(writer, sheet_name='Промежуточные результаты', index=False)
                 
                 # Сохраняем состояние парсинга
@@ -159,40 +1504,19 @@ def update_parsing_progress(category_index, subcategory_index, total_categories)
         save_progress_checkpoint()
 
 def add_to_excel_collector(data, category_name, subcategory_name, data_type="products"):
-    """Добавляет данные в глобальный накопитель для Excel"""
+    """Добавляет данные в глобальный накопитель для Excel и возвращает записи Product добавленных товаров"""
     global excel_data_collector
     
     timestamp = datetime.now().isoformat()
+    records = []
     
     if data_type == "structured_blocks":
         # Обрабатываем структурированные блоки
         products_count = 0
         for block in data:
-            block_title = block.get('block_title', 'Неизвестный блок')
-            block_image = block.get('block_image', '')
-            table_headers = ', '.join(block.get('table_headers', []))
-            
+            product_block = ProductBlock(block, subcategory_name, timestamp)
             for product in block.get('products', []):
-                row = {
-                    'category': category_name,
-                    'subcategory': subcategory_name,
-                    'block_title': block_title,
-                    'block_image': block_image,
-                    'name': product.get('name', ''),
-                    'url': product.get('url', ''),
-                    'article': product.get('article', ''),
-                    'image_url': product.get('image_url', ''),
-                    'timestamp': timestamp,
-                    'data_type': 'table_product',
-                    'table_headers': block.get('table_headers', [])  # Сохраняем заголовки как список
-                }
-                
-                # Добавляем все дополнительные параметры товара БЕЗ префикса
-                for key, value in product.items():
-                    if key not in ['name', 'url', 'article', 'image_url'] and not key.startswith('_'):
-                        row[key] = str(value) if value is not None else ''
-                
-                excel_data_collector["all_products"].append(row)
+                records.append(Product(product, category_name, subcategory_name, product_block, timestamp, 'table_product'))
                 products_count += 1
         
         # Логируем
@@ -207,25 +1531,7 @@ def add_to_excel_collector(data, category_name, subcategory_name, data_type="pro
     elif data_type == "custom_list":
         # Обрабатываем custom_list товары
         for product in data:
-            row = {
-                'category': category_name,
-                'subcategory': subcategory_name,
-                'name': product.get('name', ''),
-                'url': product.get('url', ''),
-                'image_url': product.get('image_url', ''),
-                'price': product.get('price', ''),
-                'preorder_price': product.get('preorder_price', ''),
-                'is_preorder': product.get('is_preorder', False),
-                'timestamp': timestamp,
-                'data_type': 'custom_list_product'
-            }
-            
-            # Добавляем все дополнительные поля (например, характеристики)
-            for key, value in product.items():
-                if key not in ['name', 'url', 'image_url', 'price', 'preorder_price', 'is_preorder'] and not key.startswith('_'):
-                    row[key] = str(value) if value is not None else ''
-            
-            excel_data_collector["all_products"].append(row)
+            records.append(Product(product, category_name, subcategory_name, None, timestamp, 'custom_list_product'))
         
         # Логируем
         excel_data_collector["parsing_log"].append({
@@ -239,22 +1545,7 @@ def add_to_excel_collector(data, category_name, subcategory_name, data_type="pro
     elif data_type == "regular_products":
         # Обрабатываем обычные товары
         for product in data:
-            row = {
-                'category': category_name,
-                'subcategory': subcategory_name,
-                'name': product.get('name', ''),
-                'url': product.get('url', ''),
-                'article': product.get('article', ''),
-                'image_url': product.get('image_url', ''),
-                'timestamp': timestamp,
-                'data_type': 'regular_product'
-            }
-            # Добавляем все остальные поля БЕЗ переименования
-            for key, value in product.items():
-                if key not in ['name', 'url', 'article', 'image_url'] and not key.startswith('_'):
-                    row[key] = str(value) if value is not None else ''
-            
-            excel_data_collector["all_products"].append(row)
+            records.append(Product(product, category_name, subcategory_name, None, timestamp, 'regular_product'))
         
         # Логируем
         excel_data_collector["parsing_log"].append({
@@ -265,6 +1556,10 @@ def add_to_excel_collector(data, category_name, subcategory_name, data_type="pro
             'data_type': 'regular_products'
         })
 
+    for product in records:
+        excel_data_collector["all_products"].append(product.excel_row())
+    return records
+
 def create_summary_statistics():
     """Создает сводную статистику по категориям"""
     global excel_data_collector
@@ -272,7 +1567,7 @@ def create_summary_statistics():
     # Группируем по категориям
     categories_stats = {}
     
-    for product in excel_data_collector["all_products"]:
+    for product in excel_data_collector["all_products"].rows():
         cat = product.get('category', 'Неизвестная')
         subcat = product.get('subcategory', 'Неизвестная')
         data_type = product.get('data_type', 'unknown')
@@ -316,6 +1611,10 @@ def save_consolidated_excel():
         return
     
     try:
+        # Все листы строятся из одного DataFrame поверх колонок хранилища
+        store = excel_data_collector["all_products"]
+        all_products_df = store.to_frame()
+
         # Создаем сводную статистику
         create_summary_statistics()
         
@@ -328,58 +1627,68 @@ def save_consolidated_excel():
         os.makedirs("results", exist_ok=True)
         
         # Отладочная информация
-        data_types_count = {}
-        for product in excel_data_collector["all_products"]:
-            data_type = product.get('data_type', 'unknown')
-            data_types_count[data_type] = data_types_count.get(data_type, 0) + 1
+        if 'data_type' in all_products_df.columns:
+            data_types = all_products_df['data_type'].astype(object).fillna('unknown')
+        else:
+            data_types = pd.Series(['unknown'] * len(store))
+        type_counts = data_types.value_counts()
+        data_types_count = {data_type: int(type_counts[data_type]) for data_type in data_types.unique()}
         
         print(f"📊 Создание консолидированного Excel файла: {filename}")
         print(f"   → Всего товаров: {len(excel_data_collector['all_products'])}")
         print(f"   → Типы данных: {data_types_count}")
         print(f"   → Категорий: {len(excel_data_collector['categories_summary'])}")
         print(f"   → Записей в логе: {len(excel_data_collector['parsing_log'])}")
+        print(f"   → Словари запуска: {', '.join(f'{name} {len(values)}' for name, values in run_dictionaries.items())}")
         
         # Отладочная информация о полях
         if excel_data_collector["all_products"]:
-            sample_product = excel_data_collector["all_products"][0]
+            sample_product = store.row(0)
             print(f"   🔍 Поля в первом товаре: {list(sample_product.keys())}")
             
             # Проверяем сколько товаров имеют непустой image_url
-            image_url_count = sum(1 for p in excel_data_collector["all_products"] if p.get('image_url') and p.get('image_url').strip())
+            image_url_count = 0
+            if 'image_url' in all_products_df.columns:
+                image_url_count = int(all_products_df['image_url'].map(lambda value: isinstance(value, str) and bool(value.strip())).sum())
             print(f"   🖼️ Товаров с изображениями: {image_url_count}/{len(excel_data_collector['all_products'])}")
         
         # Создаем Excel книгу
         with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
             
-            # Группируем товары по структуре таблиц (по наборам заголовков)
+            # Группируем товары по структуре таблиц (по наборам заголовков): строки с одинаковым
+            # набором ключей хранилище уже знает, остается объединить наборы с одним составом полей
             tables_by_headers = {}
             
-            for product in excel_data_collector["all_products"]:
-                # Определяем набор заголовков для этого товара
-                headers = tuple(sorted([k for k in product.keys() if k not in ['category', 'subcategory', 'data_type', 'table_headers']]))
+            layouts = sorted(store.layout_rows().items(), key=lambda item: item[1][0])
+            for keys, indices in layouts:
+                # Определяем набор заголовков для этих товаров
+                headers = tuple(sorted([k for k in keys if k not in ['category', 'subcategory', 'data_type', 'table_headers']]))
                 
                 if headers not in tables_by_headers:
+                    first_row = all_products_df.iloc[indices[0]]
                     tables_by_headers[headers] = {
-                        'products': [],
-                        'category': product.get('category', 'Неизвестная'),
-                        'subcategory': product.get('subcategory', ''),
-                        'table_headers': product.get('table_headers', [])
+                        'rows': [],
+                        'columns': {},
+                        'category': first_row['category'] if 'category' in keys else 'Неизвестная',
+                        'subcategory': first_row['subcategory'] if 'subcategory' in keys else '',
+                        'table_headers': first_row['table_headers'] if 'table_headers' in keys else []
                     }
                 
-                tables_by_headers[headers]['products'].append(product)
+                tables_by_headers[headers]['rows'].extend(indices)
+                tables_by_headers[headers]['columns'].update(dict.fromkeys(keys))
             
             print(f"📊 Найдено {len(tables_by_headers)} различных структур таблиц")
             
             # Создаем листы для каждой структуры таблицы
             sheet_counter = 1
             for headers, table_data in tables_by_headers.items():
-                products = table_data['products']
+                rows = sorted(table_data['rows'])
                 category = table_data['category']
                 subcategory = table_data['subcategory']
                 
-                if products:
-                    # Создаем DataFrame с правильными заголовками
-                    df = pd.DataFrame(products)
+                if rows:
+                    # Строки и колонки этой структуры из общего DataFrame
+                    df = all_products_df.iloc[rows][list(table_data['columns'])].reset_index(drop=True)
                     
                     # Убираем служебные колонки
                     columns_to_remove = ['data_type', 'table_headers']
@@ -424,7 +1733,6 @@ def save_consolidated_excel():
             
             # Лист: Все товары (объединенный)
             if excel_data_collector["all_products"]:
-                all_products_df = pd.DataFrame(excel_data_collector["all_products"])
                 # Убираем служебные колонки
                 columns_to_remove = ['table_headers']
                 all_products_df = all_products_df.drop(columns=[col for col in columns_to_remove if col in all_products_df.columns], errors='ignore')
@@ -461,7 +1769,7 @@ def save_consolidated_excel():
         
         # Очищаем накопитель для следующего использования
         excel_data_collector = {
-            "all_products": [],
+            "all_products": create_excel_store(),
             "categories_summary": [],
             "parsing_log": []
         }
@@ -545,36 +1853,9 @@ def save_structured_blocks_to_csv(blocks_data, filename, category_name, subcateg
     if not blocks_data:
         return
     
-    # Добавляем в Excel накопитель
-    add_to_excel_collector(blocks_data, category_name, subcategory_name, "structured_blocks")
-        
-    csv_data = []
-    timestamp = datetime.now().isoformat()
-    
-    for block in blocks_data:
-        block_title = block.get('block_title', 'Неизвестный блок')
-        block_image = block.get('block_image', '')
-        table_headers = ', '.join(block.get('table_headers', []))
-        
-        for product in block.get('products', []):
-            row = {
-                'category': category_name,
-                'subcategory': subcategory_name,
-                'block_title': block_title,
-                'block_image': block_image,
-                'table_headers': table_headers,
-                'product_name': product.get('name', ''),
-                'product_url': product.get('url', ''),
-                'product_article': product.get('article', ''),
-                'timestamp': timestamp
-            }
-            
-            # Добавляем все дополнительные параметры товара
-            for key, value in product.items():
-                if key not in ['name', 'url', 'article']:
-                    row[f'param_{key}'] = str(value)
-            
-            csv_data.append(row)
+    # Добавляем в Excel накопитель; строки CSV собираются из тех же записей
+    records = add_to_excel_collector(blocks_data, category_name, subcategory_name, "structured_blocks")
+    csv_data = [product.csv_row() for product in records]
     
     if csv_data:
         save_to_csv(csv_data, filename, category_name, subcategory_name)
@@ -584,25 +1865,9 @@ def save_custom_list_to_csv(products_data, filename, category_name, subcategory_
     if not products_data:
         return
     
-    # Добавляем в Excel накопитель
-    add_to_excel_collector(products_data, category_name, subcategory_name, "custom_list")
-        
-    csv_data = []
-    timestamp = datetime.now().isoformat()
-    
-    for product in products_data:
-        row = {
-            'category': category_name,
-            'subcategory': subcategory_name,
-            'product_name': product.get('name', ''),
-            'product_url': product.get('url', ''),
-            'image_url': product.get('image_url', ''),
-            'price': product.get('price', ''),
-            'preorder_price': product.get('preorder_price', ''),
-            'is_preorder': product.get('is_preorder', False),
-            'timestamp': timestamp
-        }
-        csv_data.append(row)
+    # Добавляем в Excel накопитель; строки CSV собираются из тех же записей
+    records = add_to_excel_collector(products_data, category_name, subcategory_name, "custom_list")
+    csv_data = [product.csv_row() for product in records]
     
     if csv_data:
         save_to_csv(csv_data, filename, category_name, subcategory_name)
@@ -703,28 +1968,175 @@ def create_excel_compatible_csv():
     print("✅ Excel-совместимые файлы созданы!")
 
 class AsyncWebDriver:
-    """Обертка для WebDriver с поддержкой параллельной работы"""
+    """Обертка для WebDriver с поддержкой параллельной работы (браузеры берутся из общего пула)"""
     def __init__(self):
         self.driver = None
         self.lock = threading.Lock()
     
     def create_driver(self):
-        """Создает новый экземпляр WebDriver"""
-        chrome_options = Options()
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-plugins")
-        chrome_options.add_argument("--headless")  # Фоновый режим для параллельной работы
-        
-        self.driver = webdriver.Chrome(options=chrome_options)
+        """Берет браузер из пула (как и раньше, в фоновом режиме)"""
+        self.driver = driver_pool.acquire(headless=pool_config["async_headless"])
         return self.driver
     
     def close(self):
-        """Закрывает WebDriver"""
+        """Возвращает браузер в пул"""
         if self.driver:
-            self.driver.quit()
+            driver_pool.release(self.driver)
             self.driver = None
 
+# === Параллельная загрузка во вкладках одного браузера ===
+
+# Настройки мультиплексирования вкладок
+tab_config = {
+    "tabs": 4,  # Сколько вкладок одного браузера загружают страницы одновременно
+    "load_timeout": 30  # Максимальное ожидание загрузки вкладки, секунд
+}
+
+# Состояние вкладки: пока висит атрибут, в ней еще старый документ (навигация не началась)
+_TAB_STATE_SCRIPT = """
+if (document.documentElement && document.documentElement.hasAttribute('data-tab-pending')) return 'loading';
+""" + _READY_STATE_SCRIPT
+
+_TAB_NAVIGATE_SCRIPT = """
+document.documentElement.setAttribute('data-tab-pending', '1');
+window.location.href = arguments[0];
+"""
+
+class TabMultiplexer:
+    """
+    Несколько вкладок одного браузера: переходы запускаются во всех вкладках сразу,
+    а разбор выполняется в той вкладке, которая загрузилась первой.
+    """
+    def __init__(self, target, tabs):
+        self.driver = target
+        self.handles = [target.current_window_handle]
+        for _ in range(tabs - 1):
+            target.switch_to.new_window('tab')
+            apply_resource_blocking(target)  # Блокировка ресурсов задается для каждой вкладки
+            self.handles.append(target.current_window_handle)
+        target.switch_to.window(self.handles[0])
+
+    def _start(self, handle, url):
+        """Запускает переход во вкладке, не дожидаясь загрузки"""
+        self.driver.switch_to.window(handle)
+        self.driver.execute_script(_TAB_NAVIGATE_SCRIPT, url)
+        note_browser_page(self.driver)
+
+    def _is_loaded(self, handle, started_at):
+        self.driver.switch_to.window(handle)
+        try:
+            state = self.driver.execute_script(_TAB_STATE_SCRIPT, READINESS_MARKERS["any"])
+        except Exception:
+            state = "loading"
+        elapsed = time.time() - started_at
+        if state == "ready":
+            return True
+        if state == "complete" and elapsed >= readiness_config["marker_grace"]:
+            return True
+        return elapsed >= tab_config["load_timeout"]
+
+    def run(self, items, extract):
+        """
+        Загружает item["url"] для каждого элемента во вкладках и вызывает extract(item)
+        на загрузившейся вкладке. Возвращает генератор пар (item, результат extract).
+        """
+        pending = list(items)
+        active = {}
+        for handle in self.handles:
+            if not pending:
+                break
+            item = pending.pop(0)
+            print(f"  🔍 Обработка: {item.get('name', item['url'])}")
+            self._start(handle, item["url"])
+            active[handle] = (item, time.time())
+
+        while active:
+            loaded_any = False
+            for handle in list(active):
+                item, started_at = active[handle]
+                if not self._is_loaded(handle, started_at):
+                    continue
+                loaded_any = True
+                del active[handle]
+                try:
+                    result = extract(item)
+                except Exception as e:
+                    print(f"  ✗ Ошибка обработки {item.get('name', item['url'])}: {e}")
+                    result = None
+                yield item, result
+
+                if pending:
+                    next_item = pending.pop(0)
+                    print(f"  🔍 Обработка: {next_item.get('name', next_item['url'])}")
+                    self._start(handle, next_item["url"])
+                    active[handle] = (next_item, time.time())
+            if not loaded_any:
+                time.sleep(readiness_config["poll_interval"])
+
+    def close(self):
+        """Закрывает дополнительные вкладки"""
+        for handle in self.handles[1:]:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception:
+                pass
+        self.driver.switch_to.window(self.handles[0])
+
+def _process_category_subcategory(driver, category_name, sub):
+    """Разбирает уже открытую страницу подкатегории и сохраняет результат в CSV"""
+    sub_name = sub["name"]
+    try:
+        # Обновляем глобальную переменную driver для функций парсинга
+        globals()['driver'] = driver
+        
+        items = get_products()
+        
+        # Создаем имя файла для этой подкатегории
+        filename = create_csv_filename(f"{category_name}_{sub_name}")
+        
+        # Обрабатываем результаты в зависимости от типа
+        if isinstance(items, dict) and "structured_blocks" in items:
+            save_structured_blocks_to_csv(items["blocks"], filename, category_name, sub_name)
+            all_products = []
+            for block in items["blocks"]:
+                all_products.extend(block.get("products", []))
+            sub["products"] = all_products
+            sub["product_blocks"] = items["blocks"]
+            
+        elif isinstance(items, dict) and "products" in items:
+            save_to_csv(items["products"], filename, category_name, sub_name)
+            sub["products"] = items["products"]
+            sub["table_headers"] = items.get("table_headers", [])
+            
+        elif items and isinstance(items[0], dict) and "name" in items[0]:
+            if "article" not in items[0]:  # Это подкатегории
+                sub["grandchildren"] = items
+                # Обрабатываем каждую подподкатегорию
+                for grand in items:
+                    try:
+                        driver.get(grand["url"])
+                        note_browser_page(driver)
+                        wait_for_page_ready("table", target=driver)
+                        grand_result = parse_structured_products()
+                        
+                        if isinstance(grand_result, dict) and "structured_blocks" in grand_result:
+                            grand_filename = create_csv_filename(f"{category_name}_{sub_name}_{grand['name']}")
+                            save_structured_blocks_to_csv(grand_result["blocks"], grand_filename, category_name, f"{sub_name}_{grand['name']}")
+                            grand["product_blocks"] = grand_result["blocks"]
+                            
+                    except Exception as e:
+                        print(f"    ✗ Ошибка обработки {grand['name']}: {e}")
+            else:  # Это товары custom_list
+                save_custom_list_to_csv(items, filename, category_name, sub_name)
+                sub["products"] = items
+                
+        print(f"  ✓ Завершено: {sub_name}")
+        
+    except Exception as e:
+        print(f"  ✗ Ошибка обработки {sub_name}: {e}")
+        sub["products"] = []
+
 def process_category_async(category_data, results_queue):
     """Асинхронно обрабатывает одну категорию"""
     category_name = category_data["name"]
@@ -732,71 +2144,31 @@ def process_category_async(category_data, results_queue):
     
     print(f"\n🔄 Начинается обработка категории: {category_name} ({len(subcategories)} подкатегорий)")
     
-    # Создаем отдельный WebDriver для этой категории
+    # Берем WebDriver из пула для этой категории
     async_driver = AsyncWebDriver()
     driver = async_driver.create_driver()
     
     try:
-        category_results = []
-        
-        for sub in subcategories:
-            sub_name = sub["name"]
-            sub_url = sub["url"]
-            
-            print(f"  🔍 Обработка: {sub_name}")
-            
+        if tab_config["tabs"] > 1 and len(subcategories) > 1:
+            # Подкатегории загружаются параллельно во вкладках одного браузера
+            tabs = TabMultiplexer(driver, min(tab_config["tabs"], len(subcategories)))
             try:
-                driver.get(sub_url)
-                time.sleep(1.5)
-                
-                # Обновляем глобальную переменную driver для функций парсинга
-                globals()['driver'] = driver
-                
-                items = get_products()
-                
-                # Создаем имя файла для этой подкатегории
-                filename = create_csv_filename(f"{category_name}_{sub_name}")
-                
-                # Обрабатываем результаты в зависимости от типа
-                if isinstance(items, dict) and "structured_blocks" in items:
-                    save_structured_blocks_to_csv(items["blocks"], filename, category_name, sub_name)
-                    all_products = []
-                    for block in items["blocks"]:
-                        all_products.extend(block.get("products", []))
-                    sub["products"] = all_products
-                    sub["product_blocks"] = items["blocks"]
-                    
-                elif isinstance(items, dict) and "products" in items:
-                    save_to_csv(items["products"], filename, category_name, sub_name)
-                    sub["products"] = items["products"]
-                    sub["table_headers"] = items.get("table_headers", [])
-                    
-                elif items and isinstance(items[0], dict) and "name" in items[0]:
-                    if "article" not in items[0]:  # Это подкатегории
-                        sub["grandchildren"] = items
-                        # Обрабатываем каждую подподкатегорию
-                        for grand in items:
-                            try:
-                                driver.get(grand["url"])
-                                time.sleep(1.5)
-                                grand_result = parse_structured_products()
-                                
-                                if isinstance(grand_result, dict) and "structured_blocks" in grand_result:
-                                    grand_filename = create_csv_filename(f"{category_name}_{sub_name}_{grand['name']}")
-                                    save_structured_blocks_to_csv(grand_result["blocks"], grand_filename, category_name, f"{sub_name}_{grand['name']}")
-                                    grand["product_blocks"] = grand_result["blocks"]
-                                    
-                            except Exception as e:
-                                print(f"    ✗ Ошибка обработки {grand['name']}: {e}")
-                    else:  # Это товары custom_list
-                        save_custom_list_to_csv(items, filename, category_name, sub_name)
-                        sub["products"] = items
-                        
-                print(f"  ✓ Завершено: {sub_name}")
-                
-            except Exception as e:
-                print(f"  ✗ Ошибка обработки {sub_name}: {e}")
-                sub["products"] = []
+                for _ in tabs.run(subcategories, lambda sub: _process_category_subcategory(driver, category_name, sub)):
+                    pass
+            finally:
+                tabs.close()
+        else:
+            for sub in subcategories:
+                print(f"  🔍 Обработка: {sub['name']}")
+                try:
+                    driver.get(sub["url"])
+                    note_browser_page(driver)
+                    wait_for_page_ready(target=driver)
+                except Exception as e:
+                    print(f"  ✗ Ошибка обработки {sub['name']}: {e}")
+                    sub["products"] = []
+                    continue
+                _process_category_subcategory(driver, category_name, sub)
         
         # Добавляем результат в очередь
         results_queue.put({
@@ -844,7 +2216,297 @@ def get_subcategories(main_cat):
         print(f"Нет подкатегорий или ошибка: {e}")
         return []
 
+# === Дерево меню категорий ===
+
+menu_cache_config = {
+    "enabled": True,
+    "file": "menu_tree.json",
+    "max_age_hours": 24  # После этого меню собирается заново
+}
+
+# Один вызов: все категории меню с подкатегориями (те же селекторы, что в get_category_name и get_subcategories)
+_MENU_TREE_SCRIPT = """
+var categories = document.querySelectorAll('a.icons_fa.parent.rounded2.bordered'), tree = [];
+for (var i = 0; i < categories.length; i++) {
+    var category = categories[i], nameEl = category.querySelector('span.name');
+    var dropdown = category.nextElementSibling;
+    while (dropdown) {
+        var cls = dropdown.getAttribute('class') || '';
+        if (dropdown.tagName === 'UL' && cls.indexOf('dropdown') >= 0 && cls.indexOf('scrollblock') >= 0) break;
+        dropdown = dropdown.nextElementSibling;
+    }
+    var subcategories = [], links = dropdown ? dropdown.querySelectorAll('a.section.option-font-bold') : [];
+    for (var j = 0; j < links.length; j++) {
+        subcategories.push({name: links[j].textContent.trim(), url: links[j].hasAttribute('href') ? links[j].href : null});
+    }
+    tree.push({name: nameEl ? nameEl.textContent.trim() : 'Unknown Category', subcategories: subcategories});
+}
+return tree;
+"""
+
+def load_menu_cache(url):
+    """Возвращает сохраненное дерево меню для главной страницы или None, если его нет или оно устарело"""
+    if not menu_cache_config["enabled"]:
+        return None
+    try:
+        with open(menu_cache_config["file"], encoding="utf-8") as f:
+            entry = json.load(f).get(url)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Не удалось прочитать кэш меню: {e}")
+        return None
+    if not entry:
+        return None
+    age = datetime.now() - datetime.fromisoformat(entry["saved_at"])
+    if age.total_seconds() > menu_cache_config["max_age_hours"] * 3600:
+        return None
+    return entry["categories"]
+
+def save_menu_cache(url, categories_data):
+    """Сохраняет дерево меню для следующих запусков"""
+    if not menu_cache_config["enabled"] or not categories_data:
+        return
+    try:
+        try:
+            with open(menu_cache_config["file"], encoding="utf-8") as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            cache = {}
+        cache[url] = {"saved_at": datetime.now().isoformat(), "categories": categories_data}
+        with open(menu_cache_config["file"], "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1)
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить кэш меню: {e}")
+
+def _read_category_tree_elements():
+    """Меню категорий поэлементно (HTTP-движок или запасной путь для браузера)"""
+    categories_data = []
+    for main_cat in driver.find_elements(By.CSS_SELECTOR, 'a.icons_fa.parent.rounded2.bordered'):
+        try:
+            categories_data.append({
+                "name": get_category_name(main_cat),
+                "subcategories": get_subcategories(main_cat)
+            })
+        except Exception as e:
+            print(f" Ошибка при подготовке категории: {e}")
+    return categories_data
+
+def get_category_tree(url):
+    """
+    Собирает categories_data (категории меню и их подкатегории) для главной страницы.
+    Свежее дерево берется из кэша без загрузки страницы; иначе меню читается HTTP-движком,
+    а в браузере — одним вызовом скрипта.
+    """
+    global driver
+
+    categories_data = load_menu_cache(url)
+    if categories_data is not None:
+        print(f"📂 Меню категорий из кэша: {len(categories_data)} категорий")
+        return categories_data
+
+    categories_data = []
+    if http_engine_available():
+        driver = get_static_driver()
+        try:
+            driver.get(url)
+            categories_data = _read_category_tree_elements()
+        except Exception as e:
+            print(f"⚠️ HTTP-загрузка главной страницы не удалась: {e}")
+
+    if not categories_data:
+        if browser_driver is None and not restart_browser():
+            return []
+        driver = browser_driver
+        driver.get(url)
+        note_browser_page(driver)
+        wait_for_page_ready("menu")
+        try:
+            categories_data = driver.execute_script(_MENU_TREE_SCRIPT) or []
+        except Exception as e:
+            print(f"⚠️ Скрипт меню не выполнен ({e}), читаем меню поэлементно")
+            categories_data = _read_category_tree_elements()
+
+    print(f'Найдено категорий: {len(categories_data)}')
+    for cat in categories_data:
+        print(f" Подготовлено: {cat['name']} → {len(cat['subcategories'])} подкатегорий")
+    save_menu_cache(url, categories_data)
+    return categories_data
+
 # Функция парсинга под-подкатегорий(работает не всегда, т.к. иногда встречаются другие ссылки на под-подкатегории)
+# === Статистика селекторов по шаблонам страниц ===
+
+selector_stats_config = {
+    "enabled": True,
+    "file": "selector_stats.json",
+    "min_samples": 5  # Срабатываний цепочки до первой перестановки
+}
+
+# {шаблон страницы: {цепочка: {селектор: число срабатываний}}}
+selector_stats = {}
+selector_stats_lock = threading.Lock()  # Счетчики пополняют потоки разбора, сохраняет поток накопителей
+
+# Прежние имена цепочек списков и страницы товара -> имена полей плана extraction_schema.json
+RENAMED_SELECTOR_CHAINS = {
+    "custom_list_link": "custom_list_url",
+    "custom_list_image_span": "custom_list_image_url",
+    "custom_list_image": "custom_list_image_url",
+    "custom_list_preorder": "custom_list_preorder_price",
+    "detail_title": "product_detail_name",
+    "detail_image": "product_detail_image_url",
+    "detail_img": "product_detail_image_url",
+    "detail_price": "product_detail_price",
+    "detail_preorder": "product_detail_preorder_price"
+}
+
+def migrate_selector_stats(stats):
+    """Переносит счетчики цепочек со старыми именами под новые (счетчики одинаковых селекторов складываются)"""
+    migrated = 0
+    for chains in stats.values():
+        for old_name, new_name in RENAMED_SELECTOR_CHAINS.items():
+            if old_name not in chains:
+                continue
+            hits = chains.setdefault(new_name, {})
+            for selector, count in chains.pop(old_name).items():
+                hits[selector] = hits.get(selector, 0) + count
+            migrated += 1
+    return migrated
+
+# Признаки макета страницы: по ним строится отпечаток шаблона
+LAYOUT_PROBES = {
+    "sections": "div.sections_wrapper.block",
+    "display_list": "div.display_list.custom_list.show_un_props",
+    "list_new": "div.list_item.item_info.catalog-adaptive.flexbox.flexbox--row",
+    "list_any": ".list_item.item_info.catalog-adaptive, .list_item_wrapp",
+    "detail": ".product-detail-gallery__container, .product-main, .product-info",
+    "detail_class": "div[class*='product-detail']",
+    "item_name": "h1[itemprop='name']",
+    "blocks": "div.razdel.table_all, div.section_info_wrapper, div.item_block_href",
+    "list_item": "div.list_item.item_info.catalog-adaptive",
+    "table_rows": "tr.main_item_wrapper",
+    "pagination": "div.module-pagination a.link",
+    "section_list": ".catalog_section_list"
+}
+
+# Один вызов: число элементов для каждого признака макета
+_LAYOUT_PROBE_SCRIPT = """
+var probes = arguments[0], counts = {};
+for (var name in probes) {
+    try { counts[name] = document.querySelectorAll(probes[name]).length; } catch (e) { counts[name] = 0; }
+}
+return counts;
+"""
+
+_layout_probe_cache = {"page": None, "url": None, "counts": None}
+
+def invalidate_layout_probe():
+    """Сбрасывает замер макета: у браузера после перехода или обновления адрес может остаться прежним"""
+    _layout_probe_cache.update(page=None, url=None, counts=None)
+
+def probe_page_layout(target=None):
+    """Возвращает {признак: число элементов} для текущей страницы (один замер на загрузку)"""
+    target = target or driver
+    key = getattr(target, "tree", None) if isinstance(target, ParsedPage) else getattr(target, "session_id", None)
+    if _layout_probe_cache["page"] == key and _layout_probe_cache["url"] == target.current_url:
+        return _layout_probe_cache["counts"]
+
+    if isinstance(target, ParsedPage):
+        counts = {name: len(target.find_elements(By.CSS_SELECTOR, selector)) for name, selector in LAYOUT_PROBES.items()}
+    else:
+        counts = target.execute_script(_LAYOUT_PROBE_SCRIPT, LAYOUT_PROBES) or {}
+    _layout_probe_cache.update(page=key, url=target.current_url, counts=counts)
+    return counts
+
+def _has_detail_layout(counts):
+    """Признаки страницы отдельного товара, по которым ее узнает parse_custom_list"""
+    return bool(counts.get("detail") or counts.get("detail_class"))
+
+def classify_page(target=None):
+    """
+    Тип страницы по одному замеру признаков макета (тому же, из которого строится
+    шаблон страницы, поэтому отдельно тип не запоминается):
+    "grandchildren" — под-подкатегории, "product_detail" — отдельный товар,
+    "custom_list" — список товаров, "structured" — блоки и таблицы товаров.
+    """
+    counts = probe_page_layout(target or driver)
+    if counts.get("sections"):
+        return "grandchildren"
+    if any(counts.get(name) for name in ("detail", "item_name", "display_list", "list_new", "list_any")):
+        return "product_detail" if _has_detail_layout(counts) else "custom_list"
+    return "structured"
+
+def _url_pattern(url):
+    """/catalog/a/b/ -> catalog/*/*"""
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    return "/".join(parts[:1] + ["*"] * (len(parts) - 1))
+
+def page_template_key(target=None):
+    """Шаблон страницы: образец URL и набор найденных признаков макета"""
+    target = target or driver
+    try:
+        counts = probe_page_layout(target)
+    except Exception:
+        counts = {}
+    fingerprint = "+".join(name for name in LAYOUT_PROBES if counts.get(name))
+    return f"{_url_pattern(target.current_url)}|{fingerprint}"
+
+def ordered_selectors(chain, selectors, template=None):
+    """
+    Порядок цепочки селекторов для шаблона страницы (по умолчанию текущей). Гарантия:
+    срабатывавшие селекторы сохраняют исходный порядок первого совпадения между собой,
+    а последний (запасной) селектор всегда остается последним. Ни разу не сработавшие
+    селекторы уходят назад (перед запасным) — если такой селектор все же совпадет на
+    нетипичной странице шаблона, раньше него сработает один из срабатывавших.
+    """
+    if not selector_stats_config["enabled"] or len(selectors) < 3:
+        return selectors
+    hits = selector_stats.get(template or page_template_key(), {}).get(chain)
+    if not hits or sum(hits.values()) < selector_stats_config["min_samples"]:
+        return selectors
+    head = selectors[:-1]
+    live = [selector for selector in head if hits.get(selector)]
+    dead = [selector for selector in head if not hits.get(selector)]
+    return live + dead + selectors[-1:]
+
+def record_selector_hit(chain, selector, template=None, count=1):
+    """Учитывает сработавший селектор цепочки для шаблона страницы (по умолчанию текущей)"""
+    if not selector_stats_config["enabled"]:
+        return
+    template = template or page_template_key()
+    with selector_stats_lock:
+        hits = selector_stats.setdefault(template, {}).setdefault(chain, {})
+        hits[selector] = hits.get(selector, 0) + count
+
+def load_selector_stats():
+    """Загружает статистику селекторов прошлых запусков"""
+    global selector_stats
+    try:
+        with open(selector_stats_config["file"], encoding="utf-8") as f:
+            selector_stats = json.load(f)
+        print(f"📈 Загружена статистика селекторов: {len(selector_stats)} шаблонов страниц")
+        migrated = migrate_selector_stats(selector_stats)
+        if migrated:
+            print(f"📈 Перенесено цепочек со старыми именами: {migrated}")
+    except FileNotFoundError:
+        selector_stats = {}
+    except Exception as e:
+        print(f"⚠️ Не удалось загрузить статистику селекторов: {e}")
+        selector_stats = {}
+
+def save_selector_stats():
+    """Сохраняет статистику селекторов для следующих запусков"""
+    if not selector_stats_config["enabled"] or not selector_stats:
+        return
+    try:
+        with selector_stats_lock:
+            text = json.dumps(selector_stats, ensure_ascii=False, indent=1)  # Снимок без параллельных изменений
+        with open(selector_stats_config["file"], "w", encoding="utf-8") as f:
+            f.write(text)
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить статистику селекторов: {e}")
+
+load_selector_stats()
+
 def get_products():
     """
     Проверяет, есть ли на странице таблица товаров.
@@ -853,52 +2515,21 @@ def get_products():
     :return: Список словарей с 'name' и 'url'
     """
     try:
-        # Ждём загрузки (можно заменить на WebDriverWait)
-        time.sleep(1.5)
-        
-        # Проверяем наличие под-подкатегорий
-        tabel_warper = driver.find_elements(
-            By.CSS_SELECTOR,
-            "div.sections_wrapper.block"
-        )
-
-        # Проверяем наличие старой структуры товаров
-        display_list = driver.find_elements(
-            By.CSS_SELECTOR,
-            "div.display_list.custom_list.show_un_props"
-        )
-        
-        # Проверяем наличие новой структуры товаров
-        new_structure_items = driver.find_elements(
-            By.CSS_SELECTOR,
-            "div.list_item.item_info.catalog-adaptive.flexbox.flexbox--row"
-        )
+        # Ждём, пока на странице появится содержимое каталога
+        wait_for_page_ready()
         
-        # Проверяем наличие любых товаров в списке
-        any_list_items = driver.find_elements(
-            By.CSS_SELECTOR,
-            ".list_item.item_info.catalog-adaptive, .list_item_wrapp"
-        )
-        
-        # Проверяем, является ли это страницей отдельного товара
-        product_detail_indicators = [
-            ".product-detail-gallery__container",
-            ".product-main", 
-            ".product-info",
-            "h1[itemprop='name']"
-        ]
-        
-        is_single_product = any(driver.find_elements(By.CSS_SELECTOR, indicator) for indicator in product_detail_indicators)
+        # Тип страницы определяется одним замером признаков макета
+        page_type = classify_page()
+        counts = probe_page_layout()
 
-        if tabel_warper:
+        if page_type == "grandchildren":
             print("Парсим под-подкатегории")
             return parse_grandchildren()
-        elif is_single_product:
-            print("🔍 Обнаружена страница отдельного товара")
-            return parse_custom_list()  # parse_custom_list умеет обрабатывать отдельные товары
-        elif display_list or new_structure_items or any_list_items:
-            print(f"Найден список товаров (новая структура: {len(new_structure_items)}, старая: {len(display_list)}, общая: {len(any_list_items)})")
-            return parse_custom_list()
+        elif page_type == "product_detail":
+            return parse_custom_list(page_type)  # parse_custom_list умеет обрабатывать отдельные товары
+        elif page_type == "custom_list":
+            print(f"Найден список товаров (новая структура: {counts.get('list_new', 0)}, старая: {counts.get('display_list', 0)}, общая: {counts.get('list_any', 0)})")
+            return parse_custom_list(page_type)
         else:
             print("Найдена таблица товаров")
             return parse_structured_products()
@@ -908,293 +2539,633 @@ def get_products():
         return []
 
 
-def parse_custom_list():
+# === Извлечение списка товаров ===
+
+extraction_config = {
+    "in_browser": True  # Списки и таблицы извлекаются одним скриптом в браузере, а не поэлементными запросами
+}
+
+# Схема извлечения: селекторы, запасные варианты, источники значений и нормализация адресов
+EXTRACTION_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_schema.json")
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def _compile_accept(accept):
+    """"any" — подходит любой найденный элемент, "value" — непустое значение, {"pattern"} — совпадение с регулярным выражением"""
+    if accept in ("any", "value"):
+        return {"kind": accept}
+    if isinstance(accept, dict) and "pattern" in accept:
+        flags = "i" if accept.get("ignore_case") else ""
+        re.compile(accept["pattern"], re.I if flags else 0)  # Ошибка в выражении видна при загрузке схемы
+        return {"kind": "pattern", "pattern": accept["pattern"], "flags": flags}
+    raise ValueError(f"Неизвестное условие accept: {accept}")
+
+def compile_extraction_schema(schema):
     """
-    Парсит товары из custom_list с детальной информацией:
-    - изображения, цены, ссылки
-    - поддержка предзаказных цен
-    - поддержка страниц отдельных товаров (product-detail)
+    Превращает схему в план: у каждого поля — цепочка {selector, sources, accept},
+    значения по умолчанию и зависимости от других полей. План сериализуется в JSON
+    и одинаково выполняется скриптом в браузере и через интерфейс элементов.
     """
-    products = []
+    plan = {}
+    for list_name, spec in schema["lists"].items():
+        fields = []
+        for field_name, field in spec["fields"].items():
+            sources = _as_list(field.get("source", "text"))
+            accept = _compile_accept(field.get("accept", "value"))
+            chain = []
+            for entry in field.get("chain", []):
+                entry = {"selector": entry} if isinstance(entry, str) else entry
+                chain.append({
+                    "selector": entry["selector"],
+                    "sources": _as_list(entry.get("source", sources)),
+                    "accept": _compile_accept(entry["accept"]) if "accept" in entry else accept
+                })
+            for dependency in (field.get("within"), field.get("when_empty")):
+                if dependency and dependency not in [f["name"] for f in fields]:
+                    raise ValueError(f"{list_name}.{field_name}: поле {dependency} должно быть описано раньше")
+            fields.append({
+                "name": field_name,
+                "within": field.get("within"),
+                "when_empty": field.get("when_empty"),
+                "chain": chain,
+                "sources": sources,
+                "fallback_source": field.get("fallback_source"),
+                "default": field.get("default"),
+                "default_without_within": field.get("default_without_within", field.get("default")),
+                "required": bool(field.get("required")),
+                "normalize": field.get("normalize")
+            })
+        plan[list_name] = {"items": spec.get("items"), "strict": bool(spec.get("strict")), "fields": fields}
+    return plan
 
-    # Проверяем, является ли это страницей отдельного товара
-    is_product_detail_page = False
-    try:
-        # Проверяем наличие элементов, характерных для страницы товара
-        product_detail_indicators = [
-            ".product-detail-gallery__container",
-            ".product-main",
-            ".product-info",
-            "div[class*='product-detail']"
-        ]
-        
-        for indicator in product_detail_indicators:
-            if driver.find_elements(By.CSS_SELECTOR, indicator):
-                is_product_detail_page = True
-                print("🔍 Обнаружена страница отдельного товара")
-                break
-    except:
-        pass
+def load_extraction_plan(path=EXTRACTION_SCHEMA_FILE):
+    """Читает схему извлечения и компилирует ее в план"""
+    with open(path, encoding="utf-8") as f:
+        return compile_extraction_schema(json.load(f))
 
-    if is_product_detail_page:
-        # Парсим страницу отдельного товара
-        return parse_single_product_page()
-    
-    # Ищем товары по разным селекторам (обычный режим)
-    item_selectors = [
-        "div.list_item.item_info.catalog-adaptive.flexbox.flexbox--row",  # Новая структура
-        "div.list_item_wrapp.item_wrapp.item.item-parent.clearfix",  # Основной селектор по скриншоту
-        "div.list_item_info.catalog-adaptive.flexbox",  # Альтернативный
-        ".list_item.item_info.catalog-adaptive",  # Упрощенный селектор для новой структуры
-        ".list_item_wrapp",
-        "div.list_item", 
-        "a.thumb",
-        ".catalog-adaptive"
-    ]
-    
-    list_items = []
-    for selector in item_selectors:
-        try:
-            list_items = driver.find_elements(By.CSS_SELECTOR, selector)
-            if list_items:
-                print(f"✅ Найдены товары с селектором: {selector} ({len(list_items)} элементов)")
-                break
-            else:
-                print(f"⚠️ Селектор {selector} не дал результатов")
-        except Exception as e:
-            print(f"❌ Ошибка с селектором {selector}: {e}")
-            continue
-    
-    print(f"Найдено элементов custom_list: {len(list_items)}")
-    
-    if not list_items:
-        print("❌ Товары не найдены! Попробуем диагностику...")
-        # Диагностическая информация
-        page_content_indicators = [
-            "div.sections_wrapper.block",
-            "table",
-            ".catalog-adaptive",
-            ".list_item",
-            ".item_info"
-        ]
-        
-        for indicator in page_content_indicators:
-            elements = driver.find_elements(By.CSS_SELECTOR, indicator)
-            print(f"   🔍 {indicator}: найдено {len(elements)} элементов")
-        
-        return []
-    
-    for i, item in enumerate(list_items):
-        try:
-            product_data = {
-                "name": "Не указано",
-                "url": None,
-                "image_url": None,
-                "price": None,
-                "preorder_price": None,
-                "is_preorder": False
-            }
-            
-            # Извлекаем название и ссылку
-            try:
-                # Пробуем разные селекторы для ссылки на товар
-                link_selectors = [
-                    "a.dark_link.js-notice-block__title",  # Старая структура
-                    ".list_item_wrap a[href*='/catalog/']",  # Новая структура
-                    ".list_item_info a[href*='/catalog/']",  # Новая структура альтернатива
-                    "a[href*='/catalog/']",
-                    "a.product-link",
-                    "a"
-                ]
-                
-                product_link = None
-                for selector in link_selectors:
-                    try:
-                        product_link = item.find_element(By.CSS_SELECTOR, selector)
-                        print(f"   🔗 Ссылка найдена с селектором: {selector}")
-                        break
-                    except:
-                        continue
-                
-                if product_link:
-                    product_data["url"] = product_link.get_attribute('href')
-                    
-                    # Извлекаем название
-                    try:
-                        # Пробуем разные способы извлечения названия
-                        name_selectors = [
-                            "span.font_md",  # Старая структура
-                            "span",  # Универсальный
-                            ".js-notice-block__title span",  # Альтернатива
-                        ]
-                        
-                        name_found = False
-                        for name_sel in name_selectors:
-                            try:
-                                name_elem = product_link.find_element(By.CSS_SELECTOR, name_sel)
-                                product_data["name"] = name_elem.text.strip()
-                                name_found = True
-                                break
-                            except:
-                                continue
-                        
-                        if not name_found:
-                            product_data["name"] = product_link.text.strip() or "Без названия"
-                    except:
-                        product_data["name"] = product_link.text.strip() or "Без названия"
-                        
-            except Exception as e:
-                print(f"   → Ошибка извлечения ссылки для товара {i+1}: {e}")
-            
-            # Извлекаем изображение из section-gallery-wrapper flexbox
+EXTRACTION_PLAN = load_extraction_plan()
+
+def load_selector_chains(path=EXTRACTION_SCHEMA_FILE):
+    """Читает именованные цепочки селекторов (раздел chains схемы): {цепочка: [селекторы]}"""
+    with open(path, encoding="utf-8") as f:
+        schema = json.load(f)
+    chains = {}
+    for name, spec in schema.get("chains", {}).items():
+        selectors = spec["selectors"]
+        if not selectors or not all(isinstance(selector, str) for selector in selectors):
+            raise ValueError(f"chains.{name}: нужен непустой список селекторов-строк")
+        chains[name] = list(selectors)
+    return chains
+
+# Цепочки селекторов таблиц, блоков и под-под-подкатегорий (имена совпадают с цепочками статистики)
+SELECTOR_CHAINS = load_selector_chains()
+
+# Общие функции скриптов извлечения: text() приводит текст к виду WebElement.text,
+# prop() читает href/src так же, как get_attribute
+_JS_EXTRACT_HELPERS = """
+function query(root, s) { try { return root.querySelector(s); } catch (e) { return null; } }
+function queryAll(root, s) { try { return root.querySelectorAll(s); } catch (e) { return []; } }
+function text(el) {
+    if (!el.getClientRects().length) return '';
+    return el.innerText.replace(/\\u00a0/g, ' ').split('\\n').map(function (line) {
+        return line.replace(/[ \\t\\r]+/g, ' ').trim();
+    }).filter(function (line) { return line; }).join('\\n');
+}
+function prop(el, name) { return el.hasAttribute(name) ? el[name] : null; }
+"""
+
+# Интерпретатор плана извлечения в браузере: один вызов на список или страницу
+_PLAN_SCRIPT = _JS_EXTRACT_HELPERS + """
+var plan = arguments[0], root = arguments[1] || document;
+var result = {selector: null, records: [], hits: {}, invalid: 0};
+function hit(field, s) { var h = result.hits[field] = result.hits[field] || {}; h[s] = (h[s] || 0) + 1; }
+function read(el, sources) {
+    var value = null;
+    for (var i = 0; i < sources.length; i++) {
+        var s = sources[i];
+        if (s === 'text') value = text(el);
+        else if (s === 'textContent') value = el.textContent.trim();
+        else if (s === 'href' || s === 'src') value = prop(el, s);
+        else value = el.getAttribute(s);
+        if (value) return value;
+    }
+    return value;
+}
+function accepts(accept, value) {
+    if (accept.kind === 'any') return true;
+    if (!value) return false;
+    return accept.kind === 'value' || new RegExp(accept.pattern, accept.flags).test(value);
+}
+var items = [], i, j;
+if (plan.items === null) {
+    items = [root];
+} else {
+    for (i = 0; i < plan.items.length && !items.length; i++) {
+        items = queryAll(root, plan.items[i]);
+        if (items.length) { result.selector = plan.items[i]; hit('items', plan.items[i]); }
+    }
+}
+for (i = 0; i < items.length; i++) {
+    var elements = {}, values = {}, valid = true;
+    for (j = 0; j < plan.fields.length; j++) {
+        var f = plan.fields[j], scope = f.within ? elements[f.within] : items[i];
+        var element = null, value = null;
+        if (f.when_empty && values[f.when_empty]) { values[f.name] = null; continue; }
+        if (!scope) {
+            values[f.name] = f.default_without_within;
+            if (f.required) valid = false;
+            continue;
+        }
+        if (!f.chain.length) {
+            element = scope;
+            value = read(scope, f.sources);
+        }
+        for (var k = 0; k < f.chain.length && !element; k++) {
+            var entry = f.chain[k], candidate = query(scope, entry.selector);
+            if (!candidate) continue;
+            var candidateValue = read(candidate, entry.sources);
+            if (accepts(entry.accept, candidateValue)) {
+                element = candidate;
+                value = candidateValue;
+                hit(f.name, entry.selector);
+            }
+        }
+        if (!element) {
+            if (f.required) valid = false;
+            value = f.fallback_source ? (read(scope, [f.fallback_source]) || f.default) : f.default;
+        }
+        elements[f.name] = element;
+        values[f.name] = value;
+    }
+    if (valid) result.records.push(values); else result.invalid++;
+}
+if (plan.strict && result.invalid) result.records = [];
+return result;
+"""
+
+_plan_patterns = {}
+
+def _plan_accepts(accept, value):
+    if accept["kind"] == "any":
+        return True
+    if not value:
+        return False
+    if accept["kind"] == "value":
+        return True
+    key = (accept["pattern"], accept["flags"])
+    if key not in _plan_patterns:
+        _plan_patterns[key] = re.compile(accept["pattern"], re.I if accept["flags"] else 0)
+    return bool(_plan_patterns[key].search(value))
+
+def _plan_read(element, sources):
+    """Значение элемента из первого непустого источника (так же, как read() в _PLAN_SCRIPT)"""
+    value = None
+    for source in sources:
+        if source == "text":
+            value = element.text.strip()
+        elif source == "textContent":
+            value = driver.execute_script("return arguments[0].textContent;", element).strip()
+        else:
+            value = element.get_attribute(source)
+        if value:
+            return value
+    return value
+
+def _run_plan_elements(plan, root=None):
+    """Выполняет план через find_element / get_attribute (WebDriver, HTTP-движок, снимки)"""
+    result = {"selector": None, "records": [], "hits": {}, "invalid": 0}
+    hit = lambda field, selector: result["hits"].setdefault(field, {}).__setitem__(
+        selector, result["hits"][field].get(selector, 0) + 1)
+    container = root if root is not None else driver
+
+    items = []
+    if plan["items"] is None:
+        items = [container]
+    else:
+        for selector in plan["items"]:
             try:
-                image_found = False
-                
-                # Ищем изображения в span элементах с data-src (ленивая загрузка)
+                items = container.find_elements(By.CSS_SELECTOR, selector)
+            except Exception:
+                continue
+            if items:
+                result["selector"] = selector
+                hit("items", selector)
+                break
+
+    for item in items:
+        elements, values, valid = {}, {}, True
+        for field in plan["fields"]:
+            name = field["name"]
+            if field["when_empty"] and values.get(field["when_empty"]):
+                values[name] = None
+                continue
+            scope = elements.get(field["within"]) if field["within"] else item
+            if scope is None:
+                values[name] = field["default_without_within"]
+                valid = valid and not field["required"]
+                continue
+
+            element, value = None, None
+            if not field["chain"]:
+                element, value = scope, _plan_read(scope, field["sources"])
+            for entry in field["chain"]:
                 try:
-                    span_selectors = [
-                        "span.section-gallery-wrapper__item",
-                        ".section-gallery-wrapper span[data-src]",
-                        "span[data-src*='.jpg']",
-                        "span[data-src*='.png']",
-                        "span[data-src*='.jpeg']"
-                    ]
-                    
-                    for selector in span_selectors:
-                        try:
-                            span_elem = item.find_element(By.CSS_SELECTOR, selector)
-                            image_url = span_elem.get_attribute('data-src')
-                            
-                            if image_url:
-                                if not image_url.startswith('http'):
-                                    if image_url.startswith('//'):
-                                        image_url = 'https:' + image_url
-                                    elif image_url.startswith('/'):
-                                        image_url = 'https://cnc1.ru' + image_url
-                                product_data["image_url"] = image_url
-                                image_found = True
-                                break
-                        except:
-                            continue
-                except:
-                    pass
-                
-                # Если не найдено в span с data-src, ищем обычные img теги
-                if not image_found:
-                    image_selectors = [
-                        ".image_block img",  # Новая структура - основной селектор
-                        ".list_item_wrap .image_block img",  # Новая структура - детализированный
-                        ".section-gallery-wrapper.flexbox img",  # Старая структура
-                        "div.section-gallery-wrapper img", 
-                        ".section-gallery-wrapper img",
-                        ".item_info img",  # Новая структура альтернатива
-                        "img"
-                    ]
-                    
-                    for selector in image_selectors:
-                        try:
-                            image_elem = item.find_element(By.CSS_SELECTOR, selector)
-                            # Проверяем и data-src и src
-                            image_url = image_elem.get_attribute('data-src') or image_elem.get_attribute('src')
-                            
-                            if image_url:
-                                if not image_url.startswith('http'):
-                                    if image_url.startswith('//'):
-                                        image_url = 'https:' + image_url
-                                    elif image_url.startswith('/'):
-                                        image_url = 'https://cnc1.ru' + image_url
-                                product_data["image_url"] = image_url
-                                image_found = True
-                                print(f"   🖼️ Изображение найдено с селектором: {selector}")
-                                break
-                        except:
-                            continue
-                
-                if not image_found:
-                    print(f"   → Изображение не найдено для товара {i+1}")
-                        
-            except Exception as e:
-                print(f"   → Ошибка извлечения изображения для товара {i+1}: {e}")
-            
-            # Извлекаем цену
-            try:
-                # Ищем обычную цену с учетом структуры со скриншота
-                price_selectors = [
-                    ".price_matrix_wrapper .price",  # Новая структура
-                    ".cost.price.clearfix",  # Новая структура альтернатива  
-                    ".information_wrap .cost.price",  # Новая структура детализированная
-                    "span.values_wrapper",  # Основной селектор со скриншота (старая структура)
-                    "span.price_measure",   # Альтернативный
-                    ".price.font-bold.font_mxs",
-                    ".values_wrapper",
-                    ".price_measure", 
-                    ".price",
-                    "[data-currency]",
-                    "[data-value*='RUB']"
-                ]
-                
-                for selector in price_selectors:
+                    candidate = scope.find_element(By.CSS_SELECTOR, entry["selector"])
+                    candidate_value = _plan_read(candidate, entry["sources"])
+                except Exception:
+                    continue
+                if _plan_accepts(entry["accept"], candidate_value):
+                    element, value = candidate, candidate_value
+                    hit(name, entry["selector"])
+                    break
+
+            if element is None:
+                valid = valid and not field["required"]
+                value = field["default"]
+                if field["fallback_source"]:
                     try:
-                        price_elem = item.find_element(By.CSS_SELECTOR, selector)
-                        price_text = price_elem.text.strip()
-                        if price_text and any(char.isdigit() for char in price_text):
-                            product_data["price"] = price_text
-                            print(f"   → Найдена цена с селектором {selector}: {price_text}")
-                            break
-                    except:
-                        continue
-                        
-            except Exception as e:
-                print(f"   → Ошибка извлечения цены для товара {i+1}: {e}")
-            
-            # Если обычной цены нет, ищем предзаказную цену
-            if not product_data["price"]:
-                try:
-                    preorder_selectors = [
-                        ".preorder_button",
-                        "[data-name*='preorder']",
-                        ".btn-default[href*='order']",
-                        ".to-order"
-                    ]
-                    
-                    for selector in preorder_selectors:
-                        try:
-                            preorder_elem = item.find_element(By.CSS_SELECTOR, selector)
-                            preorder_text = preorder_elem.text.strip()
-                            if preorder_text:
-                                product_data["preorder_price"] = preorder_text
-                                product_data["is_preorder"] = True
-                                break
-                        except:
-                            continue
-                            
-                except Exception as e:
-                    print(f"   → Ошибка извлечения предзаказной цены для товара {i+1}: {e}")
-            
-            products.append(product_data)
-            
-            # Логируем найденную информацию
-            print(f"   → Товар {i+1}: {product_data['name']}")
-            if product_data["image_url"]:
-                print(f"     ├── Изображение: {product_data['image_url']}")
-            if product_data["price"]:
-                print(f"     ├── Цена: {product_data['price']}")
-            elif product_data["preorder_price"]:
-                print(f"     ├── Предзаказ: {product_data['preorder_price']}")
-            if product_data["url"]:
-                print(f"     └── Ссылка: {product_data['url']}")
-                
+                        value = _plan_read(scope, [field["fallback_source"]]) or field["default"]
+                    except Exception:
+                        pass
+            elements[name] = element
+            values[name] = value
+
+        if valid:
+            result["records"].append(values)
+        else:
+            result["invalid"] += 1
+    if plan["strict"] and result["invalid"]:
+        result["records"] = []  # Строгий список: один неполный элемент — и весь список не принимается
+    return result
+
+def _ordered_plan(list_name, template):
+    """План списка с цепочками в порядке, подобранном для шаблона страницы"""
+    plan = EXTRACTION_PLAN[list_name]
+    ordered = dict(plan)
+    if plan["items"] is not None:
+        ordered["items"] = ordered_selectors(f"{list_name}_items", plan["items"], template)
+    ordered["fields"] = []
+    for field in plan["fields"]:
+        entries = {entry["selector"]: entry for entry in field["chain"]}
+        order = ordered_selectors(f"{list_name}_{field['name']}", list(entries), template)
+        ordered["fields"].append(dict(field, chain=[entries[selector] for selector in order]))
+    return ordered
+
+def run_extraction_plan(list_name, root=None):
+    """
+    Извлекает список (или поля страницы) по плану из extraction_schema.json.
+    В браузере — одним вызовом _PLAN_SCRIPT, иначе и при ошибке скрипта — через интерфейс элементов.
+    Возвращает {"selector": сработавший селектор элементов, "records": [{поле: значение}],
+    "invalid": число элементов без обязательных полей}. У строгого списка ("strict": true)
+    при хотя бы одном таком элементе records пуст.
+    """
+    template = page_template_key()
+    plan = _ordered_plan(list_name, template)
+
+    result = None
+    if extraction_config["in_browser"] and not isinstance(driver, ParsedPage):
+        try:
+            result = driver.execute_script(_PLAN_SCRIPT, plan, root)
         except Exception as e:
-            print(f"   → Пропущен товар {i+1}: {e}")
+            print(f"⚠️ Извлечение скриптом не удалось, поэлементный разбор: {e}")
+    if result is None:
+        result = _run_plan_elements(plan, root)
+
+    for field, hits in result["hits"].items():
+        for selector, count in hits.items():
+            record_selector_hit(f"{list_name}_{field}", selector, template, count)
+
+    normalized = [field["name"] for field in plan["fields"] if field["normalize"] == "absolute_url"]
+    for record in result["records"]:
+        for name in normalized:
+            if record.get(name):
+                record[name] = _absolute_image_url(record[name])
+    return result
+
+def _absolute_image_url(image_url):
+    """Дополняет относительный адрес изображения до полного"""
+    if not image_url.startswith('http'):
+        if image_url.startswith('//'):
+            image_url = 'https:' + image_url
+        elif image_url.startswith('/'):
+            image_url = 'https://cnc1.ru' + image_url
+    return image_url
+
+def _print_custom_list_product(index, product_data):
+    """Логирует найденную информацию о товаре"""
+    print(f"   → Товар {index}: {product_data['name']}")
+    if product_data["image_url"]:
+        print(f"     ├── Изображение: {product_data['image_url']}")
+    if product_data["price"]:
+        print(f"     ├── Цена: {product_data['price']}")
+    elif product_data["preorder_price"]:
+        print(f"     ├── Предзаказ: {product_data['preorder_price']}")
+    if product_data["url"]:
+        print(f"     └── Ссылка: {product_data['url']}")
+
+def _print_custom_list_diagnostics():
+    """Диагностика страницы, на которой не нашлось товаров"""
+    print("❌ Товары не найдены! Попробуем диагностику...")
+    page_content_indicators = [
+        "div.sections_wrapper.block",
+        "table",
+        ".catalog-adaptive",
+        ".list_item",
+        ".item_info"
+    ]
+    
+    for indicator in page_content_indicators:
+        elements = driver.find_elements(By.CSS_SELECTOR, indicator)
+        print(f"   🔍 {indicator}: найдено {len(elements)} элементов")
+
+def parse_custom_list(page_type=None):
+    """
+    Парсит товары из custom_list с детальной информацией:
+    - изображения, цены, ссылки
+    - поддержка предзаказных цен
+    - поддержка страниц отдельных товаров (product-detail)
+    page_type — тип страницы, уже определенный classify_page; без него страница
+    проверяется по признакам макета.
+    Поля извлекаются по плану custom_list из extraction_schema.json.
+    """
+    if page_type is None:
+        try:
+            page_type = "product_detail" if _has_detail_layout(probe_page_layout()) else "custom_list"
+        except Exception:
+            page_type = "custom_list"
+
+    if page_type == "product_detail":
+        # Парсим страницу отдельного товара
+        print("🔍 Обнаружена страница отдельного товара")
+        return parse_single_product_page()
+
+    result = run_extraction_plan("custom_list")
+    print(f"Найдено элементов custom_list: {len(result['records'])}")
+    
+    if not result["records"]:
+        _print_custom_list_diagnostics()
+        return []
+    print(f"✅ Найдены товары с селектором: {result['selector']} ({len(result['records'])} элементов)")
+    
+    products = []
+    for i, item in enumerate(result["records"]):
+        product_data = {
+            "name": item["name"],
+            "url": item["url"],
+            "image_url": item["image_url"],
+            "price": item["price"],
+            "preorder_price": item["preorder_price"],
+            "is_preorder": bool(item["preorder_price"])
+        }
+        products.append(product_data)
+        _print_custom_list_product(i + 1, product_data)
     
     print(f"Найдено товаров в custom_list: {len(products)}")
     return products
 
+# === Структурированные данные товара (schema.org) ===
+
+# Один вызов: тексты JSON-LD и микроразметка Product (itemprop) со страницы товара
+_STRUCTURED_DATA_SCRIPT = """
+function owner(el) { return el.parentElement ? el.parentElement.closest('[itemscope]') : null; }
+function value(el) {
+    if (el.hasAttribute('content')) return el.getAttribute('content');
+    if (el.hasAttribute('href')) return el.href;
+    if (el.hasAttribute('src')) return el.src;
+    return el.textContent.trim();
+}
+function props(scope) {
+    var found = {}, els = scope.querySelectorAll('[itemprop]');
+    for (var i = 0; i < els.length; i++) {
+        if (owner(els[i]) !== scope) continue;
+        var name = els[i].getAttribute('itemprop');
+        (found[name] = found[name] || []).push(els[i]);
+    }
+    return found;
+}
+var jsonld = [], scripts = document.querySelectorAll('script[type="application/ld+json"]');
+for (var i = 0; i < scripts.length; i++) jsonld.push(scripts[i].textContent);
+// Товар страницы: элемент Product, содержащий h1 (ближайший к нему), иначе Product верхнего
+// уровня — блоки похожих и рекомендованных товаров тоже бывают размечены как Product
+var candidates = document.querySelectorAll('[itemscope][itemtype*="schema.org/Product"]');
+var heading = document.querySelector('h1'), product = null, k;
+for (k = 0; k < candidates.length; k++) {
+    if (heading && candidates[k].contains(heading)) product = candidates[k];
+}
+for (k = 0; k < candidates.length && !product; k++) {
+    var parent = candidates[k].parentElement;
+    if (!parent || !parent.closest('[itemscope][itemtype*="schema.org/Product"]')) product = candidates[k];
+}
+var microdata = null;
+if (product) {
+    var p = props(product), offer = p.offers ? props(p.offers[0]) : {};
+    microdata = {
+        name: p.name ? value(p.name[0]) : null,
+        image: p.image ? value(p.image[0]) : null,
+        price: offer.price ? value(offer.price[0]) : (offer.lowPrice ? value(offer.lowPrice[0]) : null),
+        currency: offer.priceCurrency ? value(offer.priceCurrency[0]) : null,
+        availability: offer.availability ? value(offer.availability[0]) : null,
+        properties: []
+    };
+    var extra = p.additionalProperty || [];
+    for (var j = 0; j < extra.length; j++) {
+        var ep = props(extra[j]);
+        if (ep.name && ep.value) microdata.properties.push([value(ep.name[0]), value(ep.value[0])]);
+    }
+}
+return {jsonld: jsonld, microdata: microdata};
+"""
+
+def _microdata_owner(node):
+    """Ближайший предок с itemscope (сам элемент не учитывается)"""
+    parent = node.getparent()
+    while parent is not None and parent.get("itemscope") is None:
+        parent = parent.getparent()
+    return parent
+
+def _microdata_value(node, page):
+    """Значение itemprop так же, как в _STRUCTURED_DATA_SCRIPT"""
+    if node.get("content") is not None:
+        return node.get("content")
+    for attribute in ("href", "src"):
+        if node.get(attribute) is not None:
+            return urljoin(page.current_url, node.get(attribute))
+    return node.text_content().strip()
+
+def _microdata_props(scope):
+    """{itemprop: [элементы]}, принадлежащие самой области scope"""
+    found = {}
+    for node in scope.iterdescendants():
+        if not isinstance(node, lxml.html.HtmlElement) or node.get("itemprop") is None:
+            continue
+        if _microdata_owner(node) is scope:
+            found.setdefault(node.get("itemprop"), []).append(node)
+    return found
+
+def _page_microdata_product(tree):
+    """Элемент Product самого товара страницы (тот же выбор, что в _STRUCTURED_DATA_SCRIPT)"""
+    products = tree.xpath('//*[@itemscope][contains(@itemtype, "schema.org/Product")]')
+    headings = tree.xpath('//h1')
+    if headings:
+        owners = [product for product in products if headings[0] in product.iterdescendants()]
+        if owners:
+            return owners[-1]  # В порядке документа последний — ближайший к h1
+    for product in products:
+        if not any(ancestor in products for ancestor in product.iterancestors()):
+            return product
+    return None
+
+def _read_structured_data_static(page):
+    """Тексты JSON-LD и микроразметка Product со страницы HTTP-движка или снимка"""
+    if page.tree is None:
+        return {"jsonld": [], "microdata": None}
+    jsonld = [script.text_content() for script in page.tree.xpath('//script[@type="application/ld+json"]')]
+    product = _page_microdata_product(page.tree)
+    if product is None:
+        return {"jsonld": jsonld, "microdata": None}
+
+    found = _microdata_props(product)
+    offer = _microdata_props(found["offers"][0]) if found.get("offers") else {}
+    first = lambda props, name: _microdata_value(props[name][0], page) if props.get(name) else None
+    properties = []
+    for extra in found.get("additionalProperty", []):
+        extra_props = _microdata_props(extra)
+        if extra_props.get("name") and extra_props.get("value"):
+            properties.append([first(extra_props, "name"), first(extra_props, "value")])
+    return {
+        "jsonld": jsonld,
+        "microdata": {
+            "name": first(found, "name"),
+            "image": first(found, "image"),
+            "price": first(offer, "price") or first(offer, "lowPrice"),
+            "currency": first(offer, "priceCurrency"),
+            "availability": first(offer, "availability"),
+            "properties": properties
+        }
+    }
+
+def _jsonld_product(texts):
+    """Первый объект Product из блоков JSON-LD (в том числе внутри списков и @graph)"""
+    stack = []
+    for text in texts:
+        try:
+            stack.append(json.loads(text))
+        except ValueError:
+            continue
+    while stack:
+        item = stack.pop(0)
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            types = item.get("@type")
+            if "Product" in (types if isinstance(types, list) else [types]):
+                return item
+            stack.extend(item.get("@graph", []))
+    return None
+
+def _jsonld_text(value, *keys):
+    """
+    Строка из значения JSON-LD, которое может оказаться списком, объектом или числом:
+    из списка берется первый элемент, из объекта — первый найденный ключ keys.
+    """
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = next((value[key] for key in keys if value.get(key) not in (None, "")), None)
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return value.strip() or None
+    return None
+
+def _jsonld_fields(product):
+    """Поля Product/Offer из JSON-LD в виде, общем с микроразметкой"""
+    offers = product.get("offers")
+    if isinstance(offers, list):
+        offers = next((offer for offer in offers if isinstance(offer, dict)), None)
+    if not isinstance(offers, dict):
+        offers = {}
+    specification = offers.get("priceSpecification")
+    price = (_jsonld_text(offers.get("price")) or _jsonld_text(offers.get("lowPrice"))
+             or _jsonld_text(specification, "price"))
+
+    extra = product.get("additionalProperty") or []
+    if isinstance(extra, dict):
+        extra = [extra]  # Одно свойство PropertyValue без списка
+    properties = []
+    for prop in extra:
+        if isinstance(prop, dict) and _jsonld_text(prop.get("name")) and _jsonld_text(prop.get("value"), "@value"):
+            properties.append([_jsonld_text(prop["name"]), _jsonld_text(prop["value"], "@value")])
+    return {
+        "name": _jsonld_text(product.get("name"), "@value"),
+        "image": _jsonld_text(product.get("image"), "url", "contentUrl"),
+        "price": price,
+        "currency": _jsonld_text(offers.get("priceCurrency")) or _jsonld_text(specification, "priceCurrency"),
+        "availability": _jsonld_text(offers.get("availability"), "@id"),
+        "properties": properties
+    }
+
+# Обозначения валют, как в ценах на страницах каталога ("150 000 ₽")
+CURRENCY_SIGNS = {"RUB": "₽", "RUR": "₽", "USD": "$", "EUR": "€", "CNY": "¥"}
+
+def format_structured_price(price, currency=None):
+    """
+    Цена schema.org ("150000", "1234.5") в формате цен, которые дают цепочки селекторов:
+    разряды через пробел, копейки через запятую, знак валюты ("150 000 ₽", "1 234,50 ₽").
+    Нечисловая цена возвращается как есть.
+    """
+    try:
+        amount = float(str(price).replace(" ", "").replace("\u00a0", "").replace(",", "."))
+    except ValueError:
+        return price
+    if amount != amount or amount in (float("inf"), float("-inf")):
+        return price  # "NaN", "Infinity"
+    if amount.is_integer():
+        text = f"{int(amount):,}".replace(",", " ")
+    else:
+        text = f"{amount:,.2f}".replace(",", " ").replace(".", ",")
+    sign = CURRENCY_SIGNS.get((currency or "").upper(), currency)
+    return f"{text} {sign}" if sign else text
+
+def read_structured_product():
+    """
+    Данные schema.org Product со страницы товара: JSON-LD, недостающие поля — из микроразметки.
+    Возвращает {"name", "image", "price", "currency", "availability", "properties"}
+    или пустой словарь, если структурированных данных нет.
+    """
+    try:
+        if isinstance(driver, ParsedPage):
+            raw = _read_structured_data_static(driver)
+        else:
+            raw = driver.execute_script(_STRUCTURED_DATA_SCRIPT)
+    except Exception as e:
+        print(f"   ⚠️ Структурированные данные не прочитаны: {e}")
+        return {}
+
+    product = _jsonld_product(raw["jsonld"])
+    fields = _jsonld_fields(product) if product else {}
+    for key, value in (raw["microdata"] or {}).items():
+        if not fields.get(key):
+            fields[key] = value
+
+    if fields.get("price"):
+        fields["price"] = format_structured_price(fields["price"], fields.get("currency"))
+    if fields.get("availability"):
+        # https://schema.org/InStock -> InStock
+        fields["availability"] = fields["availability"].rstrip("/").rsplit("/", 1)[-1]
+    return fields if any(fields.values()) else {}
+
 def parse_single_product_page():
     """
-    Парсит страницу отдельного товара с новой структурой CSS
+    Парсит страницу отдельного товара с новой структурой CSS.
+    Если на странице есть schema.org Product (JSON-LD или микроразметка), поля берутся
+    из него, а цепочки селекторов используются только для отсутствующих полей.
     """
     try:
+        structured = read_structured_product()
         product_data = {
             "name": "Не указано",
             "url": driver.current_url,
@@ -1205,146 +3176,40 @@ def parse_single_product_page():
             "characteristics": {}
         }
         
-        # Извлекаем название товара
-        try:
-            title_selectors = [
-                "h1.product-main__title",
-                "h1[itemprop='name']",
-                ".product-main h1",
-                ".product-info h1",
-                "h1"
-            ]
-            
-            for selector in title_selectors:
-                try:
-                    title_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                    product_data["name"] = title_elem.text.strip()
-                    print(f"   ✅ Название: {product_data['name']}")
-                    break
-                except:
-                    continue
-        except Exception as e:
-            print(f"   ❌ Ошибка извлечения названия: {e}")
+        # Поля, которых нет в schema.org, — по плану product_detail из extraction_schema.json
+        fields = {}
+        if not all(structured.get(key) for key in ("name", "image", "price")):
+            fields = run_extraction_plan("product_detail")["records"][0]
+
+        # Название товара
+        if structured.get("name"):
+            product_data["name"] = structured["name"].strip()
+            print(f"   ✅ Название (schema.org): {product_data['name']}")
+        else:
+            product_data["name"] = fields["name"]
+            if fields["name"] != "Не указано":
+                print(f"   ✅ Название: {product_data['name']}")
         
-        # Извлекаем изображение из product-detail-gallery__container
-        try:
-            image_found = False
-            
-            # Новые селекторы согласно вашему описанию
-            image_selectors = [
-                ".product-detail-gallery__container--vertical link[href]",  # В теге link, в href
-                ".product-detail-gallery__container link[href]",
-                ".product-detail-gallery__container a[href*='.jpg']",
-                ".product-detail-gallery__container a[href*='.png']",
-                ".product-detail-gallery__container a[href*='.jpeg']",
-                ".product-detail-gallery__container a.fancy.popup_link",
-                ".product-detail-gallery__container .fancy[href]"
-            ]
-            
-            for selector in image_selectors:
-                try:
-                    image_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                    image_url = image_elem.get_attribute('href')
-                    
-                    if image_url and any(ext in image_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                        if not image_url.startswith('http'):
-                            if image_url.startswith('//'):
-                                image_url = 'https:' + image_url
-                            elif image_url.startswith('/'):
-                                image_url = 'https://cnc1.ru' + image_url
-                        
-                        product_data["image_url"] = image_url
-                        image_found = True
-                        print(f"   ✅ Изображение найдено: {image_url}")
-                        break
-                except Exception as e:
-                    continue
-            
-            # Если не найдено в link/a тегах, ищем в img
-            if not image_found:
-                img_selectors = [
-                    ".product-detail-gallery__container img[src]",
-                    ".product-detail-gallery__container img[data-src]",
-                    ".product-detail-gallery img"
-                ]
-                
-                for selector in img_selectors:
-                    try:
-                        img_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                        image_url = img_elem.get_attribute('data-src') or img_elem.get_attribute('src')
-                        
-                        if image_url:
-                            if not image_url.startswith('http'):
-                                if image_url.startswith('//'):
-                                    image_url = 'https:' + image_url
-                                elif image_url.startswith('/'):
-                                    image_url = 'https://cnc1.ru' + image_url
-                            
-                            product_data["image_url"] = image_url
-                            image_found = True
-                            print(f"   ✅ Изображение (img): {image_url}")
-                            break
-                    except:
-                        continue
-            
-            if not image_found:
-                print("   ❌ Изображение не найдено")
-                
-        except Exception as e:
-            print(f"   ❌ Ошибка извлечения изображения: {e}")
+        # Изображение из product-detail-gallery__container
+        product_data["image_url"] = _absolute_image_url(structured["image"]) if structured.get("image") else fields["image_url"]
+        if product_data["image_url"]:
+            print(f"   ✅ Изображение найдено: {product_data['image_url']}")
+        else:
+            print("   ❌ Изображение не найдено")
         
-        # Извлекаем цену из .price.font-bold.font_mxs
-        try:
-            price_found = False
-            price_selectors = [
-                ".price.font-bold.font_mxs",
-                ".price.font-bold",
-                ".price_detail",
-                ".cost.font-bold",
-                "[data-currency='RUB']",
-                ".price"
-            ]
-            
-            for selector in price_selectors:
-                try:
-                    price_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                    price_text = price_elem.text.strip()
-                    
-                    if price_text and any(char.isdigit() for char in price_text):
-                        product_data["price"] = price_text
-                        price_found = True
-                        print(f"   ✅ Цена найдена: {price_text}")
-                        break
-                except:
-                    continue
-            
-            # Если обычной цены нет, ищем предзаказную
-            if not price_found:
-                preorder_selectors = [
-                    ".preorder_button",
-                    "[data-name*='preorder']",
-                    ".btn[href*='order']",
-                    ".to-order",
-                    ".order-button"
-                ]
-                
-                for selector in preorder_selectors:
-                    try:
-                        preorder_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                        preorder_text = preorder_elem.text.strip()
-                        if preorder_text:
-                            product_data["preorder_price"] = preorder_text
-                            product_data["is_preorder"] = True
-                            print(f"   ✅ Предзаказная цена: {preorder_text}")
-                            break
-                    except:
-                        continue
-            
-            if not price_found and not product_data["preorder_price"]:
-                print("   ❌ Цена не найдена")
-                
-        except Exception as e:
-            print(f"   ❌ Ошибка извлечения цены: {e}")
+        # Цена, а если ее нет — предзаказная цена
+        if structured.get("price"):
+            product_data["price"] = structured["price"]
+            print(f"   ✅ Цена (schema.org): {structured['price']}")
+        elif fields["price"]:
+            product_data["price"] = fields["price"]
+            print(f"   ✅ Цена найдена: {fields['price']}")
+        elif fields["preorder_price"]:
+            product_data["preorder_price"] = fields["preorder_price"]
+            product_data["is_preorder"] = True
+            print(f"   ✅ Предзаказная цена: {fields['preorder_price']}")
+        else:
+            print("   ❌ Цена не найдена")
         
         # Извлекаем характеристики товара
         try:
@@ -1362,6 +3227,12 @@ def parse_single_product_page():
         except:
             pass
         
+        # Характеристики из schema.org дополняют таблицу
+        for key, value in structured.get("properties", []):
+            product_data["characteristics"].setdefault(key, value)
+        product_data["currency"] = structured.get("currency")
+        product_data["availability"] = structured.get("availability")
+        
         print(f"   📦 Товар обработан: {product_data['name']}")
         return [product_data]
         
@@ -1369,6 +3240,145 @@ def parse_single_product_page():
         print(f"   ❌ Ошибка парсинга страницы товара: {e}")
         return []
 
+# === Пакетное чтение таблиц товаров ===
+
+# Заголовки блока по умолчанию, если в нем нет таблицы
+DEFAULT_BLOCK_HEADERS = ["Артикул", "Система ЧПУ", "Характеристики", "Цена"]
+
+# Один вызов на блок или страницу: заголовки и все строки × ячейки таблицы.
+# Строка: [артикул, ссылка, название, [ячейки], изображение, найден ли элемент изображения]
+_TABLE_SCRIPT = _JS_EXTRACT_HELPERS + """
+var root = arguments[0], opts = arguments[1], i, j, cells;
+var result = {headers: null, header_selector: null, rows: []};
+if (root) {
+    var table = query(root, 'table');
+    if (table) {
+        result.headers = [];
+        cells = queryAll(table, 'th');
+        for (i = 0; i < cells.length; i++) {
+            var header = cells[i].textContent.trim();
+            if (header && result.headers.indexOf(header) < 0) result.headers.push(header);
+        }
+    }
+} else {
+    cells = [];
+    for (i = 0; i < opts.header_selectors.length && !cells.length; i++) {
+        cells = queryAll(document, opts.header_selectors[i]);
+        if (cells.length) result.header_selector = opts.header_selectors[i];
+    }
+    if (!cells.length) cells = queryAll(document, 'th');
+    result.headers = [];
+    for (i = 0; i < cells.length; i++) {
+        if (cells[i].textContent.trim()) result.headers.push(cells[i].textContent.trim());
+    }
+}
+var rows = queryAll(root || document, 'tr.main_item_wrapper');
+for (i = 0; i < rows.length; i++) {
+    var row = rows[i], link = query(row, 'a.dark_link.js-notice-block__title');
+    var span = link ? query(link, 'span') : null, nameEl = query(row, 'span.font_md');
+    var props = queryAll(row, 'td.table-view__item-wrapper-prop'), values = [];
+    for (j = 0; j < props.length; j++) values.push(text(props[j]));
+    var image = null;
+    for (j = 0; j < opts.image_selectors.length && !image; j++) image = query(row, opts.image_selectors[j]);
+    result.rows.push([
+        span ? text(span) : null,
+        span ? prop(link, 'href') : null,
+        nameEl ? text(nameEl) : null,
+        values,
+        image ? prop(image, 'src') : null,
+        !!image
+    ]);
+}
+return result;
+"""
+
+def _read_table_row(row, image_selectors):
+    """Поэлементное чтение строки таблицы (HTTP-движок и снимки страниц)"""
+    try:
+        article_link = row.find_element(By.CSS_SELECTOR, "a.dark_link.js-notice-block__title")
+        article = article_link.find_element(By.TAG_NAME, "span").text.strip()
+        url = article_link.get_attribute('href')
+    except:
+        article = None
+        url = None
+
+    try:
+        name = row.find_element(By.CSS_SELECTOR, "span.font_md").text.strip()
+    except:
+        name = None
+
+    cells = [cell.text.strip() for cell in row.find_elements(By.CSS_SELECTOR, "td.table-view__item-wrapper-prop")]
+
+    image_elem = None
+    for selector in image_selectors:
+        try:
+            image_elem = row.find_element(By.CSS_SELECTOR, selector)
+            break
+        except:
+            continue
+    image_url = image_elem.get_attribute('src') if image_elem else None
+    return [article, url, name, cells, image_url, image_elem is not None]
+
+def _read_block_headers(block):
+    """Заголовки первой таблицы блока без повторов; None, если таблицы нет"""
+    try:
+        table_elem = block.find_element(By.CSS_SELECTOR, "table")
+    except:
+        return None
+    headers = []
+    for cell in table_elem.find_elements(By.CSS_SELECTOR, "th"):
+        header_text = driver.execute_script("return arguments[0].textContent;", cell).strip()
+        if header_text and header_text not in headers:
+            headers.append(header_text)
+    return headers
+
+def read_table(root=None, image_selectors=()):
+    """
+    Заголовки и строки таблицы товаров. В браузере — одним вызовом скрипта на блок или страницу.
+    root — блок товаров (заголовки из его первой таблицы, None если таблицы нет)
+    или None — вся страница (заголовки как в get_table_headers).
+    Возвращает {"headers": [...], "rows": [[артикул, ссылка, название, [ячейки], изображение, найдено]]};
+    отсутствующие артикул, ссылка, название и изображение — None.
+    """
+    if extraction_config["in_browser"] and not isinstance(driver, ParsedPage):
+        try:
+            template = page_template_key()
+            header_selectors = ordered_selectors("table_headers", SELECTOR_CHAINS["table_headers"], template)
+            result = driver.execute_script(_TABLE_SCRIPT, root, {
+                "header_selectors": header_selectors,
+                "image_selectors": list(image_selectors)
+            })
+            if root is None:
+                if result["header_selector"]:
+                    print(f" → Найдены заголовки с селектором: {result['header_selector']}")
+                    record_selector_hit("table_headers", result["header_selector"], template)
+                print(f" → Найдено заголовков таблицы: {len(result['headers'])}")
+                print(f" → Заголовки: {result['headers']}")
+            return result
+        except Exception as e:
+            print(f" → Пакетное чтение таблицы не удалось, поэлементный разбор: {e}")
+
+    headers = _read_block_headers(root) if root is not None else get_table_headers()
+    container = root if root is not None else driver
+    rows = []
+    for row in container.find_elements(By.CSS_SELECTOR, "tr.main_item_wrapper"):
+        try:
+            rows.append(_read_table_row(row, image_selectors))
+        except Exception as e:
+            print(f" → Пропущен товар: {e}")
+    return {"headers": headers, "rows": rows}
+
+def _table_row_props(cells, table_headers):
+    """Параметры строки по заголовкам таблицы (первые 2 колонки — артикул и название)"""
+    props = {}
+    for j, cell_text in enumerate(cells):
+        if j < len(table_headers) - 2:
+            header_name = table_headers[j + 2] if j + 2 < len(table_headers) else f"param_{j+1}"
+            props[header_name] = cell_text
+        else:
+            props[f"param_{j+1}"] = cell_text
+    return props
+
 def get_table_headers():
     """
     Извлекает заголовки таблицы товаров.
@@ -1377,21 +3387,14 @@ def get_table_headers():
     headers = []
     try:
         # Пробуем разные варианты селекторов для заголовков таблицы
-        header_selectors = [
-            "tr.table-view__item-wrapper--head th",
-            "thead tr th",
-            "tr:first-child th", 
-            ".table-view__item-wrapper--head th",
-            "div.razdel.table_all tr:first-child th",
-            "table tr:first-child th"
-        ]
-        
+        template = page_template_key()
         header_cells = []
-        for selector in header_selectors:
+        for selector in ordered_selectors("table_headers", SELECTOR_CHAINS["table_headers"], template):
             try:
                 header_cells = driver.find_elements(By.CSS_SELECTOR, selector)
                 if header_cells:
                     print(f" → Найдены заголовки с селектором: {selector}")
+                    record_selector_hit("table_headers", selector, template)
                     break
             except:
                 continue
@@ -1414,57 +3417,244 @@ def get_table_headers():
     
     return headers
 
-def parse_structured_products():
+# === Параллельная пагинация ===
+
+pagination_config = {
+    "enabled": True,
+    "follow_full_list": False,  # True — прежнее поведение: переход на «Полный список» вместо страниц PAGEN_N
+    "max_pages": 100,
+    "concurrency": 4  # Сколько страниц загружается одновременно
+}
+
+def detect_pagination(target=None):
     """
-    Парсит товары по отдельным блокам, каждый с своей таблицей, заголовками и изображением.
-    Возвращает список блоков товаров.
+    Ищет в div.module-pagination ссылки с параметром PAGEN_N.
+    Возвращает (параметр, число страниц, номер текущей страницы) или None.
     """
-    
-    # Шаг 1: Проверяем, есть ли "Полный список"
+    target = target or driver
+    page_param, page_count = None, 1
+    for link in target.find_elements(By.CSS_SELECTOR, "div.module-pagination a[href]"):
+        for name, value in parse_qsl(urlparse(link.get_attribute("href") or "").query):
+            if re.fullmatch(r"PAGEN_\d+", name) and value.isdigit():
+                page_param = name
+                page_count = max(page_count, int(value))
+    if page_param is None:
+        return None
+    current = dict(parse_qsl(urlparse(target.current_url).query)).get(page_param, "1")
+    return page_param, min(page_count, pagination_config["max_pages"]), int(current) if current.isdigit() else 1
+
+def pagination_page_url(url, page_param, page_number):
+    """Адрес страницы с номером page_number (остальные параметры запроса сохраняются)"""
+    parsed = urlparse(url)
+    query = [(name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True) if name != page_param]
+    query.append((page_param, str(page_number)))
+    return urlunparse(parsed._replace(query=urlencode(query), fragment=""))
+
+def _fetch_pagination_page(url):
+    """Загружает страницу HTTP-движком; None, если ее нельзя разобрать без JS"""
+    page = StaticDriver(get_static_driver().session)
     try:
-        full_list_link = driver.find_element(By.CSS_SELECTOR, "div.module-pagination a.link")
-        href = full_list_link.get_attribute("href")
-        print(f" → Найдена пагинация. Переходим на полный список: {href}")
-        driver.get(href)
-        time.sleep(1.5)  # Ждём загрузки
-    except:
-        print(" → Ссылка 'Полный список' не найдена. Парсим текущую страницу.")
+        page.load(*page.fetch(url))
+        if is_static_page_usable(page):
+            return page.current_url, page.page_source, page.status_code
+    except Exception as e:
+        print(f"   ⚠️ HTTP-загрузка {url} не удалась ({e}), используем браузер")
+    return None
+
+def _load_browser_page(target, url):
+    target.get(url)
+    note_browser_page(target)
+    wait_for_page_ready("table", target=target)
+    return target.current_url, target.page_source, 200
+
+def _lease_free_browsers(limit):
+    """Берет из пула до limit браузеров, не дожидаясь занятых (acquire без ожидания)"""
+    leased = []
+    while len(leased) < limit:
+        try:
+            leased.append(driver_pool.acquire(timeout=0))
+        except Exception:
+            break
+    return leased
+
+def fetch_pagination_pages(urls, own_browser=None, return_url=None):
+    """
+    Загружает страницы параллельно; порядок результатов совпадает с порядком адресов.
+    Сначала все страницы пробует HTTP-движок. Остальные загружают свободные браузеры пула
+    (столько потоков, сколько браузеров удалось взять сразу), а если свободных нет —
+    по очереди браузер вызывающего (own_browser), который затем возвращается на return_url.
+    """
+    results = [None] * len(urls)
+    if http_engine_available():
+        with ThreadPoolExecutor(max_workers=pagination_config["concurrency"]) as executor:
+            results = list(executor.map(_fetch_pagination_page, urls))
+    pending = queue.Queue()
+    for index, fetched in enumerate(results):
+        if fetched is None:
+            pending.put(index)
+    if pending.empty():
+        return results
+
+    leased = _lease_free_browsers(min(pagination_config["concurrency"], pending.qsize()))
+    browsers = leased or ([own_browser] if own_browser is not None else [])
+    if not browsers:
+        print(f"   ❌ Нет браузера для {pending.qsize()} страниц, требующих JavaScript")
+        return results
+
+    def load_pending(browser):
+        while True:
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = _load_browser_page(browser, urls[index])
+            except Exception as e:
+                print(f"   ❌ Страница {urls[index]} не загружена: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(browsers)) as executor:
+            list(executor.map(load_pending, browsers))
+    finally:
+        for pooled_driver in leased:
+            driver_pool.release(pooled_driver)
+    if not leased and return_url:
+        try:
+            _load_browser_page(own_browser, return_url)  # Вызывающий продолжает работу со своей страницей
+        except Exception as e:
+            print(f"   ⚠️ Не удалось вернуться на {return_url}: {e}")
+    return results
+
+def merge_page_results(results):
+    """
+    Объединяет результаты страниц: блоки с одинаковым заголовком сливаются,
+    повторы товаров (по артикулу и ссылке) внутри блока отбрасываются. Строки без
+    артикула и без ссылки сохраняются все — сравнивать их не по чему.
+    """
+    seen_by_block = {}
+
+    def fresh(products, title=None):
+        seen = seen_by_block.setdefault(title, set())
+        unique = []
+        for product in products:
+            article = product.get("article")
+            if article == "Не указан":
+                article = None
+            key = (article or None, product.get("url") or None)
+            if key == (None, None):
+                unique.append(product)
+            elif key not in seen:
+                seen.add(key)
+                unique.append(product)
+        return unique
+
+    blocks, block_index, products, table_headers = [], {}, [], []
+    for result in results:
+        if isinstance(result, dict) and "structured_blocks" in result:
+            for block in result["blocks"]:
+                title = block.get("block_title", "")
+                if title not in block_index:
+                    block_index[title] = dict(block, products=[])
+                    blocks.append(block_index[title])
+                block_index[title]["products"].extend(fresh(block.get("products", []), title))
+        elif isinstance(result, dict) and "products" in result:
+            table_headers = table_headers or result.get("table_headers", [])
+            products.extend(fresh(result["products"]))
+        elif result:
+            products.extend(fresh(result))
+
+    if blocks:
+        if products:
+            blocks.append({"block_title": "", "block_image": "", "table_headers": table_headers, "products": products})
+        return {"structured_blocks": True, "blocks": blocks}
+    return {"table_headers": table_headers, "products": products}
+
+def parse_paginated(parse_function):
+    """
+    Разбирает все страницы PAGEN_N раздела: остальные страницы загружаются параллельно
+    и разбираются без браузера тем же парсером (parse_function(paginate=False)).
+    Возвращает объединенный результат или None, если пагинации нет.
+    """
+    global driver
+    if not pagination_config["enabled"] or pagination_config["follow_full_list"]:
+        return None
+    info = detect_pagination()
+    if info is None:
+        return None
+
+    page_param, page_count, current_page = info
+    base_url = driver.current_url
+    other_pages = [number for number in range(1, page_count + 1) if number != current_page]
+    print(f" → Найдена пагинация: {page_count} стр. ({page_param}), загружаем параллельно")
+
+    results = {current_page: parse_function(paginate=False)}
+    # Браузер вызывающего — запасной для страниц, которым нужен JavaScript
+    if isinstance(driver, SnapshotDriver):
+        own_browser, return_url = driver.browser, base_url
+    elif isinstance(driver, ParsedPage):
+        own_browser, return_url = browser_driver, None
+    else:
+        own_browser, return_url = driver, base_url
+    fetched_pages = fetch_pagination_pages([pagination_page_url(base_url, page_param, number) for number in other_pages],
+                                           own_browser, return_url)
+    previous = driver
+    try:
+        for number, fetched in zip(other_pages, fetched_pages):
+            if fetched is None:
+                continue
+            driver = StaticDriver(get_static_driver().session)
+            driver.load(*fetched)
+            results[number] = parse_function(paginate=False)
+    finally:
+        driver = previous
+
+    merged = merge_page_results(results[number] for number in sorted(results))
+    total = sum(len(block["products"]) for block in merged["blocks"]) if "blocks" in merged else len(merged["products"])
+    print(f" → Страниц разобрано: {len(results)}/{page_count}, товаров после объединения: {total}")
+    return merged
+
+def parse_structured_products(paginate=True):
+    """
+    Парсит товары по отдельным блокам, каждый с своей таблицей, заголовками и изображением.
+    Возвращает список блоков товаров. С paginate=True разбираются все страницы PAGEN_N раздела.
+    """
+    
+    # Шаг 1: Страницы PAGEN_N загружаются параллельно, иначе — "Полный список"
+    if paginate:
+        merged = parse_paginated(parse_structured_products)
+        if merged is not None:
+            return merged
+        try:
+            full_list_link = driver.find_element(By.CSS_SELECTOR, "div.module-pagination a.link")
+            href = full_list_link.get_attribute("href")
+            print(f" → Найдена пагинация. Переходим на полный список: {href}")
+            driver.get(href)
+            wait_for_page_ready("table")
+        except:
+            print(" → Ссылка 'Полный список' не найдена. Парсим текущую страницу.")
 
     product_blocks = []
     
     try:
-        # Ищем все основные блоки с товарами по классу razdel table_all
-        main_blocks = driver.find_elements(By.CSS_SELECTOR, "div.razdel.table_all")
-        
-        if not main_blocks:
-            # Пробуем альтернативные селекторы
-            main_blocks = driver.find_elements(By.CSS_SELECTOR, "div.section_info_wrapper")
-            
-        if not main_blocks:
-            # Пробуем ещё один вариант
-            main_blocks = driver.find_elements(By.CSS_SELECTOR, "div.item_block_href")
+        template = page_template_key()
+        # Ищем все основные блоки с товарами: razdel table_all, затем альтернативные селекторы
+        main_blocks = []
+        for selector in ordered_selectors("blocks", SELECTOR_CHAINS["blocks"], template):
+            main_blocks = driver.find_elements(By.CSS_SELECTOR, selector)
+            if main_blocks:
+                record_selector_hit("blocks", selector, template)
+                break
             
         if not main_blocks:
             # Если ничего не найдено, проверяем другие типы контента
             print(" → Не найдены отдельные блоки, проверяем другие типы контента")
+            counts = probe_page_layout()
             
             # Проверяем, является ли это страницей отдельного товара
-            product_detail_indicators = [
-                ".product-detail-gallery__container",
-                ".product-main",
-                ".product-info",
-                "div[class*='product-detail']",
-                "h1[itemprop='name']"
-            ]
-            
-            is_single_product = False
-            for indicator in product_detail_indicators:
-                if driver.find_elements(By.CSS_SELECTOR, indicator):
-                    is_single_product = True
-                    print(f" → Обнаружена страница отдельного товара (индикатор: {indicator})")
-                    break
+            is_single_product = _has_detail_layout(counts) or bool(counts.get("item_name"))
             
             if is_single_product:
+                print(" → Обнаружена страница отдельного товара")
                 # Парсим отдельный товар и возвращаем в формате structured_products
                 single_product_data = parse_single_product_page()
                 if single_product_data:
@@ -1479,16 +3669,14 @@ def parse_structured_products():
                     }
             
             # Проверяем наличие товаров в новой структуре
-            list_items = driver.find_elements(By.CSS_SELECTOR, "div.list_item.item_info.catalog-adaptive")
-            if list_items:
-                print(f" → Найдены товары в новой структуре ({len(list_items)}), используем parse_custom_list")
+            if counts.get("list_item"):
+                print(f" → Найдены товары в новой структуре ({counts['list_item']}), используем parse_custom_list")
                 return parse_custom_list()
             
             # Проверяем наличие старых таблиц
-            table_elements = driver.find_elements(By.CSS_SELECTOR, "tr.main_item_wrapper")
-            if table_elements:
-                print(f" → Найдена таблица товаров ({len(table_elements)} строк), используем parse_table_products")
-                return parse_table_products()
+            if counts.get("table_rows"):
+                print(f" → Найдена таблица товаров ({counts['table_rows']} строк), используем parse_table_products")
+                return parse_table_products(paginate)
             
             print(" → Нет товаров для парсинга")
             return {"products": [], "table_headers": []}
@@ -1514,12 +3702,12 @@ def parse_structured_products():
                     try:
                         prev_element = driver.execute_script("return arguments[0].previousElementSibling;", block)
                         if prev_element:
-                            title_selectors = ["h1", "h2", "h3", ".section_title", "span.font_md", ".title"]
-                            for selector in title_selectors:
+                            for selector in ordered_selectors("block_title_prev", SELECTOR_CHAINS["block_title_prev"], template):
                                 try:
                                     title_elem = prev_element.find_element(By.CSS_SELECTOR, selector)
                                     block_data["block_title"] = title_elem.text.strip()
                                     title_found = True
+                                    record_selector_hit("block_title_prev", selector, template)
                                     break
                                 except:
                                     continue
@@ -1528,18 +3716,12 @@ def parse_structured_products():
                     
                     # Если не найден в предыдущем элементе, ищем в самом блоке
                     if not title_found:
-                        title_selectors = [
-                            "h1", "h2", "h3", "h4", "h5",
-                            ".section_title",
-                            "span.font_md",
-                            ".title",
-                            ".item_name"
-                        ]
-                        for selector in title_selectors:
+                        for selector in ordered_selectors("block_title", SELECTOR_CHAINS["block_title"], template):
                             try:
                                 title_elem = block.find_element(By.CSS_SELECTOR, selector)
                                 block_data["block_title"] = title_elem.text.strip()
                                 title_found = True
+                                record_selector_hit("block_title", selector, template)
                                 break
                             except:
                                 continue
@@ -1554,68 +3736,33 @@ def parse_structured_products():
                 try:
                     image_found = False
                     
-                    # Сначала ищем изображение в самом блоке (внутри section_img)
-                    try:
-                        # Ищем ссылку с классом fancy popup_link внутри section_img
-                        image_link = block.find_element(By.CSS_SELECTOR, "div.section_img a.fancy.popup_link")
-                        image_url = image_link.get_attribute('href')
-                        if image_url:
-                            if not image_url.startswith('http'):
-                                if image_url.startswith('//'):
-                                    image_url = 'https:' + image_url
-                                elif image_url.startswith('/'):
-                                    image_url = 'https://cnc1.ru' + image_url
-                            block_data["block_image"] = image_url
-                            image_found = True
-                            print(f"   → Найдено изображение блока: {image_url}")
-                    except:
-                        pass
-                    
-                    # Если не найдена ссылка, пробуем альтернативные селекторы для ссылок
-                    if not image_found:
-                        link_selectors = [
-                            ".section_img a.fancy.popup_link",
-                            ".section_img a[href*='.jpg']",
-                            ".section_img a[href*='.png']",
-                            ".section_img a[href*='.gif']",
-                            "a.fancy.popup_link"
-                        ]
-                        for selector in link_selectors:
-                            try:
-                                image_link = block.find_element(By.CSS_SELECTOR, selector)
-                                image_url = image_link.get_attribute('href')
-                                if image_url:
-                                    if not image_url.startswith('http'):
-                                        if image_url.startswith('//'):
-                                            image_url = 'https:' + image_url
-                                        elif image_url.startswith('/'):
-                                            image_url = 'https://cnc1.ru' + image_url
-                                    block_data["block_image"] = image_url
-                                    image_found = True
-                                    print(f"   → Найдено изображение блока: {image_url}")
-                                    break
-                            except:
-                                continue
+                    # Сначала ищем ссылку на изображение (fancy popup_link внутри section_img и альтернативы)
+                    for selector in ordered_selectors("block_image_link", SELECTOR_CHAINS["block_image_link"], template):
+                        try:
+                            image_link = block.find_element(By.CSS_SELECTOR, selector)
+                            image_url = image_link.get_attribute('href')
+                            if image_url:
+                                image_url = _absolute_image_url(image_url)
+                                block_data["block_image"] = image_url
+                                image_found = True
+                                print(f"   → Найдено изображение блока: {image_url}")
+                                record_selector_hit("block_image_link", selector, template)
+                                break
+                        except:
+                            continue
                     
                     # Если не найдены ссылки, пробуем искать обычные img теги как fallback
                     if not image_found:
-                        image_selectors = [
-                            "div.section_img img",
-                            ".section_img img",
-                            "img"
-                        ]
-                        for selector in image_selectors:
+                        for selector in ordered_selectors("block_img", SELECTOR_CHAINS["block_img"], template):
                             try:
                                 image_elem = block.find_element(By.CSS_SELECTOR, selector)
                                 image_url = image_elem.get_attribute('src')
-                                if image_url and not image_url.startswith('http'):
-                                    if image_url.startswith('//'):
-                                        image_url = 'https:' + image_url
-                                    elif image_url.startswith('/'):
-                                        image_url = 'https://cnc1.ru' + image_url
+                                if image_url:
+                                    image_url = _absolute_image_url(image_url)
                                 block_data["block_image"] = image_url
                                 image_found = True
                                 print(f"   → Найдено изображение блока (img): {image_url}")
+                                record_selector_hit("block_img", selector, template)
                                 break
                             except:
                                 continue
@@ -1626,347 +3773,1046 @@ def parse_structured_products():
                 except Exception as e:
                     print(f"   → Ошибка при поиске изображения блока: {e}")
                 
-                # Извлекаем заголовки таблицы этого блока
-                try:
-                    table_elem = block.find_element(By.CSS_SELECTOR, "table")
-                    header_cells = table_elem.find_elements(By.CSS_SELECTOR, "th")
-                    
-                    for cell in header_cells:
-                        header_text = driver.execute_script("return arguments[0].textContent;", cell).strip()
-                        if header_text and header_text not in block_data["table_headers"]:
-                            block_data["table_headers"].append(header_text)
-                except:
-                    # Если таблица не найдена в блоке, используем общие заголовки
-                    block_data["table_headers"] = ["Артикул", "Система ЧПУ", "Характеристики", "Цена"]
+                # Заголовки и строки таблицы этого блока (в браузере — одним вызовом)
+                table = read_table(block)
+                # Если таблица не найдена в блоке, используем общие заголовки
+                block_data["table_headers"] = table["headers"] if table["headers"] is not None else list(DEFAULT_BLOCK_HEADERS)
                 
                 # Парсим товары в этом блоке
-                try:
-                    rows = block.find_elements(By.CSS_SELECTOR, "tr.main_item_wrapper")
+                for article, url, name, cells, _, _ in table["rows"]:
+                    # Параметры (соответствуют заголовкам таблицы этого блока)
+                    props = _table_row_props(cells, block_data["table_headers"])
+
+                    # Добавляем товар
+                    product_data = {
+                        "name": name if name is not None else "Название не найдено",
+                        "url": url,
+                        "article": article if article is not None else "Не указан",
+                        **props
+                    }
+                    block_data["products"].append(product_data)
+                
+                if block_data["products"] or block_data["block_title"]:
+                    product_blocks.append(block_data)
+                    print(f" → Блок {i+1}: '{block_data['block_title']}' - {len(block_data['products'])} товаров")
                     
-                    for row in rows:
+                    # Показываем детальную информацию о блоке
+                    if block_data.get("block_image"):
+                        print(f"   ├── Изображение: {block_data['block_image']}")
+                    else:
+                        print(f"   ├── Изображение: не найдено")
+                    
+                    if block_data.get("table_headers"):
+                        headers_str = ", ".join(block_data["table_headers"][:5])  # Показываем первые 5 заголовков
+                        if len(block_data["table_headers"]) > 5:
+                            headers_str += f" и ещё {len(block_data['table_headers']) - 5}"
+                        print(f"   ├── Заголовки таблицы ({len(block_data['table_headers'])}): {headers_str}")
+                    else:
+                        print(f"   ├── Заголовки таблицы: не найдены")
+                    
+                    if block_data["products"]:
+                        print(f"   └── Товары:")
+                        for j, product in enumerate(block_data["products"][:3]):  # Показываем первые 3 товара
+                            article = product.get("article", "—")
+                            name = product.get("name", "Без названия")
+                            print(f"       {j+1}. {name} (арт: {article})")
+                        if len(block_data["products"]) > 3:
+                            print(f"       ... и ещё {len(block_data['products']) - 3} товаров")
+                    else:
+                        print(f"   └── Товары: не найдены")
+                
+            except Exception as e:
+                print(f" → Ошибка при обработке блока {i+1}: {e}")
+                continue
+    
+    except Exception as e:
+        print(f" → Ошибка при поиске блоков товаров: {e}")
+        return parse_table_products(paginate)
+    
+    if not product_blocks:
+        print(" → Блоки не найдены, используем общий парсинг")
+        return parse_table_products(paginate)
+    
+    return {
+        "structured_blocks": True,
+        "blocks": product_blocks
+    }
+
+def parse_table_products(paginate=True):
+    """
+    Парсит товары из таблицы.
+    Страницы PAGEN_N разбираются параллельно; если их нет, но есть ссылка 'Полный список' — переходит туда.
+    Возвращает словарь с заголовками таблицы и списком товаров
+    """
+    products = []
+
+    # Шаг 1: Страницы PAGEN_N загружаются параллельно, иначе — "Полный список"
+    if paginate:
+        merged = parse_paginated(parse_table_products)
+        if merged is not None:
+            return merged
+        try:
+            full_list_link = driver.find_element(By.CSS_SELECTOR, "div.module-pagination a.link")
+            href = full_list_link.get_attribute("href")
+            print(f" → Найдена пагинация. Переходим на полный список: {href}")
+            driver.get(href)
+            wait_for_page_ready("table")
+        except:
+            print(" → Ссылка 'Полный список' не найдена. Парсим текущую страницу.")
+
+    # Шаг 1.5: Получаем заголовки таблицы и строки (в браузере — одним вызовом)
+    table = read_table(image_selectors=SELECTOR_CHAINS["table_row_image"])
+    table_headers = table["headers"]
+    print(f" → Найдено строк с товарами: {len(table['rows'])}")
+
+    # Шаг 2: Парсим товары (в любом случае — с полной страницы или текущей)
+    for article, url, name, cells, image_url, image_found in table["rows"]:
+        try:
+            # Изображение товара
+            if image_found:
+                # Если src относительный, делаем его абсолютным
+                if image_url:
+                    image_url = _absolute_image_url(image_url)
+            else:
+                print("   → Изображение не найдено")
+
+            # Артикул и ссылка
+            if article is None:
+                article = "Не указан"
+
+            # Название
+            if name is None:
+                name = "Название не найдено"
+
+            # Параметры (соответствуют заголовкам таблицы)
+            props = _table_row_props(cells, table_headers)
+
+            # Добавляем товар с изображением
+            product_data = {
+                "name": name,
+                "url": url,
+                "article": article,
+                "image_url": image_url,
+                **props
+            }
+            
+            # Логируем найденную информацию о товаре
+            print(f"     → Товар: {name}")
+            if image_url:
+                print(f"       ├── Изображение: ✅")
+            else:
+                print(f"       ├── Изображение: ❌")
+            if article and article != "Не указан":
+                print(f"       ├── Артикул: {article}")
+            if url:
+                print(f"       └── Ссылка: ✅")
+                
+            products.append(product_data)
+
+        except Exception as e:
+            print(f" → Пропущен товар: {e}")
+            continue
+
+    print(f" → Найдено товаров: {len(products)}")
+    
+    # Возвращаем словарь с заголовками и товарами
+    return {
+        "table_headers": table_headers,
+        "products": products
+    }
+
+def parse_grandchildren():
+    """
+    Парсит под-подкатегории (внуки), если нет таблицы товаров.
+    Собирает ссылки a.item_block_href по плану grandchildren из extraction_schema.json
+    """
+    try:
+        # Список строгий: ссылка без названия означает, что это не блок под-подкатегорий
+        result = run_extraction_plan("grandchildren")
+        if result["invalid"]:
+            print(f" Нет под-подкатегорий или ошибка: у {result['invalid']} ссылок нет span.font_md")
+            return []
+
+        grandchildren = []
+        for record in result["records"]:
+            product_name = record["name"]
+            product_url = record["url"]
+
+            if product_name and product_url:
+                grandchildren.append({
+                    "name": product_name,
+                    "url": product_url
+                })
+
+        print(f" Найдено под-подкатегорий: {len(grandchildren)}")
+        return grandchildren
+
+    except Exception as e:
+        print(f" Нет под-подкатегорий или ошибка: {e}")
+        return []
+
+def parse_sub_subcategories():
+    """
+    Парсит под-под-подкатегории (4-й уровень вложенности)
+    Ищет ссылки в catalog_section_list count_section_list_6 row items margin0 flexbox type_sections_4
+    """
+    try:
+        template = page_template_key()
+        sub_subcategories = []
+        
+        for selector in ordered_selectors("sub_sections", SELECTOR_CHAINS["sub_sections"], template):
+            try:
+                links = driver.find_elements(By.CSS_SELECTOR, selector)
+                if links:
+                    print(f"🔍 Найдены под-под-подкатегории с селектором: {selector}")
+                    
+                    for link in links:
                         try:
-                            # Артикул и ссылка
-                            try:
-                                article_link = row.find_element(By.CSS_SELECTOR, "a.dark_link.js-notice-block__title")
-                                article = article_link.find_element(By.TAG_NAME, "span").text.strip()
-                                url = article_link.get_attribute('href')
-                            except:
-                                article = "Не указан"
-                                url = None
+                            # Пытаемся извлечь название
+                            name = None
+                            for name_sel in ordered_selectors("sub_section_name", SELECTOR_CHAINS["sub_section_name"], template):
+                                try:
+                                    name_elem = link.find_element(By.CSS_SELECTOR, name_sel)
+                                    name = name_elem.text.strip()
+                                    if name:
+                                        record_selector_hit("sub_section_name", name_sel, template)
+                                        break
+                                except:
+                                    continue
+                            
+                            # Если название не найдено, берем текст ссылки
+                            if not name:
+                                name = link.text.strip()
+                            
+                            url = link.get_attribute('href')
+                            
+                            if name and url and '/catalog/' in url:
+                                sub_subcategories.append({
+                                    "name": name,
+                                    "url": url
+                                })
+                                
+                        except Exception as e:
+                            continue
+                    
+                    if sub_subcategories:
+                        record_selector_hit("sub_sections", selector, template)
+                        break
+                        
+            except Exception as e:
+                continue
+        
+        # Удаляем дубликаты
+        unique_subs = []
+        seen_urls = set()
+        for sub in sub_subcategories:
+            if sub['url'] not in seen_urls:
+                unique_subs.append(sub)
+                seen_urls.add(sub['url'])
+        
+        print(f"🎯 Найдено уникальных под-под-подкатегорий: {len(unique_subs)}")
+        return unique_subs
+
+    except Exception as e:
+        print(f"❌ Ошибка парсинга под-под-подкатегорий: {e}")
+        return []
+
+def add_to_category_collector(category_name, subcategory_path, product_data, block_info=None):
+    """
+    Добавляет данные в структурированный накопитель по категориям
+    
+    Args:
+        category_name: Название основной категории
+        subcategory_path: Путь подкатегорий (список или строка)
+        product_data: Данные товара/товаров
+        block_info: Информация о блоке (заголовок, изображение, заголовки таблицы)
+    """
+    global category_data_collector
+    
+    if category_name not in category_data_collector:
+        category_data_collector[category_name] = {
+            "products": create_category_store(),
+            "subcategories": {},
+            "blocks": [],
+            "statistics": {
+                "total_products": 0,
+                "total_subcategories": 0,
+                "total_blocks": 0
+            }
+        }
+    
+    # Преобразуем путь подкатегорий в строку
+    if isinstance(subcategory_path, list):
+        subcategory_key = " → ".join(subcategory_path)
+    else:
+        subcategory_key = str(subcategory_path)
+    
+    timestamp = datetime.now().isoformat()
+    
+    # Если это блок товаров (structured_blocks)
+    if block_info and isinstance(product_data, list):
+        block_data = ProductBlock(block_info, subcategory_key, timestamp)
+        
+        for product in product_data:
+            record = Product(product, category_name, subcategory_key, block_data, timestamp, "table_product")
+            category_data_collector[category_name]["products"].append(record.category_row())
+            block_data.product_count += 1
+        
+        category_data_collector[category_name]["blocks"].append(block_data)
+        category_data_collector[category_name]["statistics"]["total_blocks"] += 1
+        
+    # Если это обычные товары
+    elif isinstance(product_data, list):
+        for product in product_data:
+            category_data_collector[category_name]["products"].append(
+                Product(product, category_name, subcategory_key, None, timestamp, "regular_product").category_row())
+    
+    # Обновляем статистику
+    if subcategory_key not in category_data_collector[category_name]["subcategories"]:
+        category_data_collector[category_name]["subcategories"][subcategory_key] = 0
+        category_data_collector[category_name]["statistics"]["total_subcategories"] += 1
+    
+    products_count = len(product_data) if isinstance(product_data, list) else 1
+    category_data_collector[category_name]["subcategories"][subcategory_key] += products_count
+    category_data_collector[category_name]["statistics"]["total_products"] += products_count
+
+def save_category_based_excel():
+    """
+    Сохраняет данные в Excel файл с отдельными листами для каждой категории
+    """
+    global category_data_collector
+    
+    if not category_data_collector:
+        print("❌ Нет данных для сохранения")
+        return None
+    
+    try:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"parsed_data_by_categories_{timestamp}.xlsx"
+        filepath = os.path.join("results", filename)
+        
+        # Создаем директорию если её нет
+        os.makedirs("results", exist_ok=True)
+        
+        print(f"📊 Создание Excel файла по категориям: {filename}")
+        print(f"   → Категорий: {len(category_data_collector)}")
+        
+        # Создаем Excel книгу
+        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+            
+            # Создаем сводный лист
+            summary_data = []
+            total_products = 0
+            total_blocks = 0
+            
+            for cat_name, cat_data in category_data_collector.items():
+                stats = cat_data["statistics"]
+                total_products += stats["total_products"]
+                total_blocks += stats["total_blocks"]
+                
+                summary_data.append({
+                    "Категория": cat_name,
+                    "Всего товаров": stats["total_products"],
+                    "Подкатегорий": stats["total_subcategories"],
+                    "Блоков товаров": stats["total_blocks"],
+                    "Подкатегории": ", ".join(list(cat_data["subcategories"].keys())[:3]) + 
+                                  (f" и ещё {len(cat_data['subcategories']) - 3}" if len(cat_data["subcategories"]) > 3 else "")
+                })
+            
+            summary_df = pd.DataFrame(summary_data)
+            summary_df.to_excel(writer, sheet_name="📊 Сводка", index=False)
+            print(f"   ✓ Создан сводный лист ({len(summary_data)} категорий)")
+            
+            # Создаем лист для каждой категории
+            for cat_name, cat_data in category_data_collector.items():
+                if not cat_data["products"]:
+                    continue
+                
+                # Создаем DataFrame из товаров категории
+                df = cat_data["products"].to_frame()
+                
+                # Переупорядочиваем колонки: основные поля в начале
+                basic_columns = ["name", "article", "url", "image_url", "subcategory_path", "block_title", "block_image"]
+                other_columns = [col for col in df.columns if col not in basic_columns + ["category", "timestamp"]]
+                ordered_columns = [col for col in basic_columns if col in df.columns] + other_columns
+                
+                # Добавляем категорию и timestamp в конец
+                if "category" in df.columns:
+                    ordered_columns.append("category")
+                if "timestamp" in df.columns:
+                    ordered_columns.append("timestamp")
+                
+                df = df[ordered_columns]
+                
+                # Переименовываем колонки для удобства
+                column_mapping = {
+                    "name": "Название товара",
+                    "article": "Артикул",
+                    "url": "Ссылка",
+                    "image_url": "Изображение",
+                    "subcategory_path": "Путь подкатегорий",
+                    "block_title": "Название блока",
+                    "block_image": "Изображение блока",
+                    "category": "Категория",
+                    "timestamp": "Время парсинга"
+                }
+                
+                df = df.rename(columns=column_mapping)
+                
+                # Формируем название листа (ограничиваем 31 символом)
+                sheet_name = cat_name[:27] + "..." if len(cat_name) > 27 else cat_name
+                
+                # Убираем недопустимые символы из имени листа
+                invalid_chars = ['\\', '/', '*', '[', ']', ':', '?']
+                for char in invalid_chars:
+                    sheet_name = sheet_name.replace(char, '_')
+                
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                print(f"   ✓ Создан лист '{sheet_name}' ({len(df)} товаров)")
+            
+            # Создаем лист с блоками товаров (если есть)
+            all_blocks = []
+            for cat_name, cat_data in category_data_collector.items():
+                for block in cat_data["blocks"]:
+                    block_summary = {
+                        "Категория": cat_name,
+                        "Путь подкатегорий": block.path,
+                        "Название блока": block.title,
+                        "Изображение блока": block.image,
+                        "Заголовки таблицы": ", ".join(block.table_headers),
+                        "Количество товаров": block.product_count,
+                        "Время парсинга": block.timestamp
+                    }
+                    all_blocks.append(block_summary)
+            
+            if all_blocks:
+                blocks_df = pd.DataFrame(all_blocks)
+                blocks_df.to_excel(writer, sheet_name="🗂️ Блоки товаров", index=False)
+                print(f"   ✓ Создан лист 'Блоки товаров' ({len(all_blocks)} блоков)")
+        
+        print(f"🎉 Excel файл успешно создан: {filepath}")
+        print(f"📁 Размер файла: {os.path.getsize(filepath) / 1024 / 1024:.2f} МБ")
+        print(f"📊 Итого: {total_products} товаров в {total_blocks} блоках")
+        
+        return filepath
+        
+    except Exception as e:
+        print(f"❌ Ошибка создания Excel файла: {e}")
+        return None
+
+def clear_category_collector():
+    """Очищает накопитель данных по категориям"""
+    global category_data_collector
+    category_data_collector = {}
+
+# === AJAX-эндпоинты каталога ===
+
+ajax_config = {
+    "capture": False,  # Писать сетевой журнал Chrome (включается режимом обнаружения)
+    "use_endpoints": True,  # Загружать разделы с известным эндпоинтом без перехода на страницу
+    "file": "ajax_endpoints.json",
+    "patterns": ["ajax", "bxajaxid", "PAGEN_"],  # Признаки запросов каталога Bitrix
+    "more_buttons": [".ajax_load_btn", ".more_text_ajax"],  # Кнопки «Показать еще»
+    "settle": 5,  # Сколько секунд ждать ответа после нажатия кнопки
+    "max_pages": 100
+}
+
+ajax_endpoints = {}  # {адрес раздела без параметров: описание эндпоинта}
+
+def _section_key(url):
+    """Адрес раздела без параметров запроса и якоря"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+def _looks_like_catalog_ajax(url, post_data=None):
+    text = f"{url} {post_data or ''}".lower()
+    return any(pattern.lower() in text for pattern in ajax_config["patterns"])
+
+def load_ajax_endpoints():
+    """Загружает реестр эндпоинтов, найденных в прошлых запусках"""
+    global ajax_endpoints
+    try:
+        with open(ajax_config["file"], encoding="utf-8") as f:
+            ajax_endpoints = json.load(f)
+        print(f"📡 Загружено AJAX-эндпоинтов: {len(ajax_endpoints)}")
+    except FileNotFoundError:
+        ajax_endpoints = {}
+    except Exception as e:
+        print(f"⚠️ Не удалось загрузить AJAX-эндпоинты: {e}")
+        ajax_endpoints = {}
+
+def save_ajax_endpoints():
+    """Сохраняет реестр эндпоинтов"""
+    try:
+        with open(ajax_config["file"], "w", encoding="utf-8") as f:
+            json.dump(ajax_endpoints, f, ensure_ascii=False, indent=1)
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить AJAX-эндпоинты: {e}")
+
+def ajax_endpoint_from_request(request):
+    """Описание эндпоинта по перехваченному запросу; номер страницы PAGEN_N заменяется шаблоном {page}"""
+    parsed = urlparse(request["url"])
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    page_param = next((name for name, _ in query if re.fullmatch(r"PAGEN_\d+", name)), None)
+    if page_param:
+        query = [(name, "{page}" if name == page_param else value) for name, value in query]
+    return {
+        "url": urlunparse(parsed._replace(query=urlencode(query, safe="{}"))),
+        "page_param": page_param,
+        "method": request["method"],
+        "post_data": request["post_data"],
+        "seen": datetime.now().isoformat()
+    }
+
+def read_catalog_requests(target, requests_by_id):
+    """
+    Дочитывает сетевой журнал Chrome (goog:loggingPrefs performance; журнал отдается
+    порциями и очищается при чтении) в requests_by_id и возвращает завершенные запросы
+    каталога к тому же хосту с ответом HTML или JSON.
+    """
+    try:
+        entries = target.get_log("performance")
+    except Exception as e:
+        print(f"⚠️ Сетевой журнал недоступен: {e}")
+        return []
 
-                            # Название
-                            try:
-                                name_elem = row.find_element(By.CSS_SELECTOR, "span.font_md")
-                                name = name_elem.text.strip()
-                            except:
-                                name = "Название не найдено"
-
-                            # Параметры (соответствуют заголовкам таблицы этого блока)
-                            props = {}
-                            props_cells = row.find_elements(By.CSS_SELECTOR, "td.table-view__item-wrapper-prop")
-                            for j, cell in enumerate(props_cells):
-                                cell_text = cell.text.strip()
-                                if j < len(block_data["table_headers"]) - 2:
-                                    header_name = block_data["table_headers"][j + 2] if j + 2 < len(block_data["table_headers"]) else f"param_{j+1}"
-                                    props[header_name] = cell_text
-                                else:
-                                    props[f"param_{j+1}"] = cell_text
-
-                            # Добавляем товар
-                            product_data = {
-                                "name": name,
-                                "url": url,
-                                "article": article,
-                                **props
-                            }
-                            block_data["products"].append(product_data)
+    for entry in entries:
+        message = json.loads(entry["message"]).get("message", {})
+        params = message.get("params", {})
+        if message.get("method") == "Network.requestWillBeSent":
+            request = params["request"]
+            if params.get("type") in ("XHR", "Fetch") and _looks_like_catalog_ajax(request["url"], request.get("postData")):
+                requests_by_id[params["requestId"]] = {
+                    "url": request["url"],
+                    "method": request["method"],
+                    "post_data": request.get("postData"),
+                    "document": params.get("documentURL") or target.current_url
+                }
+        elif message.get("method") == "Network.responseReceived" and params.get("requestId") in requests_by_id:
+            response = params["response"]
+            requests_by_id[params["requestId"]].update(status=response.get("status"), mime=response.get("mimeType", ""))
 
-                        except Exception as e:
-                            print(f" → Пропущен товар в блоке {i+1}: {e}")
-                            continue
-                            
-                except:
-                    print(f" → Не найдены товары в блоке {i+1}")
-                
-                if block_data["products"] or block_data["block_title"]:
-                    product_blocks.append(block_data)
-                    print(f" → Блок {i+1}: '{block_data['block_title']}' - {len(block_data['products'])} товаров")
-                    
-                    # Показываем детальную информацию о блоке
-                    if block_data.get("block_image"):
-                        print(f"   ├── Изображение: {block_data['block_image']}")
-                    else:
-                        print(f"   ├── Изображение: не найдено")
-                    
-                    if block_data.get("table_headers"):
-                        headers_str = ", ".join(block_data["table_headers"][:5])  # Показываем первые 5 заголовков
-                        if len(block_data["table_headers"]) > 5:
-                            headers_str += f" и ещё {len(block_data['table_headers']) - 5}"
-                        print(f"   ├── Заголовки таблицы ({len(block_data['table_headers'])}): {headers_str}")
-                    else:
-                        print(f"   ├── Заголовки таблицы: не найдены")
-                    
-                    if block_data["products"]:
-                        print(f"   └── Товары:")
-                        for j, product in enumerate(block_data["products"][:3]):  # Показываем первые 3 товара
-                            article = product.get("article", "—")
-                            name = product.get("name", "Без названия")
-                            print(f"       {j+1}. {name} (арт: {article})")
-                        if len(block_data["products"]) > 3:
-                            print(f"       ... и ещё {len(block_data['products']) - 3} товаров")
-                    else:
-                        print(f"   └── Товары: не найдены")
-                
+    return [
+        request for request in requests_by_id.values()
+        if request.get("status") == 200
+        and any(kind in request.get("mime", "") for kind in ("html", "json"))
+        and urlparse(request["url"]).netloc == urlparse(request["document"]).netloc
+    ]
+
+def _item_links(page):
+    """Ссылки товаров списка на странице (первая ссылка каждого элемента custom_list)"""
+    for selector in EXTRACTION_PLAN["custom_list"]["items"]:
+        items = page.find_elements(By.CSS_SELECTOR, selector)
+        if items:
+            return {tuple(a.get_attribute("href") for a in item.find_elements(By.CSS_SELECTOR, "a[href]")[:1]) for item in items}
+    return set()
+
+def discover_section_endpoints(url):
+    """
+    Открывает раздел в браузере, нажимает «Показать еще» и регистрирует эндпоинт,
+    который вызвал именно этот клик. Запросы загрузки страницы (корзина, просмотренные,
+    рекомендации) отбрасываются, а первая страница эндпоинта должна совпасть с товарами
+    раздела. Возвращает 1, если эндпоинт зарегистрирован, иначе 0.
+    """
+    if not safe_get_page(url, allow_static=False):
+        return 0
+    read_catalog_requests(browser_driver, {})  # Запросы загрузки страницы в реестр не попадают
+
+    section_page = StaticDriver(get_static_driver().session)
+    section_page.load(browser_driver.current_url, browser_driver.page_source)
+    section_links = _item_links(section_page)
+    if not section_links:
+        return 0
+
+    clicked = {}
+    for selector in ajax_config["more_buttons"]:
+        buttons = browser_driver.find_elements(By.CSS_SELECTOR, selector)
+        if not buttons:
+            continue
+        found_before = len(read_catalog_requests(browser_driver, clicked))
+        browser_driver.execute_script("arguments[0].click();", buttons[0])
+        candidates = []
+        deadline = time.time() + ajax_config["settle"]
+        while time.time() < deadline:
+            time.sleep(readiness_config["poll_interval"])
+            candidates = read_catalog_requests(browser_driver, clicked)
+            if len(candidates) > found_before:
+                break
+        # Сначала запросы с номером страницы PAGEN_N
+        for request in sorted(candidates, key=lambda request: not re.search(r"PAGEN_\d+=", request["url"])):
+            endpoint = ajax_endpoint_from_request(request)
+            try:
+                first_page = _fetch_ajax_page(url, endpoint, 1)
             except Exception as e:
-                print(f" → Ошибка при обработке блока {i+1}: {e}")
+                print(f"   ⚠️ Проверка эндпоинта {endpoint['url']} не удалась: {e}")
                 continue
-    
-    except Exception as e:
-        print(f" → Ошибка при поиске блоков товаров: {e}")
-        return parse_table_products()
-    
-    if not product_blocks:
-        print(" → Блоки не найдены, используем общий парсинг")
-        return parse_table_products()
-    
-    return {
-        "structured_blocks": True,
-        "blocks": product_blocks
-    }
+            if first_page is not None and _item_links(first_page) & section_links:
+                ajax_endpoints[_section_key(url)] = endpoint
+                return 1
+        break
+    return 0
+
+def _ajax_payload_html(response):
+    """HTML из ответа эндпоинта: сам текст или первая HTML-строка внутри JSON"""
+    if "json" not in response.headers.get("Content-Type", ""):
+        return response.text
+    stack = [response.json()]
+    while stack:
+        item = stack.pop(0)
+        if isinstance(item, str) and "<" in item:
+            return item
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return ""
+
+def _fetch_ajax_page(url, endpoint, page_number, session=None):
+    """Вызывает эндпоинт для страницы page_number; ответ разбирается как страница раздела url"""
+    session = session or get_static_driver().session
+    headers = {"X-Requested-With": "XMLHttpRequest", "Referer": url}
+    request_url = endpoint["url"].replace("{page}", str(page_number))
+    if endpoint["method"] == "POST":
+        response = session.post(request_url, data=endpoint["post_data"], headers=headers, timeout=fetch_config["timeout"])
+    else:
+        response = session.get(request_url, headers=headers, timeout=fetch_config["timeout"])
+    if response.status_code != 200:
+        return None
+    page = StaticDriver(session)
+    page.load(url, _ajax_payload_html(response), response.status_code)
+    return page
 
-def parse_table_products():
+def fetch_ajax_section(url, session=None):
     """
-    Парсит товары из таблицы.
-    Если есть ссылка 'Полный список' — переходит туда.
-    Возвращает словарь с заголовками таблицы и списком товаров
+    Загружает раздел напрямую через его AJAX-эндпоинт, страница за страницей, пока
+    появляются новые товары. Возвращает [(url, html, код ответа)] или None, если эндпоинта нет.
     """
-    products = []
+    endpoint = ajax_endpoints.get(_section_key(url))
+    if not ajax_config["use_endpoints"] or endpoint is None or not http_engine_available():
+        return None
 
-    # Шаг 1: Проверяем, есть ли "Полный список"
-    try:
-        full_list_link = driver.find_element(By.CSS_SELECTOR, "div.module-pagination a.link")
-        href = full_list_link.get_attribute("href")
-        print(f" → Найдена пагинация. Переходим на полный список: {href}")
-        driver.get(href)
-        time.sleep(1.5)  # Ждём загрузки
-    except:
-        print(" → Ссылка 'Полный список' не найдена. Парсим текущую страницу.")
+    pages, seen = [], set()
+    for page_number in range(1, ajax_config["max_pages"] + 1 if endpoint["page_param"] else 2):
+        page = _fetch_ajax_page(url, endpoint, page_number, session)
+        if page is None:
+            break
+        links = _item_links(page)
+        if not links or links <= seen:
+            break  # Страницы закончились: эндпоинт повторяет последнюю или отдает пустой список
+        seen |= links
+        pages.append((url, page.page_source, page.status_code))
+    return pages or None
 
-    # Шаг 1.5: Получаем заголовки таблицы
-    table_headers = get_table_headers()
+def parse_ajax_pages(pages):
+    """Разбирает ответы эндпоинта как custom_list и объединяет товары без повторов по ссылке"""
+    global driver
+    previous = driver
+    products, seen = [], set()
+    try:
+        for page_url, html, status in pages:
+            driver = StaticDriver(get_static_driver().session)
+            driver.load(page_url, html, status)
+            for product in parse_custom_list("custom_list"):
+                key = product["url"] or product["name"]
+                if key not in seen:
+                    seen.add(key)
+                    products.append(product)
+    finally:
+        driver = previous
+    return products
 
-    # Шаг 2: Парсим товары (в любом случае — с полной страницы или текущей)
+def parse_section_via_ajax(url):
+    """Товары раздела через AJAX-эндпоинт без загрузки страницы или None, если эндпоинта нет"""
     try:
-        rows = driver.find_elements(By.CSS_SELECTOR, "tr.main_item_wrapper")
-        print(f" → Найдено строк с товарами: {len(rows)}")
+        pages = fetch_ajax_section(url)
     except Exception as e:
-        print(f" → Ошибка при поиске строк товаров: {e}")
-        rows = []
+        print(f"   ⚠️ AJAX-эндпоинт раздела не ответил ({e}), открываем страницу")
+        return None
+    if not pages:
+        return None
+    print(f"   📡 Раздел загружен через AJAX-эндпоинт: {len(pages)} стр.")
+    return parse_ajax_pages(pages) or None
 
-    for row in rows:
-        try:
-            # Изображение товара
-            image_url = None
-            try:
-                # Пробуем разные варианты селекторов для изображений
-                image_selectors = [
-                    "div.section_img img",
-                    ".section_img img", 
-                    "img.preview_picture",
-                    ".preview_picture",
-                    "td img",
-                    "img"
-                ]
-                
-                image_elem = None
-                for selector in image_selectors:
-                    try:
-                        image_elem = row.find_element(By.CSS_SELECTOR, selector)
-                        if image_elem:
-                            break
-                    except:
-                        continue
-                
-                if image_elem:
-                    image_url = image_elem.get_attribute('src')
-                    # Если src относительный, делаем его абсолютным
-                    if image_url and not image_url.startswith('http'):
-                        if image_url.startswith('//'):
-                            image_url = 'https:' + image_url
-                        elif image_url.startswith('/'):
-                            image_url = 'https://cnc1.ru' + image_url
-                else:
-                    print("   → Изображение не найдено")
-            except Exception as e:
-                print(f"   → Ошибка при поиске изображения: {e}")
+load_ajax_endpoints()
 
-            # Артикул и ссылка
-            try:
-                article_link = row.find_element(By.CSS_SELECTOR, "a.dark_link.js-notice-block__title")
-                article = article_link.find_element(By.TAG_NAME, "span").text.strip()
-                url = article_link.get_attribute('href')
-            except:
-                article = "Не указан"
-                url = None
+# === Карта сайта (sitemap.xml) ===
 
-            # Название
-            try:
-                name_elem = row.find_element(By.CSS_SELECTOR, "span.font_md")
-                name = name_elem.text.strip()
-            except:
-                name = "Название не найдено"
+sitemap_config = {
+    "catalog_prefix": "/catalog/",  # Учитываются только адреса каталога
+    "fallback_paths": ["/sitemap.xml", "/sitemap_index.xml"],  # Если robots.txt не указывает карту
+    "max_sitemaps": 500,
+    "section_sitemap_pattern": r"section",  # Карты разделов (Битрикс: sitemap-iblock-N.section.xml и т.п.)
+    "file": "sitemap_urls.json"  # Найденные разделы и товары с lastmod (в папке results/)
+}
 
-            # Параметры (соответствуют заголовкам таблицы)
-            props = {}
-            props_cells = row.find_elements(By.CSS_SELECTOR, "td.table-view__item-wrapper-prop")
-            for i, cell in enumerate(props_cells):
-                cell_text = cell.text.strip()
-                if i < len(table_headers) - 2:  # -2 потому что первые 2 колонки это артикул и название
-                    header_name = table_headers[i + 2] if i + 2 < len(table_headers) else f"param_{i+1}"
-                    props[header_name] = cell_text
-                else:
-                    props[f"param_{i+1}"] = cell_text
+_SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
 
-            # Добавляем товар с изображением
-            product_data = {
-                "name": name,
-                "url": url,
-                "article": article,
-                "image_url": image_url,
-                **props
-            }
-            
-            # Логируем найденную информацию о товаре
-            print(f"     → Товар: {name}")
-            if image_url:
-                print(f"       ├── Изображение: ✅")
-            else:
-                print(f"       ├── Изображение: ❌")
-            if article and article != "Не указан":
-                print(f"       ├── Артикул: {article}")
-            if url:
-                print(f"       └── Ссылка: ✅")
-                
-            products.append(product_data)
+def sitemap_locations(base_url, session):
+    """Адреса карт сайта из robots.txt (директивы Sitemap:) или стандартные пути"""
+    root = f"{urlparse(base_url).scheme}://{urlparse(base_url).netloc}"
+    locations = []
+    try:
+        response = session.get(f"{root}/robots.txt", timeout=fetch_config["timeout"])
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                if line.lower().startswith("sitemap:"):
+                    locations.append(line.split(":", 1)[1].strip())
+    except Exception as e:
+        print(f"⚠️ robots.txt недоступен: {e}")
+    return locations or [root + path for path in sitemap_config["fallback_paths"]]
 
-        except Exception as e:
-            print(f" → Пропущен товар: {e}")
+def iter_sitemap(url, session):
+    """
+    Потоково читает карту сайта (в том числе .gz) и выдает ("sitemap" | "url", loc, lastmod).
+    Разобранные элементы сразу освобождаются, поэтому большие карты не держатся в памяти.
+    """
+    response = session.get(url, timeout=fetch_config["timeout"], stream=True)
+    if response.status_code != 200:
+        print(f"⚠️ Карта сайта {url}: HTTP {response.status_code}")
+        return
+    response.raw.decode_content = True
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    try:
+        for _, elem in ET.iterparse(stream, events=("end",)):
+            if elem.tag in (f"{_SITEMAP_NS}sitemap", f"{_SITEMAP_NS}url"):
+                loc = (elem.findtext(f"{_SITEMAP_NS}loc") or "").strip()
+                lastmod = (elem.findtext(f"{_SITEMAP_NS}lastmod") or "").strip() or None
+                if loc:
+                    yield ("sitemap" if elem.tag == f"{_SITEMAP_NS}sitemap" else "url"), loc, lastmod
+                elem.clear()
+    finally:
+        response.close()
+
+def discover_sitemap_urls(base_url, session=None):
+    """
+    Обходит карты сайта (включая индексы) и возвращает ({адрес каталога: lastmod},
+    множество адресов из карт разделов). Карты разделов узнаются по имени файла
+    (sitemap_config["section_sitemap_pattern"]), как их называет модуль SEO Битрикса.
+    """
+    session = session or get_static_driver().session
+    host = urlparse(base_url).netloc
+    pending = sitemap_locations(base_url, session)
+    visited = set()
+    catalog_urls = {}
+    section_urls = set()
+    while pending and len(visited) < sitemap_config["max_sitemaps"]:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in visited:
             continue
+        visited.add(sitemap_url)
+        sitemap_name = urlparse(sitemap_url).path.rsplit("/", 1)[-1]
+        is_section_sitemap = bool(re.search(sitemap_config["section_sitemap_pattern"], sitemap_name, re.I))
+        try:
+            for kind, loc, lastmod in iter_sitemap(sitemap_url, session):
+                if kind == "sitemap":
+                    pending.append(loc)
+                    continue
+                parsed = urlparse(loc)
+                if parsed.netloc == host and parsed.path.startswith(sitemap_config["catalog_prefix"]):
+                    loc = urlunparse(parsed._replace(query="", fragment=""))
+                    catalog_urls[loc] = lastmod
+                    if is_section_sitemap:
+                        section_urls.add(loc)
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать карту сайта {sitemap_url}: {e}")
+    print(f"🗺️ Карт сайта прочитано: {len(visited)}, адресов каталога: {len(catalog_urls)}"
+          f" (из карт разделов: {len(section_urls)})")
+    return catalog_urls, section_urls
 
-    print(f" → Найдено товаров: {len(products)}")
-    
-    # Возвращаем словарь с заголовками и товарами
-    return {
-        "table_headers": table_headers,
-        "products": products
-    }
+def _catalog_segments(url):
+    return [part for part in urlparse(url).path[len(sitemap_config["catalog_prefix"]):].split("/") if part]
 
-def parse_grandchildren():
+def classify_sitemap_urls(catalog_urls, known_sections=()):
     """
-    Парсит под-подкатегории (внуки), если нет таблицы товаров.
-    Ищет ul.dropdown и собирает a.section.option-font-bold
+    Делит адреса каталога на разделы и товары. Раздел — адрес из known_sections
+    (меню, карты разделов) или адрес со слешем на конце, у которого в карте есть
+    вложенные адреса; остальные считаются товарами. Без known_sections конечный
+    раздел, чьи товары не попали в карту, был бы принят за товар.
     """
-    try:
+    known = {tuple(_catalog_segments(url)) for url in known_sections}
+    prefixes = set()
+    for url in catalog_urls:
+        segments = _catalog_segments(url)
+        for depth in range(1, len(segments)):
+            prefixes.add(tuple(segments[:depth]))
+    sections, products = {}, {}
+    for url, lastmod in catalog_urls.items():
+        segments = tuple(_catalog_segments(url))
+        if segments and (segments in known or (url.endswith("/") and segments in prefixes)):
+            sections[url] = lastmod
+        elif segments:
+            products[url] = lastmod
+    return sections, products
 
-        links = driver.find_elements(By.CSS_SELECTOR, 'a.item_block_href')
+def build_sitemap_crawl(catalog_urls, categories_data=None, section_urls=()):
+    """
+    Строит дерево категорий из карты сайта и задачи обхода только для конечных разделов,
+    так что промежуточные страницы навигации не загружаются. Названия берутся из меню
+    (categories_data), если раздел в нем есть, иначе из адреса. Разделы меню и адреса
+    из карт разделов (section_urls) всегда считаются разделами.
+    Возвращает (categories_data, задачи, {"sections": ..., "products": ...}).
+    """
+    names = {}
+    known_sections = set(section_urls)
+    for cat in categories_data or []:
+        if cat.get("url"):
+            known_sections.add(cat["url"])
+        for sub in cat["subcategories"]:
+            if sub.get("url"):
+                known_sections.add(sub["url"])
+                segments = tuple(_catalog_segments(sub["url"]))
+                names[segments] = sub["name"]
+                names.setdefault(segments[:1], cat["name"])
 
-        grandchildren = []
-        for link in links:
-            title_elem = link.find_element(By.CSS_SELECTOR, 'span.font_md')
-            product_name = title_elem.text.strip()
-            product_url = link.get_attribute('href')
+    sections, products = classify_sitemap_urls(catalog_urls, known_sections)
+    root = urljoin(next(iter(catalog_urls), ""), sitemap_config["catalog_prefix"])
 
-            if product_name and product_url:
-                grandchildren.append({
-                    "name": product_name,
-                    "url": product_url
-                })
+    # Товары дают разделу дату последнего изменения
+    section_lastmod = dict(sections)
+    for url, lastmod in products.items():
+        parent = urljoin(url.rstrip("/") + "/", "..")
+        if parent in section_lastmod and lastmod and (section_lastmod[parent] or "") < lastmod:
+            section_lastmod[parent] = lastmod
 
-        print(f" Найдено под-подкатегорий: {len(grandchildren)}")
-        return grandchildren
+    nodes = {}
+    def node_for(segments):
+        if segments not in nodes:
+            url = root + "/".join(segments) + "/"
+            nodes[segments] = {"name": names.get(segments, segments[-1]), "url": url,
+                               "lastmod": section_lastmod.get(url)}
+        return nodes[segments]
+
+    tree, tasks = [], []
+    section_segments = sorted(tuple(_catalog_segments(url)) for url in sections)
+    parents = {segments[:depth] for segments in section_segments for depth in range(1, len(segments))}
+    for segments in section_segments:
+        if len(segments) < 2 or segments in parents:
+            continue  # Категории и промежуточные разделы не загружаются
+        category = node_for(segments[:1])
+        if "subcategories" not in category:
+            category["subcategories"] = []
+            tree.append(category)
+        path_nodes = [node_for(segments[:depth]) for depth in range(2, len(segments) + 1)]
+        # Вложенность как в последовательном режиме: subcategories → grandchildren → sub_subcategories
+        for parent, child, key in zip([category] + path_nodes, path_nodes,
+                                      ["subcategories", "grandchildren"] + ["sub_subcategories"] * len(path_nodes)):
+            parent.setdefault(key, [])
+            if child not in parent[key]:
+                parent[key].append(child)
+        tasks.append({"url": path_nodes[-1]["url"], "level": "sub", "category": category["name"],
+                      "path": [node["name"] for node in path_nodes], "node": path_nodes[-1],
+                      "cat_index": len(tree) - 1})
 
+    print(f"🗺️ Разделов: {len(sections)} (к загрузке: {len(tasks)}), товаров: {len(products)}")
+    return tree, tasks, {"sections": sections, "products": products}
+
+def save_sitemap_urls(found):
+    """Сохраняет найденные адреса разделов и товаров с lastmod"""
+    os.makedirs("results", exist_ok=True)
+    path = os.path.join("results", sitemap_config["file"])
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(found, f, ensure_ascii=False, indent=1)
     except Exception as e:
-        print(f" Нет под-подкатегорий или ошибка: {e}")
-        return []
+        print(f"⚠️ Не удалось сохранить адреса из карты сайта: {e}")
 
-def parse_sub_subcategories():
+# === Асинхронный движок обхода каталога ===
+
+# Настройки параллельного обхода
+crawl_config = {
+    "concurrency": 8,  # Сколько страниц загружается одновременно
+    "per_host": 4  # Сколько одновременных запросов допускается к одному хосту
+}
+
+def _path_label(path):
+    """Подпись подкатегории для Excel-накопителя (как в последовательном режиме)"""
+    return "_".join(path)
+
+def _collector_path(path):
+    """Путь подкатегорий для накопителя по категориям"""
+    return path[0] if len(path) == 1 else list(path)
+
+def _extract_crawl_task(task, fetched):
     """
-    Парсит под-под-подкатегории (4-й уровень вложенности)
-    Ищет ссылки в catalog_section_list count_section_list_6 row items margin0 flexbox type_sections_4
+    Разбирает загруженную страницу. Выполняется в одном потоке, поэтому
+    глобальный driver не делится между задачами.
+    Возвращает (результат для накопителей или None, список дочерних задач).
     """
-    try:
-        # Селекторы для поиска дополнительных подкатегорий
-        section_selectors = [
-            ".catalog_section_list.count_section_list_6.row.items.margin0.flexbox.type_sections_4 a",
-            ".catalog_section_list a.item_block_href",
-            ".count_section_list_6 a",
-            ".type_sections_4 a.item_block_href",
-            ".catalog_section_list a"
-        ]
-        
-        sub_subcategories = []
-        
-        for selector in section_selectors:
+    global driver
+
+    url = task["url"]
+    level = task["level"]
+    context = " -> ".join([task["category"]] + task["path"])
+
+    page = StaticDriver(get_static_driver().session)
+    loaded = False
+    if fetched is not None:
+        page.load(*fetched)
+        loaded = is_static_page_usable(page)
+    if loaded:
+        driver = page
+        parsing_state["last_successful_url"] = url
+    elif not safe_get_page(url, allow_static=False):
+        print(f"   ❌ Пропускаем {context} - не удалось загрузить страницу")
+        return None, []
+
+    children = []
+    if level == "sub":
+        items = safe_parse_with_retry(with_page_snapshot(get_products), context)
+        if isinstance(items, list) and items and isinstance(items[0], dict) and "name" in items[0] and "url" in items[0] and "article" not in items[0]:
+            task["node"]["grandchildren"] = items
+            for grand in items:
+                children.append({"url": grand["url"], "level": "grand", "category": task["category"],
+                                 "path": task["path"] + [grand["name"]], "node": grand})
+            return None, children
+        return (task, items, "custom_list"), children
+
+    if level == "grand":
+        sub_subcategories = safe_parse_with_retry(with_page_snapshot(parse_sub_subcategories), f"под-под-подкатегории для {context}")
+        if sub_subcategories:
+            task["node"]["sub_subcategories"] = sub_subcategories
+            task["node"]["products"] = []
+            task["node"]["table_headers"] = []
+            for sub_sub in sub_subcategories:
+                children.append({"url": sub_sub["url"], "level": "sub_sub", "category": task["category"],
+                                 "path": task["path"] + [sub_sub["name"]], "node": sub_sub})
+            return None, children
+
+    items = safe_parse_with_retry(with_page_snapshot(parse_structured_products), context)
+    return (task, items, "regular_products"), children
+
+def _store_crawl_result(task, items, list_data_type):
+    """Передает результат страницы в накопители (та же логика, что и в последовательном режиме)"""
+    cat_name = task["category"]
+    path = task["path"]
+    node = task["node"]
+    label = _path_label(path)
+    collector_path = _collector_path(path)
+
+    node["products"] = []
+    node["table_headers"] = []
+    if isinstance(items, dict) and "structured_blocks" in items:
+        for block in items["blocks"]:
+            block_info = {
+                "block_title": block.get("block_title", ""),
+                "block_image": block.get("block_image", ""),
+                "table_headers": block.get("table_headers", [])
+            }
+            add_to_category_collector(cat_name, collector_path, block.get("products", []), block_info)
+        add_to_excel_collector(items["blocks"], cat_name, label, "structured_blocks")
+        node["product_blocks"] = items["blocks"]
+        for block in items["blocks"]:
+            node["products"].extend(block.get("products", []))
+    elif isinstance(items, dict) and "products" in items:
+        add_to_category_collector(cat_name, collector_path, items["products"])
+        add_to_excel_collector(items["products"], cat_name, label, "regular_products")
+        node["products"] = items["products"]
+        node["table_headers"] = items.get("table_headers", [])
+    elif items:
+        add_to_category_collector(cat_name, collector_path, items)
+        add_to_excel_collector(items, cat_name, label, list_data_type)
+        node["products"] = items
+    print(f"  ✅ {cat_name} -> {' -> '.join(path)}: {len(node['products'])} товаров")
+
+async def crawl_catalog_async(categories_data, tasks=None):
+    """
+    Обходит иерархию категорий (подкатегории → под-подкатегории → под-под-подкатегории)
+    с несколькими одновременными загрузками. Загрузка идет параллельно в пуле потоков
+    с ограничением на хост, разбор страниц — последовательно в отдельном потоке,
+    результаты передаются в накопители через асинхронную очередь.
+    Готовые задачи (tasks, например из карты сайта) заменяют обход с подкатегорий меню.
+    """
+    loop = asyncio.get_running_loop()
+    fetch_queue = asyncio.Queue()
+    results_queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(crawl_config["concurrency"])
+    host_semaphores = {}
+    fetch_executor = ThreadPoolExecutor(max_workers=crawl_config["concurrency"])
+    extract_executor = ThreadPoolExecutor(max_workers=1)
+    # Накопители и контрольные точки (запись Excel) — в своем потоке, чтобы не останавливать цикл событий
+    store_executor = ThreadPoolExecutor(max_workers=1)
+    session = get_static_driver().session
+
+    for task in tasks or []:
+        fetch_queue.put_nowait(task)
+    for cat_index, cat_data in enumerate(categories_data if tasks is None else []):
+        for sub in cat_data["subcategories"]:
+            fetch_queue.put_nowait({"url": sub["url"], "level": "sub", "category": cat_data["name"],
+                                    "path": [sub["name"]], "node": sub, "cat_index": cat_index})
+
+    async def fetch(url, load=None):
+        host = urlparse(url).netloc
+        if host not in host_semaphores:
+            host_semaphores[host] = asyncio.Semaphore(crawl_config["per_host"])
+        async with semaphore, host_semaphores[host]:
+            return await loop.run_in_executor(fetch_executor, load or StaticDriver(session).fetch, url)
+
+    async def worker():
+        while True:
+            task = await fetch_queue.get()
             try:
-                links = driver.find_elements(By.CSS_SELECTOR, selector)
-                if links:
-                    print(f"🔍 Найдены под-под-подкатегории с селектором: {selector}")
-                    
-                    for link in links:
-                        try:
-                            # Пытаемся извлечь название
-                            name = None
-                            name_selectors = [
-                                "span.font_md",
-                                ".section_name",
-                                "span",
-                                ".name"
-                            ]
-                            
-                            for name_sel in name_selectors:
-                                try:
-                                    name_elem = link.find_element(By.CSS_SELECTOR, name_sel)
-                                    name = name_elem.text.strip()
-                                    if name:
-                                        break
-                                except:
-                                    continue
-                            
-                            # Если название не найдено, берем текст ссылки
-                            if not name:
-                                name = link.text.strip()
-                            
-                            url = link.get_attribute('href')
-                            
-                            if name and url and '/catalog/' in url:
-                                sub_subcategories.append({
-                                    "name": name,
-                                    "url": url
-                                })
-                                
-                        except Exception as e:
-                            continue
-                    
-                    if sub_subcategories:
-                        break
-                        
+                try:
+                    ajax_pages = await fetch(task["url"], lambda url: fetch_ajax_section(url, session))
+                except Exception as e:
+                    print(f"   ⚠️ AJAX-эндпоинт {task['url']} не ответил ({e}), загружаем страницу")
+                    ajax_pages = None
+                if ajax_pages:
+                    items = await loop.run_in_executor(extract_executor, parse_ajax_pages, ajax_pages)
+                    if items:
+                        await results_queue.put((task, items, "custom_list" if task["level"] == "sub" else "regular_products"))
+                        continue
+
+                try:
+                    fetched = await fetch(task["url"]) if http_engine_available() else None
+                except Exception as e:
+                    print(f"   ⚠️ HTTP-загрузка {task['url']} не удалась ({e}), используем браузер")
+                    fetched = None
+
+                result, children = await loop.run_in_executor(extract_executor, _extract_crawl_task, task, fetched)
+                for child in children:
+                    child["cat_index"] = task.get("cat_index", 0)
+                    fetch_queue.put_nowait(child)
+                if result:
+                    await results_queue.put(result)
             except Exception as e:
-                continue
-        
-        # Удаляем дубликаты
-        unique_subs = []
-        seen_urls = set()
-        for sub in sub_subcategories:
-            if sub['url'] not in seen_urls:
-                unique_subs.append(sub)
-                seen_urls.add(sub['url'])
-        
-        print(f"🎯 Найдено уникальных под-под-подкатегорий: {len(unique_subs)}")
-        return unique_subs
+                print(f"   ❌ Ошибка обработки {task['url']}: {e}")
+            finally:
+                fetch_queue.task_done()
 
-    except Exception as e:
-        print(f"❌ Ошибка парсинга под-под-подкатегорий: {e}")
-        return []
+    def store(task, items, list_data_type):
+        _store_crawl_result(task, items, list_data_type)
+        update_parsing_progress(task.get("cat_index", 0), 0, len(categories_data))
+
+    async def collector():
+        while True:
+            task, items, list_data_type = await results_queue.get()
+            try:
+                await loop.run_in_executor(store_executor, store, task, items, list_data_type)
+            except Exception as e:
+                print(f"   ❌ Ошибка сохранения результата {task['url']}: {e}")
+            finally:
+                results_queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(crawl_config["concurrency"])]
+    collector_task = asyncio.create_task(collector())
+    try:
+        await fetch_queue.join()
+        await results_queue.join()
+    finally:
+        for task in workers + [collector_task]:
+            task.cancel()
+        await asyncio.gather(*workers, collector_task, return_exceptions=True)
+        fetch_executor.shutdown(wait=False)
+        extract_executor.shutdown(wait=False)
+        store_executor.shutdown(wait=True)  # Последняя запись в накопители должна завершиться
+
+def run_async_crawl(categories_data, tasks=None):
+    """Запускает асинхронный обход каталога"""
+    parsing_state["start_time"] = datetime.now()
+    parsing_state["total_categories"] = len(categories_data)
+    asyncio.run(crawl_catalog_async(categories_data, tasks))
 
 # === Ввод и запуск драйвера ===
 print("Выберите режим работы:")
@@ -1978,21 +4824,20 @@ print("5. Тест парсинга под-под-подкатегорий 🔗"
 print("6. Исправить существующие CSV файлы для Excel 🔧")
 print("7. Создать консолидированный Excel из CSV файлов 📊")
 print("8. Тестовый парсинг одной категории 🧪")
+print("9. Асинхронный полный парсинг (параллельная загрузка) ⚡")
+print("10. Поиск AJAX-эндпоинтов каталога 🛰️")
+print("11. Асинхронный парсинг по карте сайта (sitemap.xml) 🗺️")
+print("12. Парсинг подкатегорий во вкладках одного браузера 🗂️")
 
-mode_choice = input("Введите номер режима (1-8) или нажмите Enter для полного парсинга: ").strip()
-
-chrome_options = Options()
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-chrome_options.add_argument("--disable-plugins")
+mode_choice = input("Введите номер режима (1-12) или нажмите Enter для полного парсинга: ").strip()
 
 if mode_choice == "2":
     # Режим теста structured_products (таблицы)
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     test_url = input("Введите URL для теста таблиц товаров: ")
     print(f"\n→ Переход на: {test_url}")
     driver.get(test_url)
-    time.sleep(2)
+    wait_for_page_ready("table")
 
     # Прямо вызываем parse_structured_products
     result = parse_structured_products()
@@ -2025,11 +4870,11 @@ if mode_choice == "2":
 
 elif mode_choice == "3":
     # Режим теста custom_list (списки товаров)
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     test_url = input("Введите URL для теста списка товаров (custom_list): ")
     print(f"\n→ Переход на: {test_url}")
     driver.get(test_url)
-    time.sleep(2)
+    wait_for_page_ready("list")
 
     # Прямо вызываем parse_custom_list
     result = parse_custom_list()
@@ -2054,12 +4899,12 @@ elif mode_choice == "3":
 
 elif mode_choice == "4":
     # Режим теста страницы отдельного товара
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     test_url = input("Введите URL страницы товара для тестирования: ")
     print(f"\n🧪 ТЕСТ СТРАНИЦЫ ТОВАРА")
     print(f"→ Переход на: {test_url}")
     driver.get(test_url)
-    time.sleep(3)
+    wait_for_page_ready("product")
 
     # Прямо вызываем parse_single_product_page
     result = parse_single_product_page()
@@ -2094,12 +4939,12 @@ elif mode_choice == "4":
 
 elif mode_choice == "5":
     # Режим теста под-под-подкатегорий
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     test_url = input("Введите URL страницы с под-под-подкатегориями: ")
     print(f"\n🧪 ТЕСТ ПАРСИНГА ПОД-ПОД-ПОДКАТЕГОРИЙ")
     print(f"→ Переход на: {test_url}")
     driver.get(test_url)
-    time.sleep(3)
+    wait_for_page_ready("sections")
 
     # Прямо вызываем parse_sub_subcategories
     result = parse_sub_subcategories()
@@ -2120,7 +4965,7 @@ elif mode_choice == "5":
             selected = result[int(choice) - 1]
             print(f"\n🔍 Тестируем парсинг товаров из: {selected['name']}")
             driver.get(selected['url'])
-            time.sleep(3)
+            wait_for_page_ready("table")
             
             # Парсим товары
             products_result = parse_structured_products()
@@ -2198,10 +5043,10 @@ elif mode_choice == "7":
 
 elif mode_choice == "8":
     # Тестовый режим: парсинг одной категории
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     url = input("Введите URL главной страницы: ")
     driver.get(url)
-    time.sleep(2)
+    wait_for_page_ready("menu")
 
     print("\n🧪 ТЕСТОВЫЙ РЕЖИМ: ПАРСИНГ ОДНОЙ КАТЕГОРИИ")
     print("="*60)
@@ -2251,7 +5096,7 @@ elif mode_choice == "8":
                         continue
                     
                     # Безопасный парсинг
-                    items = safe_parse_with_retry(get_products, f"{selected_category_name} -> {sub_name}")
+                    items = safe_parse_with_retry(with_page_snapshot(get_products), f"{selected_category_name} -> {sub_name}")
                     
                     if isinstance(items, dict) and "structured_blocks" in items:
                         # Обрабатываем структурированные блоки
@@ -2286,7 +5131,7 @@ elif mode_choice == "8":
                                         continue
                                     
                                     grand_result = safe_parse_with_retry(
-                                        parse_structured_products, 
+                                        with_page_snapshot(parse_structured_products), 
                                         f"{selected_category_name} -> {sub_name} -> {grand['name']}"
                                     )
                                     
@@ -2347,32 +5192,123 @@ elif mode_choice == "8":
     
     exit()
 
+elif mode_choice == "9":
+    # Асинхронный режим: та же иерархия, но с параллельной загрузкой страниц
+    url = input("Введите URL главной страницы: ")
+
+    print("\n⚡ АСИНХРОННЫЙ ПАРСИНГ")
+    print("="*60)
+    print(f"   Одновременных загрузок: {crawl_config['concurrency']}, на хост: {crawl_config['per_host']}")
+
+    # Меню категорий: из кэша или одним проходом по главной странице
+    categories_data = get_category_tree(url)
+
+    run_async_crawl(categories_data)
+
+    total_time = datetime.now() - parsing_state["start_time"]
+    print(f"\n⏱️ Время парсинга: {total_time}")
+    print(f"📦 Собрано товаров: {len(excel_data_collector['all_products'])}")
+    print_recycler_metrics()
+    print_retry_metrics()
+
+    save_progress_checkpoint()
+    category_excel_file = save_category_based_excel()
+    consolidated_excel_file = save_consolidated_excel()
+    if category_excel_file or consolidated_excel_file:
+        print(f"\n🎉 Парсинг успешно завершен! Файлы находятся в папке: results/")
+    else:
+        print(f"\n⚠️ Excel файлы не были созданы")
+
+elif mode_choice == "10":
+    # Обнаружение AJAX-эндпоинтов: браузер пишет сетевой журнал, пока открываются разделы
+    ajax_config["capture"] = True
+    driver = browser_driver = driver_pool.acquire()
+    url = input("Введите URL главной страницы: ")
+
+    print("\n🛰️ ПОИСК AJAX-ЭНДПОИНТОВ")
+    print("="*60)
+    categories_data = get_category_tree(url)
+
+    for cat_data in categories_data:
+        for sub in cat_data["subcategories"]:
+            found = discover_section_endpoints(sub["url"])
+            print(f"   {'📡' if found else '—'} {cat_data['name']} -> {sub['name']}: {'эндпоинт найден' if found else 'эндпоинт не найден'}")
+
+    save_ajax_endpoints()
+    print(f"\n📡 Разделов с AJAX-эндпоинтом: {len(ajax_endpoints)} (сохранено в {ajax_config['file']})")
+    for section, endpoint in list(ajax_endpoints.items())[:10]:
+        print(f"   • {section} → {endpoint['method']} {endpoint['url']}")
+
+elif mode_choice == "11":
+    # Асинхронный режим по карте сайта: разделы берутся из sitemap.xml, навигация не загружается
+    url = input("Введите URL главной страницы: ")
+
+    print("\n🗺️ ПАРСИНГ ПО КАРТЕ САЙТА")
+    print("="*60)
+    # Меню нужно только для названий категорий и подкатегорий (обычно из кэша)
+    menu_categories = get_category_tree(url)
+    catalog_urls, section_urls = discover_sitemap_urls(url) if http_engine_available() else ({}, set())
+    if catalog_urls:
+        categories_data, sitemap_tasks, sitemap_found = build_sitemap_crawl(catalog_urls, menu_categories, section_urls)
+        save_sitemap_urls(sitemap_found)
+    else:
+        print("⚠️ Карта сайта не найдена, обходим каталог по меню")
+        categories_data, sitemap_tasks = menu_categories, None
+
+    run_async_crawl(categories_data, sitemap_tasks)
+
+    total_time = datetime.now() - parsing_state["start_time"]
+    print(f"\n⏱️ Время парсинга: {total_time}")
+    print(f"📦 Собрано товаров: {len(excel_data_collector['all_products'])}")
+    print_recycler_metrics()
+    print_retry_metrics()
+
+    save_progress_checkpoint()
+    category_excel_file = save_category_based_excel()
+    consolidated_excel_file = save_consolidated_excel()
+    if category_excel_file or consolidated_excel_file:
+        print(f"\n🎉 Парсинг успешно завершен! Файлы находятся в папке: results/")
+    else:
+        print(f"\n⚠️ Excel файлы не были созданы")
+
+elif mode_choice == "12":
+    # Подкатегории каждой категории загружаются параллельно во вкладках одного браузера
+    url = input("Введите URL главной страницы: ")
+
+    print("\n🗂️ ПАРСИНГ ВО ВКЛАДКАХ БРАУЗЕРА")
+    print("="*60)
+    print(f"   Вкладок на браузер: {tab_config['tabs']}")
+
+    # Меню категорий: из кэша или одним проходом по главной странице
+    categories_data = get_category_tree(url)
+
+    parsing_state["start_time"] = datetime.now()
+    parsing_state["total_categories"] = len(categories_data)
+    category_results = queue.Queue()
+    for cat_data in categories_data:
+        process_category_async(cat_data, category_results)
+        result = category_results.get()
+        print(f"   {'✅' if result['status'] == 'completed' else '❌'} {cat_data['name']}: {result['message']}")
+
+    total_time = datetime.now() - parsing_state["start_time"]
+    print(f"\n⏱️ Время парсинга: {total_time}")
+    print(f"📦 Собрано товаров: {len(excel_data_collector['all_products'])}")
+
+    save_progress_checkpoint()
+    category_excel_file = save_category_based_excel()
+    consolidated_excel_file = save_consolidated_excel()
+    if category_excel_file or consolidated_excel_file:
+        print(f"\n🎉 Парсинг успешно завершен! Файлы находятся в папке: results/")
+    else:
+        print(f"\n⚠️ Excel файлы не были созданы")
+
 else:
     # Основной режим: парсинг всей иерархии
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = browser_driver = driver_pool.acquire()
     url = input("Введите URL главной страницы: ")
-    driver.get(url)
-    time.sleep(2)
 
     # === Шаг 1: Сбор категорий и подкатегорий ===
-    main_categories = driver.find_elements(By.CSS_SELECTOR, 'a.icons_fa.parent.rounded2.bordered')
-    print(f'Найдено категорий: {len(main_categories)}')
-
-    categories_data = []
-
-    for main_cat in main_categories:
-        try:
-            cat_name = get_category_name(main_cat)
-            subcategories = get_subcategories(main_cat)
-            
-            categories_data.append({
-                "name": cat_name,
-                "subcategories": subcategories
-            })
-            print(f" Подготовлено: {cat_name} → {len(subcategories)} подкатегорий")
-            
-        except Exception as e:
-            print(f" Ошибка при подготовке категории: {e}")
+    categories_data = get_category_tree(url)
 
     # === Шаг 2: Переход и сбор "внуков" и товаров ===
     parsing_state["start_time"] = datetime.now()
@@ -2382,12 +5318,6 @@ else:
         cat_name = cat_data["name"]
         print(f"\n🏷️ Обработка категории: {cat_name} ({cat_index + 1}/{len(categories_data)})")
         
-        # Перезапускаем браузер каждые 5 категорий для предотвращения проблем с памятью
-        if cat_index > 0 and cat_index % 5 == 0:
-            print(f"🔄 Профилактический перезапуск браузера после {cat_index} категорий")
-            restart_browser()
-            time.sleep(3)
-        
         for sub_index, sub in enumerate(cat_data["subcategories"]):
             try:
                 sub_name = sub["name"]
@@ -2397,13 +5327,16 @@ else:
                 # Обновляем прогресс
                 update_parsing_progress(cat_index, sub_index, len(categories_data))
                 
-                # Безопасный переход на страницу
-                if not safe_get_page(sub_url):
-                    print(f"  ❌ Пропускаем {sub_name} - не удалось загрузить страницу")
-                    continue
-                
-                # Безопасный парсинг с повторными попытками
-                items = safe_parse_with_retry(get_products, f"{cat_name} -> {sub_name}")
+                # Раздел с известным AJAX-эндпоинтом загружается без перехода на страницу
+                items = parse_section_via_ajax(sub_url)
+                if items is None:
+                    # Безопасный переход на страницу
+                    if not safe_get_page(sub_url):
+                        print(f"  ❌ Пропускаем {sub_name} - не удалось загрузить страницу")
+                        continue
+                    
+                    # Безопасный парсинг с повторными попытками
+                    items = safe_parse_with_retry(with_page_snapshot(get_products), f"{cat_name} -> {sub_name}")
                 
                 sub["products"] = []
                 sub["grandchildren"] = []
@@ -2453,7 +5386,7 @@ else:
                                 
                                 # Проверяем наличие под-под-подкатегорий
                                 sub_subcategories = safe_parse_with_retry(
-                                    parse_sub_subcategories, 
+                                    with_page_snapshot(parse_sub_subcategories), 
                                     f"под-под-подкатегории для {grand['name']}"
                                 )
                                 
@@ -2473,7 +5406,7 @@ else:
                                             
                                             # Парсим товары из под-под-подкатегории
                                             sub_sub_result = safe_parse_with_retry(
-                                                parse_structured_products, 
+                                                with_page_snapshot(parse_structured_products), 
                                                 f"{cat_name} -> {sub_name} -> {grand['name']} -> {sub_sub['name']}"
                                             )
                                             
@@ -2524,7 +5457,7 @@ else:
                                 
                                 # Если нет под-под-подкатегорий, парсим обычным способом
                                 grand_result = safe_parse_with_retry(
-                                    parse_structured_products, 
+                                    with_page_snapshot(parse_structured_products), 
                                     f"{cat_name} -> {sub_name} -> {grand['name']}"
                                 )
                                 
@@ -2673,6 +5606,8 @@ else:
     print(f"⏱️ Время парсинга: {total_time}")
     print(f"📊 Обработано элементов: {parsing_state['processed_items']}")
     print(f"📦 Собрано товаров: {len(excel_data_collector['all_products'])}")
+    print_recycler_metrics()
+    print_retry_metrics()
     
     # === Создание Excel файлов ===
     print("\n" + "="*60)
@@ -2711,233 +5646,8 @@ else:
         print(f"💾 Данные сохранены в checkpoint файлах")
 
 # === Завершение ===
-driver.quit() 
-
-def add_to_category_collector(category_name, subcategory_path, product_data, block_info=None):
-    """
-    Добавляет данные в структурированный накопитель по категориям
-    
-    Args:
-        category_name: Название основной категории
-        subcategory_path: Путь подкатегорий (список или строка)
-        product_data: Данные товара/товаров
-        block_info: Информация о блоке (заголовок, изображение, заголовки таблицы)
-    """
-    global category_data_collector
-    
-    if category_name not in category_data_collector:
-        category_data_collector[category_name] = {
-            "products": [],
-            "subcategories": {},
-            "blocks": [],
-            "statistics": {
-                "total_products": 0,
-                "total_subcategories": 0,
-                "total_blocks": 0
-            }
-        }
-    
-    # Преобразуем путь подкатегорий в строку
-    if isinstance(subcategory_path, list):
-        subcategory_key = " → ".join(subcategory_path)
-    else:
-        subcategory_key = str(subcategory_path)
-    
-    timestamp = datetime.now().isoformat()
-    
-    # Если это блок товаров (structured_blocks)
-    if block_info and isinstance(product_data, list):
-        block_data = {
-            "block_title": block_info.get("block_title", "Неизвестный блок"),
-            "block_image": block_info.get("block_image", ""),
-            "table_headers": block_info.get("table_headers", []),
-            "subcategory_path": subcategory_key,
-            "timestamp": timestamp,
-            "products": []
-        }
-        
-        for product in product_data:
-            enhanced_product = {
-                "category": category_name,
-                "subcategory_path": subcategory_key,
-                "block_title": block_info.get("block_title", ""),
-                "block_image": block_info.get("block_image", ""),
-                "name": product.get("name", ""),
-                "article": product.get("article", ""),
-                "url": product.get("url", ""),
-                "image_url": product.get("image_url", ""),
-                "timestamp": timestamp
-            }
-            
-            # Добавляем все остальные характеристики товара
-            for key, value in product.items():
-                if key not in ["name", "article", "url", "image_url"]:
-                    enhanced_product[key] = value
-            
-            block_data["products"].append(enhanced_product)
-            category_data_collector[category_name]["products"].append(enhanced_product)
-        
-        category_data_collector[category_name]["blocks"].append(block_data)
-        category_data_collector[category_name]["statistics"]["total_blocks"] += 1
-        
-    # Если это обычные товары
-    elif isinstance(product_data, list):
-        for product in product_data:
-            enhanced_product = {
-                "category": category_name,
-                "subcategory_path": subcategory_key,
-                "block_title": "",
-                "block_image": "",
-                "name": product.get("name", ""),
-                "article": product.get("article", ""),
-                "url": product.get("url", ""),
-                "image_url": product.get("image_url", ""),
-                "price": product.get("price", ""),
-                "timestamp": timestamp
-            }
-            
-            # Добавляем все остальные характеристики товара
-            for key, value in product.items():
-                if key not in ["name", "article", "url", "image_url", "price"]:
-                    enhanced_product[key] = value
-                    
-            category_data_collector[category_name]["products"].append(enhanced_product)
-    
-    # Обновляем статистику
-    if subcategory_key not in category_data_collector[category_name]["subcategories"]:
-        category_data_collector[category_name]["subcategories"][subcategory_key] = 0
-        category_data_collector[category_name]["statistics"]["total_subcategories"] += 1
-    
-    products_count = len(product_data) if isinstance(product_data, list) else 1
-    category_data_collector[category_name]["subcategories"][subcategory_key] += products_count
-    category_data_collector[category_name]["statistics"]["total_products"] += products_count
-
-def save_category_based_excel():
-    """
-    Сохраняет данные в Excel файл с отдельными листами для каждой категории
-    """
-    global category_data_collector
-    
-    if not category_data_collector:
-        print("❌ Нет данных для сохранения")
-        return None
-    
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"parsed_data_by_categories_{timestamp}.xlsx"
-        filepath = os.path.join("results", filename)
-        
-        # Создаем директорию если её нет
-        os.makedirs("results", exist_ok=True)
-        
-        print(f"📊 Создание Excel файла по категориям: {filename}")
-        print(f"   → Категорий: {len(category_data_collector)}")
-        
-        # Создаем Excel книгу
-        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            
-            # Создаем сводный лист
-            summary_data = []
-            total_products = 0
-            total_blocks = 0
-            
-            for cat_name, cat_data in category_data_collector.items():
-                stats = cat_data["statistics"]
-                total_products += stats["total_products"]
-                total_blocks += stats["total_blocks"]
-                
-                summary_data.append({
-                    "Категория": cat_name,
-                    "Всего товаров": stats["total_products"],
-                    "Подкатегорий": stats["total_subcategories"],
-                    "Блоков товаров": stats["total_blocks"],
-                    "Подкатегории": ", ".join(list(cat_data["subcategories"].keys())[:3]) + 
-                                  (f" и ещё {len(cat_data['subcategories']) - 3}" if len(cat_data["subcategories"]) > 3 else "")
-                })
-            
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name="📊 Сводка", index=False)
-            print(f"   ✓ Создан сводный лист ({len(summary_data)} категорий)")
-            
-            # Создаем лист для каждой категории
-            for cat_name, cat_data in category_data_collector.items():
-                if not cat_data["products"]:
-                    continue
-                
-                # Создаем DataFrame из товаров категории
-                df = pd.DataFrame(cat_data["products"])
-                
-                # Переупорядочиваем колонки: основные поля в начале
-                basic_columns = ["name", "article", "url", "image_url", "subcategory_path", "block_title", "block_image"]
-                other_columns = [col for col in df.columns if col not in basic_columns + ["category", "timestamp"]]
-                ordered_columns = [col for col in basic_columns if col in df.columns] + other_columns
-                
-                # Добавляем категорию и timestamp в конец
-                if "category" in df.columns:
-                    ordered_columns.append("category")
-                if "timestamp" in df.columns:
-                    ordered_columns.append("timestamp")
-                
-                df = df[ordered_columns]
-                
-                # Переименовываем колонки для удобства
-                column_mapping = {
-                    "name": "Название товара",
-                    "article": "Артикул",
-                    "url": "Ссылка",
-                    "image_url": "Изображение",
-                    "subcategory_path": "Путь подкатегорий",
-                    "block_title": "Название блока",
-                    "block_image": "Изображение блока",
-                    "category": "Категория",
-                    "timestamp": "Время парсинга"
-                }
-                
-                df = df.rename(columns=column_mapping)
-                
-                # Формируем название листа (ограничиваем 31 символом)
-                sheet_name = cat_name[:27] + "..." if len(cat_name) > 27 else cat_name
-                
-                # Убираем недопустимые символы из имени листа
-                invalid_chars = ['\\', '/', '*', '[', ']', ':', '?']
-                for char in invalid_chars:
-                    sheet_name = sheet_name.replace(char, '_')
-                
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"   ✓ Создан лист '{sheet_name}' ({len(df)} товаров)")
-            
-            # Создаем лист с блоками товаров (если есть)
-            all_blocks = []
-            for cat_name, cat_data in category_data_collector.items():
-                for block in cat_data["blocks"]:
-                    block_summary = {
-                        "Категория": cat_name,
-                        "Путь подкатегорий": block["subcategory_path"],
-                        "Название блока": block["block_title"],
-                        "Изображение блока": block["block_image"],
-                        "Заголовки таблицы": ", ".join(block["table_headers"]),
-                        "Количество товаров": len(block["products"]),
-                        "Время парсинга": block["timestamp"]
-                    }
-                    all_blocks.append(block_summary)
-            
-            if all_blocks:
-                blocks_df = pd.DataFrame(all_blocks)
-                blocks_df.to_excel(writer, sheet_name="🗂️ Блоки товаров", index=False)
-                print(f"   ✓ Создан лист 'Блоки товаров' ({len(all_blocks)} блоков)")
-        
-        print(f"🎉 Excel файл успешно создан: {filepath}")
-        print(f"📁 Размер файла: {os.path.getsize(filepath) / 1024 / 1024:.2f} МБ")
-        print(f"📊 Итого: {total_products} товаров в {total_blocks} блоках")
-        
-        return filepath
-        
-    except Exception as e:
-        print(f"❌ Ошибка создания Excel файла: {e}")
-        return None
-
-def clear_category_collector():
-    """Очищает накопитель данных по категориям"""
-    global category_data_collector
-    category_data_collector = {}
-
+driver_pool.shutdown()
+if static_driver:
+    static_driver.quit()
+if not profile_config["keep_after_run"]:
+    cleanup_chrome_profiles()
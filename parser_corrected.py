@@ -3,6 +3,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 import time
 import csv
+import json
 import os
 from datetime import datetime
 import pandas as pd
@@ -15,6 +16,40 @@ from openpyxl.styles import Font, PatternFill, Alignment
 # Структурированный накопитель данных по категориям
 category_data_collector = {}
 
+# === Цепочки селекторов (общая схема extraction_schema.json) ===
+
+EXTRACTION_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_schema.json")
+
+with open(EXTRACTION_SCHEMA_FILE, encoding="utf-8") as f:
+    EXTRACTION_SCHEMA = json.load(f)
+
+# Именованные цепочки таблиц и блоков: {цепочка: [селекторы]}
+SELECTOR_CHAINS = {name: list(spec["selectors"]) for name, spec in EXTRACTION_SCHEMA.get("chains", {}).items()}
+
+def schema_chain(list_name, field=None, own_source=None):
+    """
+    Селекторы списка из схемы: field=None — селекторы элементов списка, иначе цепочка поля.
+    own_source=True — только записи со своим источником значения, False — только без него.
+    """
+    spec = EXTRACTION_SCHEMA["lists"][list_name]
+    if field is None:
+        return list(spec["items"])
+    selectors = []
+    for entry in spec["fields"][field]["chain"]:
+        has_source = isinstance(entry, dict) and "source" in entry
+        if own_source is None or own_source == has_source:
+            selectors.append(entry["selector"] if isinstance(entry, dict) else entry)
+    return selectors
+
+def _absolute_image_url(image_url):
+    """Дополняет относительный адрес изображения до полного"""
+    if not image_url.startswith('http'):
+        if image_url.startswith('//'):
+            image_url = 'https:' + image_url
+        elif image_url.startswith('/'):
+            image_url = 'https://cnc1.ru' + image_url
+    return image_url
+
 def clear_category_collector():
     """Очищает накопитель данных по категориям"""
     global category_data_collector
@@ -391,17 +426,8 @@ def get_table_headers():
     """Извлекает заголовки таблицы товаров"""
     headers = []
     try:
-        header_selectors = [
-            "tr.table-view__item-wrapper--head th",
-            "thead tr th",
-            "tr:first-child th", 
-            ".table-view__item-wrapper--head th",
-            "div.razdel.table_all tr:first-child th",
-            "table tr:first-child th"
-        ]
-        
         header_cells = []
-        for selector in header_selectors:
+        for selector in SELECTOR_CHAINS["table_headers"]:
             try:
                 header_cells = driver.find_elements(By.CSS_SELECTOR, selector)
                 if header_cells:
@@ -517,8 +543,7 @@ def parse_structured_products():
                     try:
                         prev_element = driver.execute_script("return arguments[0].previousElementSibling;", block)
                         if prev_element:
-                            title_selectors = ["h1", "h2", "h3", ".section_title", "span.font_md", ".title"]
-                            for selector in title_selectors:
+                            for selector in SELECTOR_CHAINS["block_title_prev"]:
                                 try:
                                     title_elem = prev_element.find_element(By.CSS_SELECTOR, selector)
                                     block_data["block_title"] = title_elem.text.strip()
@@ -531,8 +556,7 @@ def parse_structured_products():
                     
                     # Если не найден в предыдущем элементе, ищем в самом блоке
                     if not title_found:
-                        title_selectors = ["h1", "h2", "h3", "h4", "h5", ".section_title", "span.font_md", ".title", ".item_name"]
-                        for selector in title_selectors:
+                        for selector in SELECTOR_CHAINS["block_title"]:
                             try:
                                 title_elem = block.find_element(By.CSS_SELECTOR, selector)
                                 block_data["block_title"] = title_elem.text.strip()
@@ -551,41 +575,19 @@ def parse_structured_products():
                 try:
                     image_found = False
                     
-                    # Ищем ссылку с изображением
-                    try:
-                        image_link = block.find_element(By.CSS_SELECTOR, "div.section_img a.fancy.popup_link")
-                        image_url = image_link.get_attribute('href')
-                        if image_url:
-                            if not image_url.startswith('http'):
-                                if image_url.startswith('//'):
-                                    image_url = 'https:' + image_url
-                                elif image_url.startswith('/'):
-                                    image_url = 'https://cnc1.ru' + image_url
-                            block_data["block_image"] = image_url
-                            image_found = True
-                            print(f"   → Найдено изображение блока: {image_url}")
-                    except:
-                        pass
-                    
-                    # Если не найдена ссылка, пробуем альтернативные селекторы
-                    if not image_found:
-                        link_selectors = [".section_img a.fancy.popup_link", ".section_img a[href*='.jpg']", ".section_img a[href*='.png']", ".section_img a[href*='.gif']", "a.fancy.popup_link"]
-                        for selector in link_selectors:
-                            try:
-                                image_link = block.find_element(By.CSS_SELECTOR, selector)
-                                image_url = image_link.get_attribute('href')
-                                if image_url:
-                                    if not image_url.startswith('http'):
-                                        if image_url.startswith('//'):
-                                            image_url = 'https:' + image_url
-                                        elif image_url.startswith('/'):
-                                            image_url = 'https://cnc1.ru' + image_url
-                                    block_data["block_image"] = image_url
-                                    image_found = True
-                                    print(f"   → Найдено изображение блока: {image_url}")
-                                    break
-                            except:
-                                continue
+                    # Ищем ссылку с изображением (fancy popup_link внутри section_img и альтернативы)
+                    for selector in SELECTOR_CHAINS["block_image_link"]:
+                        try:
+                            image_link = block.find_element(By.CSS_SELECTOR, selector)
+                            image_url = image_link.get_attribute('href')
+                            if image_url:
+                                image_url = _absolute_image_url(image_url)
+                                block_data["block_image"] = image_url
+                                image_found = True
+                                print(f"   → Найдено изображение блока: {image_url}")
+                                break
+                        except:
+                            continue
                     
                     if not image_found:
                         print(f"   → Изображение блока не найдено")
@@ -615,10 +617,8 @@ def parse_structured_products():
                             # Изображение товара
                             image_url = None
                             try:
-                                image_selectors = ["div.section_img img", ".section_img img", "img.preview_picture", ".preview_picture", "td img", "img"]
-                                
                                 image_elem = None
-                                for selector in image_selectors:
+                                for selector in SELECTOR_CHAINS["table_row_image"]:
                                     try:
                                         image_elem = row.find_element(By.CSS_SELECTOR, selector)
                                         if image_elem:
@@ -628,11 +628,8 @@ def parse_structured_products():
                                 
                                 if image_elem:
                                     image_url = image_elem.get_attribute('src')
-                                    if image_url and not image_url.startswith('http'):
-                                        if image_url.startswith('//'):
-                                            image_url = 'https:' + image_url
-                                        elif image_url.startswith('/'):
-                                            image_url = 'https://cnc1.ru' + image_url
+                                    if image_url:
+                                        image_url = _absolute_image_url(image_url)
                             except Exception as e:
                                 print(f"   → Ошибка при поиске изображения товара: {e}")
 
@@ -802,10 +799,8 @@ def parse_table_products():
             # Изображение товара
             image_url = None
             try:
-                image_selectors = ["div.section_img img", ".section_img img", "img.preview_picture", ".preview_picture", "td img", "img"]
-                
                 image_elem = None
-                for selector in image_selectors:
+                for selector in SELECTOR_CHAINS["table_row_image"]:
                     try:
                         image_elem = row.find_element(By.CSS_SELECTOR, selector)
                         if image_elem:
@@ -815,11 +810,8 @@ def parse_table_products():
                 
                 if image_elem:
                     image_url = image_elem.get_attribute('src')
-                    if image_url and not image_url.startswith('http'):
-                        if image_url.startswith('//'):
-                            image_url = 'https:' + image_url
-                        elif image_url.startswith('/'):
-                            image_url = 'https://cnc1.ru' + image_url
+                    if image_url:
+                        image_url = _absolute_image_url(image_url)
             except Exception as e:
                 print(f"   → Ошибка при поиске изображения: {e}")
 
@@ -903,19 +895,8 @@ def parse_custom_list():
         print(" → Пагинация не найдена. Парсим текущую страницу.")
     
     # Ищем товары
-    item_selectors = [
-        "div.list_item.item_info.catalog-adaptive.flexbox.flexbox--row",
-        "div.list_item_wrapp.item_wrapp.item.item-parent.clearfix",
-        "div.list_item_info.catalog-adaptive.flexbox",
-        ".list_item.item_info.catalog-adaptive",
-        ".list_item_wrapp",
-        "div.list_item", 
-        "a.thumb",
-        ".catalog-adaptive"
-    ]
-    
     list_items = []
-    for selector in item_selectors:
+    for selector in schema_chain("custom_list"):
         try:
             list_items = driver.find_elements(By.CSS_SELECTOR, selector)
             if list_items:
@@ -943,17 +924,8 @@ def parse_custom_list():
             
             # Извлекаем название и ссылку
             try:
-                link_selectors = [
-                    "a.dark_link.js-notice-block__title",
-                    ".list_item_wrap a[href*='/catalog/']",
-                    ".list_item_info a[href*='/catalog/']",
-                    "a[href*='/catalog/']",
-                    "a.product-link",
-                    "a"
-                ]
-                
                 product_link = None
-                for selector in link_selectors:
+                for selector in schema_chain("custom_list", "url"):
                     try:
                         product_link = item.find_element(By.CSS_SELECTOR, selector)
                         break
@@ -965,10 +937,8 @@ def parse_custom_list():
                     
                     # Извлекаем название
                     try:
-                        name_selectors = ["span.font_md", "span", ".js-notice-block__title span"]
-                        
                         name_found = False
-                        for name_sel in name_selectors:
+                        for name_sel in schema_chain("custom_list", "name"):
                             try:
                                 name_elem = product_link.find_element(By.CSS_SELECTOR, name_sel)
                                 product_data["name"] = name_elem.text.strip()
@@ -991,20 +961,13 @@ def parse_custom_list():
                 
                 # Ищем изображения в span элементах с data-src
                 try:
-                    span_selectors = ["span.section-gallery-wrapper__item", ".section-gallery-wrapper span[data-src]", "span[data-src*='.jpg']", "span[data-src*='.png']", "span[data-src*='.jpeg']"]
-                    
-                    for selector in span_selectors:
+                    for selector in schema_chain("custom_list", "image_url", own_source=True):
                         try:
                             span_elem = item.find_element(By.CSS_SELECTOR, selector)
                             image_url = span_elem.get_attribute('data-src')
                             
                             if image_url:
-                                if not image_url.startswith('http'):
-                                    if image_url.startswith('//'):
-                                        image_url = 'https:' + image_url
-                                    elif image_url.startswith('/'):
-                                        image_url = 'https://cnc1.ru' + image_url
-                                product_data["image_url"] = image_url
+                                product_data["image_url"] = _absolute_image_url(image_url)
                                 image_found = True
                                 break
                         except:
@@ -1014,20 +977,13 @@ def parse_custom_list():
                 
                 # Если не найдено в span с data-src, ищем обычные img теги
                 if not image_found:
-                    image_selectors = [".image_block img", ".list_item_wrap .image_block img", ".section-gallery-wrapper.flexbox img", "div.section-gallery-wrapper img", ".section-gallery-wrapper img", ".item_info img", "img"]
-                    
-                    for selector in image_selectors:
+                    for selector in schema_chain("custom_list", "image_url", own_source=False):
                         try:
                             image_elem = item.find_element(By.CSS_SELECTOR, selector)
                             image_url = image_elem.get_attribute('data-src') or image_elem.get_attribute('src')
                             
                             if image_url:
-                                if not image_url.startswith('http'):
-                                    if image_url.startswith('//'):
-                                        image_url = 'https:' + image_url
-                                    elif image_url.startswith('/'):
-                                        image_url = 'https://cnc1.ru' + image_url
-                                product_data["image_url"] = image_url
+                                product_data["image_url"] = _absolute_image_url(image_url)
                                 image_found = True
                                 break
                         except:
@@ -1038,9 +994,7 @@ def parse_custom_list():
             
             # Извлекаем цену
             try:
-                price_selectors = [".price_matrix_wrapper .price", ".cost.price.clearfix", ".information_wrap .cost.price", "span.values_wrapper", "span.price_measure", ".price.font-bold.font_mxs", ".values_wrapper", ".price_measure", ".price", "[data-currency]", "[data-value*='RUB']"]
-                
-                for selector in price_selectors:
+                for selector in schema_chain("custom_list", "price"):
                     try:
                         price_elem = item.find_element(By.CSS_SELECTOR, selector)
                         price_text = price_elem.text.strip()
@@ -1076,9 +1030,7 @@ def parse_single_product_page():
         
         # Извлекаем название товара
         try:
-            title_selectors = ["h1.product-main__title", "h1[itemprop='name']", ".product-main h1", ".product-info h1", "h1"]
-            
-            for selector in title_selectors:
+            for selector in schema_chain("product_detail", "name"):
                 try:
                     title_elem = driver.find_element(By.CSS_SELECTOR, selector)
                     product_data["name"] = title_elem.text.strip()
@@ -1093,20 +1045,13 @@ def parse_single_product_page():
         try:
             image_found = False
             
-            image_selectors = [".product-detail-gallery__container--vertical link[href]", ".product-detail-gallery__container link[href]", ".product-detail-gallery__container a[href*='.jpg']", ".product-detail-gallery__container a[href*='.png']", ".product-detail-gallery__container a[href*='.jpeg']", ".product-detail-gallery__container a.fancy.popup_link", ".product-detail-gallery__container .fancy[href]"]
-            
-            for selector in image_selectors:
+            for selector in schema_chain("product_detail", "image_url", own_source=False):
                 try:
                     image_elem = driver.find_element(By.CSS_SELECTOR, selector)
                     image_url = image_elem.get_attribute('href')
                     
                     if image_url and any(ext in image_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                        if not image_url.startswith('http'):
-                            if image_url.startswith('//'):
-                                image_url = 'https:' + image_url
-                            elif image_url.startswith('/'):
-                                image_url = 'https://cnc1.ru' + image_url
-                        
+                        image_url = _absolute_image_url(image_url)
                         product_data["image_url"] = image_url
                         image_found = True
                         print(f"   ✅ Изображение найдено: {image_url}")
@@ -1115,20 +1060,13 @@ def parse_single_product_page():
                     continue
             
             if not image_found:
-                img_selectors = [".product-detail-gallery__container img[src]", ".product-detail-gallery__container img[data-src]", ".product-detail-gallery img"]
-                
-                for selector in img_selectors:
+                for selector in schema_chain("product_detail", "image_url", own_source=True):
                     try:
                         img_elem = driver.find_element(By.CSS_SELECTOR, selector)
                         image_url = img_elem.get_attribute('data-src') or img_elem.get_attribute('src')
                         
                         if image_url:
-                            if not image_url.startswith('http'):
-                                if image_url.startswith('//'):
-                                    image_url = 'https:' + image_url
-                                elif image_url.startswith('/'):
-                                    image_url = 'https://cnc1.ru' + image_url
-                            
+                            image_url = _absolute_image_url(image_url)
                             product_data["image_url"] = image_url
                             image_found = True
                             print(f"   ✅ Изображение (img): {image_url}")
@@ -1145,9 +1083,7 @@ def parse_single_product_page():
         # Извлекаем цену
         try:
             price_found = False
-            price_selectors = [".price.font-bold.font_mxs", ".price.font-bold", ".price_detail", ".cost.font-bold", "[data-currency='RUB']", ".price"]
-            
-            for selector in price_selectors:
+            for selector in schema_chain("product_detail", "price"):
                 try:
                     price_elem = driver.find_element(By.CSS_SELECTOR, selector)
                     price_text = price_elem.text.strip()